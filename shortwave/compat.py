@@ -16,6 +16,26 @@
 # limitations under the License.
 
 from sys import version_info
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+try:
+    from types import MappingProxyType as frozen_mapping
+except ImportError:
+    class frozen_mapping(dict):
+        """ Read-only dictionary, for Python versions that lack
+        types.MappingProxyType.
+        """
+
+        def _read_only(self, *args, **kwargs):
+            raise TypeError("%s is read-only" % self.__class__.__name__)
+
+        __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+try:
+    TimeoutError = TimeoutError
+except NameError:
+    from socket import timeout as TimeoutError
 try:
     from urllib.parse import quote, unquote_plus as unquote
 except ImportError:
@@ -60,6 +80,7 @@ if version_info >= (3,):
 
 else:
     integer = (int, long)
+    unicode = unicode
 
     SPACE = b' '
 
@@ -15,8 +15,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from logging import getLogger
+from math import ceil
 from threading import Lock
 
+from shortwave.compat import monotonic
+
+log = getLogger("shortwave.concurrency")
+
 
 def synchronized(f):
     """ Function synchronization decorator with lock check method. This
@@ -39,3 +45,88 @@ def synchronized(f):
     f_.locked = lambda: locked[0]
 
     return f_
+
+
+class Timer(object):
+    """ A callback scheduled on a `TimerWheel`.
+    """
+
+    cancelled = False
+
+    def __init__(self, rounds, callback, args):
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+
+    def cancel(self):
+        """ Prevent this timer from firing. The timer is only removed
+        from the wheel when its slot is next visited, so cancellation
+        takes constant time.
+        """
+        self.cancelled = True
+
+
+class TimerWheel(object):
+    """ Hashed timer wheel. Timers are placed into one of `size` slots
+    according to their expiry time, measured in ticks of `tick` seconds,
+    along with the number of full rotations to wait. Scheduling and
+    cancellation take constant time, and each call to `advance` only
+    visits the slots for ticks that have passed, so large numbers of
+    timers can be handled at a cost that does not depend on how many
+    are pending.
+
+    Timers never fire early but may fire up to one tick late, plus
+    however long the owner takes to call `advance`.
+    """
+
+    def __init__(self, tick=0.1, size=512):
+        self.tick = tick
+        self.size = size
+        self.slots = [[] for _ in range(size)]
+        self.position = 0
+        self.time = monotonic()
+        self._lock = Lock()
+
+    def schedule(self, delay, callback, *args):
+        """ Schedule `callback(*args)` to be called after `delay` seconds
+        and return the `Timer`.
+        """
+        with self._lock:
+            ticks = max(1, int(ceil((monotonic() + delay - self.time) / self.tick)))
+            timer = Timer((ticks - 1) // self.size, callback, args)
+            self.slots[(self.position + ticks) % self.size].append(timer)
+        return timer
+
+    def advance(self, now=None):
+        """ Move the wheel on to the current time, calling every timer
+        that has expired. Exceptions raised by callbacks are logged.
+        """
+        if now is None:
+            now = monotonic()
+        due = []
+        with self._lock:
+            slots = self.slots
+            size = self.size
+            tick = self.tick
+            while self.time + tick <= now:
+                self.time += tick
+                self.position = position = (self.position + 1) % size
+                slot = slots[position]
+                if slot:
+                    remaining = []
+                    for timer in slot:
+                        if timer.cancelled:
+                            continue
+                        if timer.rounds:
+                            timer.rounds -= 1
+                            remaining.append(timer)
+                        else:
+                            due.append(timer)
+                    slots[position] = remaining
+        for timer in due:
+            if not timer.cancelled:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as error:
+                    log.exception("Timer callback %r failed: %s", timer.callback, error)
+        return len(due)
@@ -16,3 +16,11 @@
 # limitations under the License.
 
 from .client import *
+from .balancing import *
+from .cache import *
+from .coalescing import *
+from .coding import *
+from .hedging import *
+from .multipart import *
+from .ndjson import *
+from .sse import *
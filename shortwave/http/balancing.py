@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load balancing of requests across replicated backends.
+"""
+
+from logging import getLogger
+from random import sample
+from threading import Lock
+from weakref import WeakSet
+
+from shortwave.compat import monotonic
+from shortwave.http.client import HTTP, ForwardingResponse
+
+
+__all__ = ["Backend", "BalancedHTTP", "LEAST_OUTSTANDING", "POWER_OF_TWO"]
+
+log = getLogger("shortwave.http")
+
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "power_of_two"
+
+
+class BackendResponse(ForwardingResponse):
+    """ Response that reports its outcome to the backend that served it.
+    """
+
+    def __init__(self, target, backend, http):
+        super(BackendResponse, self).__init__(target)
+        self.backend = backend
+        self.http = http
+
+    def on_end(self):
+        self.backend.on_success()
+        self.forward_end()
+
+    def on_error(self, error):
+        self.backend.on_failure(self.http, error)
+        self.forward_error(error)
+
+
+class Backend(object):
+    """ A single replica, holding up to `size` connections. A backend
+    that fails is ejected from routing for a period that doubles with
+    each consecutive failure, up to a limit.
+    """
+
+    Connection = HTTP
+
+    #: Initial time in seconds for which a failed backend is ejected
+    ejection_time = 10.0
+
+    #: Maximum time in seconds for which a failed backend is ejected
+    max_ejection_time = 300.0
+
+    def __init__(self, authority, size=1, **headers):
+        self.authority = authority
+        self.size = size
+        self.headers = headers
+        self.connections = []
+        self.failures = 0
+        self.ejected_until = None
+        self._failed = set()
+        self._counted = WeakSet()
+        self._lock = Lock()
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.authority.decode())
+
+    def outstanding(self):
+        """ Return the number of responses not yet received across all
+        connections to this backend.
+        """
+        return sum(len(http.responses) for http in self.connections)
+
+    def ejected(self, now=None):
+        ejected_until = self.ejected_until
+        if ejected_until is None:
+            return False
+        return (now or monotonic()) < ejected_until
+
+    def eject(self):
+        with self._lock:
+            self.failures += 1
+            duration = min(self.max_ejection_time,
+                           self.ejection_time * 2 ** (self.failures - 1))
+            self.ejected_until = monotonic() + duration
+        log.warning("Ejected %r for %gs", self, duration)
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.ejected_until = None
+
+    def on_failure(self, http, error):
+        # Called from the receiver, so the connection is only marked
+        # here and is closed the next time the backend is used. A
+        # connection that fails takes all of its outstanding responses
+        # with it, so each connection only counts as one failure.
+        with self._lock:
+            if http in self._counted:
+                return
+            self._counted.add(http)
+            self._failed.add(http)
+        self.eject()
+
+    def connection(self):
+        """ Return the connection with the fewest outstanding responses,
+        opening a new one if fewer than `size` are open and none is
+        idle. Failed and closed connections are discarded first.
+        """
+        with self._lock:
+            failed = self._failed
+            self._failed = set()
+        for http in failed:
+            http.abort()
+        self.connections = [http for http in self.connections
+                            if http not in failed and not http.stopped()]
+        connections = self.connections
+        if connections:
+            http = min(connections, key=lambda c: len(c.responses))
+            if not http.responses or len(connections) >= self.size:
+                return http
+        http = self.Connection(self.authority, **self.headers)
+        connections.append(http)
+        return http
+
+    def transmit(self):
+        for http in self.connections:
+            http.transmit()
+
+    def sync(self):
+        for http in self.connections:
+            http.sync()
+
+    def close(self):
+        connections = self.connections
+        self.connections = []
+        for http in connections:
+            http.close()
+
+
+class BalancedHTTP(object):
+    """ Client for a set of replicated backends. Each request is routed
+    to the available backend with the fewest outstanding responses or,
+    with the POWER_OF_TWO strategy, to the less loaded of two backends
+    chosen at random. Backends that fail, whether through a connection
+    error or a response error such as a timeout, are ejected for a time.
+    If every backend has been ejected, all are used.
+
+    The interface mirrors that of `HTTP`: requests are appended, then
+    transmitted together.
+    """
+
+    Backend = Backend
+
+    def __init__(self, authorities, size=1, strategy=LEAST_OUTSTANDING, **headers):
+        if strategy not in (LEAST_OUTSTANDING, POWER_OF_TWO):
+            raise ValueError("Unknown balancing strategy %r" % strategy)
+        self.backends = [self.Backend(authority, size, **headers) for authority in authorities]
+        if not self.backends:
+            raise ValueError("At least one backend is required")
+        self.strategy = strategy
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__,
+                            ",".join(backend.authority.decode() for backend in self.backends))
+
+    def available(self):
+        now = monotonic()
+        return [backend for backend in self.backends if not backend.ejected(now)] or self.backends
+
+    def choose(self, candidates):
+        if self.strategy == POWER_OF_TWO and len(candidates) > 2:
+            candidates = sample(candidates, 2)
+        return min(candidates, key=lambda backend: backend.outstanding())
+
+    def append(self, request, response):
+        candidates = self.available()
+        while True:
+            backend = self.choose(candidates)
+            try:
+                http = backend.connection()
+            except (IOError, OSError) as error:
+                log.error("%r: %s", backend, error)
+                backend.eject()
+                candidates = [candidate for candidate in candidates if candidate is not backend]
+                if not candidates:
+                    raise
+            else:
+                response.request = request
+                http.append(request, BackendResponse(response, backend, http))
+                return backend
+
+    def transmit(self):
+        for backend in self.backends:
+            backend.transmit()
+
+    def sync(self):
+        for backend in self.backends:
+            backend.sync()
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A private HTTP cache, as described by RFC 7234.
+"""
+
+from collections import OrderedDict
+from hashlib import sha1
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from os import makedirs, remove, rename
+from os.path import isdir, join as path_join
+from threading import Lock
+from time import time
+
+from shortwave.compat import bstr, xstr
+from shortwave.http.client import HTTP, HTTPRequest, ForwardingResponse
+from shortwave.messaging import MessageHeaderDict, parse_internet_time as parse_date
+
+
+__all__ = ["CacheEntry", "MemoryCacheStore", "DiskCacheStore", "HTTPCache", "CachingHTTP"]
+
+log = getLogger("shortwave.http")
+
+# Status codes that may be cached without explicit freshness information
+# (RFC 7231 section 6.1)
+heuristically_cacheable = {200, 203, 204, 206, 300, 301, 404, 405, 410, 414, 501}
+
+# Status codes that this cache is able to store
+storable = {200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501}
+
+# Headers not updated from a 304 (Not Modified) response
+not_updated = {"content_length", "content_encoding", "transfer_encoding", "content_range"}
+
+# Fraction of the time since last modification used as a heuristic
+# freshness lifetime, and the maximum such lifetime
+heuristic_fraction = 0.1
+max_heuristic_lifetime = 86400
+
+default_max_size = 67108864
+
+
+def parse_cache_control(value):
+    """ Parse a Cache-Control header value into a dictionary of directive
+    names and values. Directives without values map to None.
+    """
+    directives = {}
+    if value:
+        for directive in value.split(b","):
+            name, eq, argument = directive.partition(b"=")
+            name = name.strip().lower()
+            if name:
+                directives[name] = argument.strip().strip(b'"') if eq else None
+    return directives
+
+
+def parse_seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheEntry(object):
+    """ A stored response, along with the information needed to
+    calculate its age and to select it for future requests.
+    """
+
+    def __init__(self, key, status_code, reason_phrase, http_version, headers, body,
+                 request_time, response_time, vary=None):
+        self.key = key
+        self.status_code = status_code
+        self.reason_phrase = reason_phrase
+        self.http_version = http_version
+        self.headers = headers
+        self.body = body
+        self.request_time = request_time
+        self.response_time = response_time
+        self.vary = vary or {}
+
+    def __repr__(self):
+        return "<%s %s %d>" % (self.__class__.__name__, xstr(self.key), self.status_code)
+
+    def __len__(self):
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers.items())
+
+    def cache_control(self):
+        return parse_cache_control(self.headers.get(b"cache-control"))
+
+    def freshness_lifetime(self):
+        """ Return the freshness lifetime in seconds (RFC 7234 section
+        4.2.1).
+        """
+        cache_control = self.cache_control()
+        max_age = parse_seconds(cache_control.get(b"max-age"))
+        if max_age is not None:
+            return max_age
+        headers = self.headers
+        date = parse_date(headers.get(b"date")) or self.response_time
+        expires = headers.get(b"expires")
+        if expires is not None:
+            expires = parse_date(expires)
+            return max(0, expires - date) if expires is not None else 0
+        last_modified = parse_date(headers.get(b"last-modified"))
+        if last_modified is not None and self.status_code in heuristically_cacheable:
+            return min(max_heuristic_lifetime, max(0, (date - last_modified) * heuristic_fraction))
+        return 0
+
+    def age(self, now=None):
+        """ Return the current age in seconds (RFC 7234 section 4.2.3).
+        """
+        if now is None:
+            now = time()
+        headers = self.headers
+        date = parse_date(headers.get(b"date")) or self.response_time
+        apparent_age = max(0, self.response_time - date)
+        response_delay = self.response_time - self.request_time
+        corrected_age_value = (parse_seconds(headers.get(b"age")) or 0) + response_delay
+        corrected_initial_age = max(apparent_age, corrected_age_value)
+        return corrected_initial_age + (now - self.response_time)
+
+    def is_fresh(self, now=None, max_age=None):
+        if b"no-cache" in self.cache_control():
+            return False
+        lifetime = self.freshness_lifetime()
+        if max_age is not None:
+            lifetime = min(lifetime, max_age)
+        return lifetime > self.age(now)
+
+    def validators(self):
+        """ Return a dictionary of conditional request headers that can
+        be used to revalidate this entry.
+        """
+        validators = {}
+        etag = self.headers.get(b"etag")
+        if etag:
+            validators["if_none_match"] = etag
+        last_modified = self.headers.get(b"last-modified")
+        if last_modified:
+            validators["if_modified_since"] = last_modified
+        return validators
+
+    def matches(self, request_headers):
+        """ Check whether the request headers nominated by Vary match
+        those of the request for which this entry was stored.
+        """
+        for name, value in self.vary.items():
+            if request_headers.get(name) != value:
+                return False
+        return True
+
+    def update(self, headers, request_time, response_time):
+        """ Freshen this entry from the headers of a 304 (Not Modified)
+        response (RFC 7234 section 4.3.4).
+        """
+        stored = MessageHeaderDict(self.headers)
+        for name, value in headers.items():
+            if xstr(name).replace("-", "_").lower() not in not_updated:
+                stored[name] = value
+        self.headers = stored
+        self.request_time = request_time
+        self.response_time = response_time
+
+    def deliver(self, response):
+        """ Replay this entry into a response.
+        """
+        response.http_version = self.http_version
+        response.status_code = self.status_code
+        response.reason_phrase = self.reason_phrase
+        response.headers = MessageHeaderDict(self.headers)
+        try:
+            response.on_head()
+            if self.body:
+                response.on_body_data(self.body)
+            response.on_end()
+        except Exception as error:
+            response.error = error
+            response.on_error(error)
+        finally:
+            response.end.set()
+
+    def to_bytes(self):
+        metadata = {
+            "key": xstr(self.key),
+            "status_code": self.status_code,
+            "reason_phrase": self.reason_phrase.decode("latin-1"),
+            "http_version": self.http_version.decode("latin-1"),
+            "headers": [[name.decode("latin-1"), value.decode("latin-1")]
+                        for name, value in self.headers.items()],
+            "request_time": self.request_time,
+            "response_time": self.response_time,
+            "vary": dict((name, None if value is None else value.decode("latin-1"))
+                         for name, value in self.vary.items()),
+        }
+        return json_dumps(metadata, separators=",:").encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data):
+        metadata, _, body = data.partition(b"\n")
+        metadata = json_loads(metadata.decode("utf-8"))
+        return cls(bstr(metadata["key"]),
+                   metadata["status_code"],
+                   metadata["reason_phrase"].encode("latin-1"),
+                   metadata["http_version"].encode("latin-1"),
+                   MessageHeaderDict((name.encode("latin-1"), value.encode("latin-1"))
+                                     for name, value in metadata["headers"]),
+                   body,
+                   metadata["request_time"],
+                   metadata["response_time"],
+                   dict((name, None if value is None else value.encode("latin-1"))
+                        for name, value in metadata["vary"].items()))
+
+
+class MemoryCacheStore(object):
+    """ In-memory store for cache entries, evicting the least recently
+    used entries once the total size of stored entries exceeds
+    `max_size` bytes.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or default_max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def put(self, entry):
+        size = len(entry)
+        if size > self.max_size:
+            return
+        with self._lock:
+            entries = self._entries
+            previous = entries.pop(entry.key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            entries[entry.key] = entry
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= len(entry)
+
+
+class DiskCacheStore(object):
+    """ Store for cache entries that keeps one file per entry within a
+    directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not isdir(path):
+            makedirs(path)
+
+    def _file_name(self, key):
+        return path_join(self.path, sha1(key).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file_name(key), "rb") as f:
+                entry = CacheEntry.from_bytes(f.read())
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        return entry if entry.key == key else None
+
+    def put(self, entry):
+        file_name = self._file_name(entry.key)
+        temp_file_name = file_name + ".tmp"
+        try:
+            with open(temp_file_name, "wb") as f:
+                f.write(entry.to_bytes())
+            rename(temp_file_name, file_name)
+        except (IOError, OSError) as error:
+            log.error("Cannot store %r: %s", entry, error)
+
+    def remove(self, key):
+        try:
+            remove(self._file_name(key))
+        except (IOError, OSError):
+            pass
+
+
+class HTTPCache(object):
+    """ Private HTTP cache, holding entries in memory up to `max_size`
+    bytes and optionally also in a directory on disk.
+    """
+
+    def __init__(self, max_size=None, path=None):
+        self.memory = MemoryCacheStore(max_size)
+        self.disk = DiskCacheStore(path) if path else None
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.put(entry)
+        return entry
+
+    def put(self, entry):
+        self.memory.put(entry)
+        if self.disk is not None:
+            self.disk.put(entry)
+
+    def remove(self, key):
+        self.memory.remove(key)
+        if self.disk is not None:
+            self.disk.remove(key)
+
+
+class CacheFillResponse(ForwardingResponse):
+    """ Response used for requests sent on behalf of the cache. Content is
+    forwarded to the caller's response and collected for storage, while
+    a 304 (Not Modified) response causes the stored entry to be
+    delivered instead.
+    """
+
+    def __init__(self, target, cache, key, entry, request_headers, request_time):
+        super(CacheFillResponse, self).__init__(target)
+        self.cache = cache
+        self.key = key
+        self.entry = entry
+        self.request_headers = request_headers
+        self.request_time = request_time
+        self.pieces = None
+        self.size = 0
+
+    def on_head(self):
+        if self.status_code == 304 and self.entry is not None:
+            return
+        if self.storable():
+            # A body too large to be stored is not worth collecting
+            content_length = parse_seconds(self.headers.get(b"content-length"))
+            if content_length is None or content_length <= self.cache.memory.max_size:
+                self.pieces = []
+        self.forward_head()
+
+    def storable(self):
+        if self.status_code not in storable:
+            return False
+        if b"no-store" in parse_cache_control(self.request_headers.get(b"cache-control")):
+            return False
+        headers = self.headers
+        cache_control = parse_cache_control(headers.get(b"cache-control"))
+        if b"no-store" in cache_control or headers.get(b"vary", b"").strip() == b"*":
+            return False
+        return bool(b"max-age" in cache_control or self.status_code in heuristically_cacheable or
+                    any(headers.get(name) is not None
+                        for name in (b"expires", b"etag", b"last-modified")))
+
+    def on_body_data(self, data):
+        pieces = self.pieces
+        if pieces is not None:
+            self.size += len(data)
+            if self.size > self.cache.memory.max_size:
+                self.pieces = None
+            else:
+                pieces.append(bytes(data))
+        self.target.on_body_data(data)
+
+    def on_end(self):
+        response_time = time()
+        if self.status_code == 304 and self.entry is not None:
+            entry = self.entry
+            entry.update(self.headers, self.request_time, response_time)
+            self.cache.put(entry)
+            entry.deliver(self.target)
+            return
+        if self.pieces is not None:
+            vary = {}
+            for name in self.headers.get(b"vary", b"").split(b","):
+                name = name.strip().lower()
+                if name:
+                    vary[xstr(name)] = self.request_headers.get(name)
+            self.cache.put(CacheEntry(self.key, self.status_code, self.reason_phrase,
+                                      self.http_version, MessageHeaderDict(self.headers),
+                                      b"".join(self.pieces),
+                                      self.request_time, response_time, vary))
+        self.forward_end()
+
+
+class CachingHTTP(HTTP):
+    """ HTTP connection with a private cache in front of it. Fresh
+    responses to GET requests are delivered from the cache without
+    contacting the server. Stale responses that carry validators are
+    revalidated with a conditional request, and a 304 (Not Modified)
+    reply is turned into a cache hit. Unsafe methods invalidate any
+    entry stored for their target.
+
+    A cache can be shared by several connections to the same authority.
+    """
+
+    def __init__(self, authority, receiver=None, rx_buffer_size=None, cache=None, **headers):
+        super(CachingHTTP, self).__init__(authority, receiver, rx_buffer_size, **headers)
+        self.authority = authority
+        self.cache = cache if cache is not None else HTTPCache()
+
+    def cache_key(self, target):
+        return self.authority + target
+
+    def append(self, request, response):
+        method = request.method
+        key = self.cache_key(request.target)
+        if method != b"GET":
+            if method not in (b"HEAD", b"OPTIONS", b"TRACE"):
+                self.cache.remove(key)
+            super(CachingHTTP, self).append(request, response)
+            return
+        request_headers = self.transmitter.headers.copy()
+        request_headers.update(request.headers)
+        request_cache_control = parse_cache_control(request_headers.get(b"cache-control"))
+        entry = None
+        if b"no-store" not in request_cache_control:
+            entry = self.cache.get(key)
+            if entry is not None and not entry.matches(request_headers):
+                entry = None
+        if entry is not None and b"no-cache" not in request_cache_control and \
+                request_headers.get(b"pragma", b"").lower() != b"no-cache":
+            max_age = parse_seconds(request_cache_control.get(b"max-age"))
+            if entry.is_fresh(max_age=max_age):
+                log.debug("Delivering %r from cache", entry)
+                response.request = request
+                entry.deliver(response)
+                return
+        sent = request
+        if entry is not None:
+            validators = entry.validators()
+            if validators:
+                headers = dict(request.headers)
+                headers.update(validators)
+                sent = HTTPRequest(method, request.target, request.body, request.compress,
+                                   request.expect_continue, **headers)
+            else:
+                entry = None
+        response.request = request
+        super(CachingHTTP, self).append(sent, CacheFillResponse(response, self.cache, key, entry,
+                                                                request_headers, time()))
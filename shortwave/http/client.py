@@ -17,24 +17,50 @@
 
 from base64 import b64encode
 from collections import deque
-from json import dumps as json_dumps
-from logging import getLogger
-from threading import Event
+from io import BytesIO
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger, INFO
+from mmap import mmap, ACCESS_READ
+from re import compile as re_compile
+from tempfile import TemporaryFile
+from threading import Event, Lock
 
-from shortwave.compat import bstr
+from shortwave.compat import bstr, monotonic, TimeoutError
 from shortwave.concurrency import synchronized
-from shortwave.messaging import SP, CRLF, MessageHeaderDict, header_names
+from shortwave.http.coding import ContentDecoder, ContentEncoder
+from shortwave.messaging import SP, HT, CRLF, MessageHeaderDict, MessageHeaderView, \
+    header_name, header_names, header_parameter_pattern, intern_bytes, internet_time, \
+    parse_header, quoted_pair_pattern
 from shortwave.numbers import HTTP_PORT
 from shortwave.transmission import Transmitter, Connection
 from shortwave.uri import parse_authority
 
-HTTP_VERSION = b"HTTP/1.1"
+HTTP_VERSION = intern_bytes(b"HTTP/1.1")
+
+# Header values shared with the parsers, so that comparisons against
+# received values usually succeed on identity
+CLOSE = intern_bytes(b"close")
+CHUNKED = intern_bytes(b"chunked")
 
 log = getLogger("shortwave.http")
 
+# States for chunked transfer decoding
+CHUNK_SIZE = 0
+CHUNK_DATA = 1
+CHUNK_END = 2
+CHUNK_TRAILER = 3
+
+# Size beyond which received content is moved from memory to a temporary file
+default_spill_size = 8388608
+
+# Longest chunk size or trailer line accepted before giving up
+max_chunk_line_size = 8192
+
+chunk_size_pattern = re_compile(br"[0-9A-Fa-f]+\Z")
+
 connection_default = {
-    b"HTTP/1.0": b"close",
-    b"HTTP/1.1": b"keep-alive",
+    b"HTTP/1.0": CLOSE,
+    b"HTTP/1.1": intern_bytes(b"keep-alive"),
 }
 
 header_names.update({
@@ -57,6 +83,7 @@ header_names.update({
     "if_none_match": b"If-None-Match",
     "if_range": b"If-Range",
     "if_unmodified_since": b"If-Unmodified-Since",
+    "last_event_id": b"Last-Event-ID",
     "max_forwards": b"Max-Forwards",
     "origin": b"Origin",
     "pragma": b"Pragma",
@@ -73,27 +100,68 @@ header_names.update({
 
 class HTTPTransmitter(Transmitter):
 
+    # Data yielded by a chunked body is collected until at least this
+    # many bytes are available before being framed and sent as a single
+    # chunk. Yielding an empty chunk forces any collected data to be sent.
+    chunk_buffer_size = 8192
+
+    # Optional maximum time in seconds for which collected chunk data is
+    # held back. This is checked as each new chunk is yielded.
+    chunk_flush_interval = None
+
+    # Request content is gzip encoded when `compress` is set, either here
+    # for the whole connection or on an individual request. Fixed-length
+    # content smaller than `compress_threshold` bytes is sent as-is.
+    compress = False
+    compress_threshold = 1024
+    compress_level = 6
+
+    # Maximum time in seconds to wait for a 100 (Continue) response to
+    # a request sent with `Expect: 100-continue`, after which the body
+    # is sent anyway
+    continue_timeout = 1.0
+
+    # Set to True to send a Date header with every request. RFC 7231
+    # section 7.1.1.2 advises against this unless the server makes use
+    # of the client's clock.
+    send_date = False
+
     def __init__(self, socket, headers):
         super(HTTPTransmitter, self).__init__(socket)
         self.headers = MessageHeaderDict(headers)
+        # Pieces waiting to be sent, in a list reused for every
+        # transmission on the connection
+        self.data = []
 
     def transmit(self, *requests):
 
-        data = []
+        data = self.data
+        # Drop anything left behind by a transmission that failed
+        del data[:]
         append = data.append
 
         def transmit():
-            log_data = b"".join(data).decode()
-            for line in log_data.splitlines():
-                log.info("T[%d]: %s", self.fd, line)
-            super(HTTPTransmitter, self).transmit(*data)
-            data[:] = []
+            if log.isEnabledFor(INFO):
+                log_data = b"".join(data).decode()
+                for line in log_data.splitlines():
+                    log.info("T[%d]: %s", self.fd, line)
+            # Already logged, line by line
+            self.send(*data)
+            del data[:]
 
         for request in requests:
             method = request.method
             target = request.target
             body = request.body
+            expectation = request.expectation if body is not None else None
             headers = self.headers.copy()
+            if self.send_date:
+                headers[b"Date"] = internet_time()
+            compress = self.compress if request.compress is None else request.compress
+            if compress and any(header_name(name)[0] == "content_encoding"
+                                for name in request.headers):
+                # Content is already encoded
+                compress = False
 
             assert isinstance(method, bytes)
             assert isinstance(target, bytes)
@@ -106,26 +174,74 @@ class HTTPTransmitter(Transmitter):
             append(CRLF)
 
             if body is None:
-                append(headers.to_bytes())
+                headers.update(request.headers)
+                headers.write_to(data)
+                append(CRLF)
+
+            elif hasattr(body, "content_length"):
+                # A body that knows its length but is produced in pieces,
+                # such as a MultipartEncoder, is streamed as fixed-length data
+                content_type = getattr(body, "content_type", None)
+                if content_type:
+                    headers[b"Content-Type"] = content_type
+                headers[b"Content-Length"] = bstr(body.content_length())
+                if expectation is not None:
+                    headers[b"Expect"] = b"100-continue"
+                headers.update(request.headers)
+                headers.write_to(data)
                 append(CRLF)
+                if expectation is not None and not self.await_continue(expectation, transmit):
+                    break
+                pending_size = 0
+                for piece in body:
+                    append(piece)
+                    pending_size += len(piece)
+                    if pending_size >= self.chunk_buffer_size:
+                        transmit()
+                        pending_size = 0
 
             elif callable(body):
                 # A callable body signals that we want to send chunked data
-                headers[b"Transfer-Encoding"] = b"chunked"
+                headers[b"Transfer-Encoding"] = CHUNKED
+                chunks = body()
+                if compress:
+                    headers[b"Content-Encoding"] = b"gzip"
+                    chunks = ContentEncoder(self.compress_level).encode_chunks(chunks)
+                if expectation is not None:
+                    headers[b"Expect"] = b"100-continue"
                 headers.update(request.headers)
-                append(headers.to_bytes())
+                headers.write_to(data)
                 append(CRLF)
-                transmit()
-                for chunk in body():
+                if expectation is not None and not self.await_continue(expectation, transmit):
+                    break
+                pending = []
+                pending_size = 0
+                flushed_at = monotonic()
+                for chunk in chunks:
                     if not isinstance(chunk, bytes):
                         chunk = bstr(chunk)
                     chunk_size = len(chunk)
-                    if chunk_size:
-                        append("{:X}".format(chunk_size).encode("utf-8"))
+                    pending.append(chunk)
+                    pending_size += chunk_size
+                    if chunk_size and pending_size < self.chunk_buffer_size and (
+                            self.chunk_flush_interval is None or
+                            monotonic() - flushed_at < self.chunk_flush_interval):
+                        continue
+                    if pending_size:
+                        append("{:X}".format(pending_size).encode("utf-8"))
                         append(CRLF)
-                        append(chunk)
+                        data.extend(pending)
                         append(CRLF)
+                    if data:
                         transmit()
+                    pending[:] = []
+                    pending_size = 0
+                    flushed_at = monotonic()
+                if pending_size:
+                    append("{:X}".format(pending_size).encode("utf-8"))
+                    append(CRLF)
+                    data.extend(pending)
+                    append(CRLF)
                 append(b"0")
                 append(CRLF)
                 append(CRLF)
@@ -138,36 +254,71 @@ class HTTPTransmitter(Transmitter):
                     body = json_dumps(body, separators=",:", ensure_ascii=True).encode("UTF-8")
                 elif not isinstance(body, bytes):
                     body = bstr(body)
+                if compress and len(body) >= self.compress_threshold:
+                    headers[b"Content-Encoding"] = b"gzip"
+                    body = ContentEncoder(self.compress_level).encode_all(body)
                 content_length = len(body)
                 if content_length:
                     content_length_bytes = bstr(content_length)
                     headers[b"Content-Length"] = content_length_bytes
+                if expectation is not None:
+                    headers[b"Expect"] = b"100-continue"
                 headers.update(request.headers)
-                append(headers.to_bytes())
+                headers.write_to(data)
                 append(CRLF)
+                if expectation is not None and not self.await_continue(expectation, transmit):
+                    break
                 append(body)
 
+        if data:
+            transmit()
+
+    def await_continue(self, expectation, transmit):
+        """ Send everything up to and including the headers of a request
+        that expects to continue, then wait for the server to respond.
+        Returns True if the body should be sent.
+        """
         transmit()
+        return expectation.wait(self.continue_timeout)
 
 
 class HTTP(Connection):
     Tx = HTTPTransmitter
 
+    # Time in seconds after which a connection with no outstanding
+    # responses is closed, or None to leave idle connections open
+    idle_timeout = None
+
     def __init__(self, authority, receiver=None, rx_buffer_size=None, **headers):
         user_info, host, port = parse_authority(authority)
-        if user_info:
-            headers[b"Authorization"] = basic_auth(user_info)
+        # Host is sent first, as recommended by RFC 7230 section 5.4
+        fields = MessageHeaderDict()
         if port:
-            headers[b"Host"] = host + b":" + bstr(port)
+            fields[b"Host"] = host + b":" + bstr(port)
         else:
-            headers[b"Host"] = host
-        super(HTTP, self).__init__((host, port or HTTP_PORT), receiver, rx_buffer_size, headers)
-        self.data_limit = b"\r\n"
+            fields[b"Host"] = host
+        if user_info:
+            fields[b"Authorization"] = basic_auth(user_info)
+        for name, value in headers.items():
+            fields[name] = value
+        super(HTTP, self).__init__((host, port or HTTP_PORT), receiver, rx_buffer_size, fields)
+        self.data_limit = b"\r\n\r\n"
         self.requests = deque()
         self.responses = deque()
-        self.response_handler = self.on_status_line
+        self.response_handler = self.on_head
+        self.timers = self.receiver.timers
+        self.last_received = monotonic()
+        self.idle_timer = None
+        self.start_idle_timer()
 
     def append(self, request, response):
+        response.request = request
+        if request.expect_continue:
+            request.expectation = ContinueExpectation()
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+        self.start_deadlines(response)
         self.requests.append(request)
         self.responses.append(response)
 
@@ -186,46 +337,174 @@ class HTTP(Connection):
         self.sync()
         super(HTTP, self).close()
 
+    def abort(self, error=None):
+        """ Fail all outstanding responses with the given error and close
+        the connection immediately, without waiting for those responses
+        to complete.
+        """
+        self.fail(error)
+        self.close()
+
+    def fail(self, error=None):
+        """ Fail all outstanding responses with the given error.
+        """
+        if error is not None:
+            log.error("X[%d]: %s", self.fd, error)
+        responses = self.responses
+        while responses:
+            response = responses.popleft()
+            response.error = error
+            self.stop_deadlines(response)
+            try:
+                response.on_error(error)
+            finally:
+                response.end.set()
+        self.requests.clear()
+        del self.buffer[:]
+
+    def start_deadlines(self, response):
+        schedule = self.timers.schedule
+        timers = []
+        if response.total_timeout is not None:
+            timers.append(schedule(response.total_timeout, self.on_timeout, response, "total"))
+        if response.first_byte_timeout is not None:
+            response.first_byte_timer = schedule(response.first_byte_timeout,
+                                                 self.on_timeout, response, "first byte")
+            timers.append(response.first_byte_timer)
+        if response.read_timeout is not None:
+            timers.append(schedule(response.read_timeout, self.on_read_timeout, response))
+        response.timers = timers
+
+    def stop_deadlines(self, response):
+        for timer in response.timers:
+            timer.cancel()
+        response.timers = ()
+
+    def start_idle_timer(self):
+        if self.idle_timeout is not None:
+            self.idle_timer = self.timers.schedule(self.idle_timeout, self.on_idle_timeout)
+
+    def on_timeout(self, response, deadline):
+        if not response.end.is_set():
+            self.abort(TimeoutError("%r missed its %s deadline" % (response, deadline)))
+
+    def on_read_timeout(self, response):
+        if response.end.is_set():
+            return
+        read_timeout = response.read_timeout
+        responses = self.responses
+        if responses and responses[0] is response:
+            silence = monotonic() - self.last_received
+            if silence >= read_timeout:
+                self.abort(TimeoutError("%r received nothing for %gs" % (response, silence)))
+                return
+            read_timeout -= silence
+        response.timers.append(self.timers.schedule(read_timeout, self.on_read_timeout, response))
+
+    def on_idle_timeout(self):
+        self.idle_timer = None
+        if not self.responses and not self.requests and not self.stopped():
+            log.info("X[%d]: Closing idle connection", self.fd)
+            self.close()
+
+    def on_receive(self, view):
+        self.last_received = monotonic()
+        responses = self.responses
+        if responses:
+            timer = responses[0].first_byte_timer
+            if timer is not None:
+                timer.cancel()
+                responses[0].first_byte_timer = None
+        super(HTTP, self).on_receive(view)
+
     def on_data(self, data):
         response = self.responses[0]
-        more = self.response_handler(response, data)
-        if not more:
-            log.debug("Marking %r as complete", response)
+        try:
+            more = self.response_handler(response, data)
+            if not more:
+                self.end_response(response)
+        except Exception as error:
+            self.abort(error)
+
+    def end_response(self, response):
+        log.debug("Marking %r as complete", response)
+        self.stop_deadlines(response)
+        try:
+            response.on_end()
+        finally:
             response.end.set()
-            self.responses.popleft()
-            connection = response.headers.get(b"connection",
-                                              connection_default[response.http_version])
-            if connection.lower() == b"close":
-                self.close()
-            else:
-                self.data_limit = b"\r\n"
-                self.response_handler = self.on_status_line
+        self.responses.popleft()
+        connection = response.headers.get(b"connection",
+                                          connection_default[response.http_version])
+        request = response.request
+        if request is not None and request.expectation is not None and \
+                not request.expectation.proceed:
+            # The content of this request was never sent, so the
+            # connection cannot be used for anything further
+            self.abort(IOError("Connection closed after request content was declined"))
+        elif connection is CLOSE or connection.lower() == CLOSE:
+            self.close()
+        else:
+            self.data_limit = b"\r\n\r\n"
+            self.response_handler = self.on_head
+            if not self.responses:
+                self.start_idle_timer()
 
-    def on_status_line(self, response, data):
-        log.info("R[%d]: %s", self.fd, data.decode())
-        http_version, status_code, reason_phrase = data.split(SP, 2)
-        response.http_version = bytes(http_version)
+    def on_head(self, response, data):
+        eol = data.find(CRLF)
+        if eol == -1:
+            eol = len(data)
+        status_line = bytes(data[:eol])
+        log.info("R[%d]: %s", self.fd, status_line.decode())
+        if log.isEnabledFor(INFO):
+            for line in data[eol + 2:].splitlines():
+                log.info("R[%d]: %s", self.fd, line.decode())
+        http_version, _, status = status_line.partition(SP)
+        status_code, _, reason_phrase = status.partition(SP)
+        response.http_version = intern_bytes(http_version)
         response.status_code = int(status_code)
-        response.reason_phrase = bytes(reason_phrase)
-        response.headers = MessageHeaderDict()
-        self.response_handler = self.on_header_line
-        return True
-
-    def on_header_line(self, response, data):
-        log.info("R[%d]: %s", self.fd, data.decode())
-        if data:
-            name, _, value = data.partition(b":")
-            response.headers[name] = value.strip()
+        response.reason_phrase = intern_bytes(reason_phrase)
+        if response.lazy_headers:
+            response.headers = headers = MessageHeaderView(data, eol + 2)
+        else:
+            response.headers = headers = MessageHeaderDict.from_bytes(memoryview(data)[eol + 2:])
+        status_code = response.status_code
+        request = response.request
+        expectation = request.expectation if request is not None else None
+        if 100 <= status_code < 200 and status_code != 101:
+            # Interim response: the final response will follow
+            if status_code == 100 and expectation is not None:
+                expectation.decide(True)
+            response.on_interim()
             return True
-        if response.headers.get("transfer-encoding", b"").lower() == b"chunked":
-            self.data_limit = b"\r\n"
-            self.response_handler = self.on_chunk_size
+        if expectation is not None and not expectation.decide(False):
+            log.info("R[%d]: Request content not sent", self.fd)
+        response.on_head()
+        if status_code < 200 or status_code in (204, 304) or (
+                request is not None and request.method == b"HEAD"):
+            return False
+        transfer_encoding = headers.get("transfer-encoding", b"")
+        if transfer_encoding is CHUNKED or transfer_encoding.lower() == CHUNKED:
+            response.trailers = MessageHeaderDict()
+            self.chunk_state = CHUNK_SIZE
+            self.chunk_remaining = 0
+            self.chunk_trailer = None
+            self.data_limit = self.on_chunked_data
             return True
-        self.data_limit = int(response.headers.get("content-length", 0))
+        content_length = headers.get("content-length")
+        if content_length is None:
+            # Content is delimited by the connection closing
+            self.data_limit = None
+            self.response_handler = self.on_close_delimited_data
+            return True
+        self.data_limit = int(content_length)
         if self.data_limit:
-            self.response_handler = self.on_body_data
+            if response.copies_body_data:
+                self.content_remaining = self.data_limit
+                self.data_limit = self.on_content_length_data
+            else:
+                self.response_handler = self.on_body_data
             return True
-        # TODO determine whether there is no content or whether content ends on close
         return False
 
     def on_body_data(self, response, data):
@@ -239,38 +518,169 @@ class HTTP(Connection):
             self.data_limit -= len(data)
             return bool(self.data_limit)
 
-    def on_chunk_size(self, response, data):
-        # TODO: parse chunk extensions <https://tools.ietf.org/html/rfc7230#section-4.1.1>
-        self.data_limit = chunk_size = int(data, 16)
-        if chunk_size == 0:
-            self.data_limit = b"\r\n"
-            self.response_handler = self.on_final_chunk_trailer
+    def on_content_length_data(self, buffer):
+        """ Limiter used for content delimited by Content-Length when
+        the response copies body data out before returning. The data is
+        passed as a view of the receive buffer, saving the copy that
+        slicing it would make, and returns the number of bytes consumed.
+        """
+        response = self.responses[0]
+        size = min(len(buffer), self.content_remaining)
+        view = memoryview(buffer)
+        data = view[:size]
+        try:
+            if size > 1024:
+                log.info("R[%d]: %d bytes", self.fd, size)
+            else:
+                log.info("R[%d]: %r", self.fd, data.tobytes())
+            response.on_body_data(data)
+        except Exception as error:
+            failure = error
         else:
-            self.response_handler = self.on_chunk_data
-        return True
+            failure = None
+        finally:
+            # Release the buffer before anything can resize it
+            data.release()
+            view.release()
+        if failure is not None:
+            self.abort(failure)
+            return 0
+        self.content_remaining -= size
+        if not self.content_remaining:
+            self.end_response(response)
+        return size
 
-    def on_chunk_data(self, response, data):
+    def on_close_delimited_data(self, response, data):
+        # The data passed here is the receive buffer itself, so it is
+        # copied before being handed on
+        data = bytes(data)
         if len(data) > 1024:
             log.info("R[%d]: %d bytes", self.fd, len(data))
         else:
-            log.info("R[%d]: %r", self.fd, bytes(data))
+            log.info("R[%d]: %r", self.fd, data)
+        response.on_body_data(data)
+        return True
+
+    def on_stop(self):
+        responses = self.responses
+        if responses and self.response_handler == self.on_close_delimited_data:
+            response = responses[0]
+            log.debug("Marking %r as complete", response)
+            try:
+                response.on_end()
+            except Exception as error:
+                self.fail(error)
+                return
+            finally:
+                response.end.set()
+            responses.popleft()
+        if responses:
+            self.fail(IOError("Connection closed with %d response(s) outstanding" % len(responses)))
+
+    def on_chunked_data(self, buffer):
+        """ Limiter used for chunked transfer coding. This walks every
+        complete chunk currently held in the receive buffer in a single
+        pass, passing contiguous body data to the response in as few
+        calls as possible, and returns the number of bytes consumed.
+        """
         try:
-            response.on_body_data(data)
-        finally:
-            self.data_limit -= len(data)
-            if self.data_limit == 0:
-                self.data_limit = b"\r\n"
-                self.response_handler = self.on_chunk_trailer
-            return True
+            return self._decode_chunks(self.responses[0], buffer)
+        except Exception as error:
+            self.abort(error)
+            return 0
 
-    def on_chunk_trailer(self, response, data):
-        # TODO: parse chunk trailer <https://tools.ietf.org/html/rfc7230#section-4.1.2>
-        self.response_handler = self.on_chunk_size
-        return True
+    def _decode_chunks(self, response, buffer):
+        pieces = []
+        slices = []
+        state = self.chunk_state
+        remaining = self.chunk_remaining
+        end = len(buffer)
+        p = 0
+        # Chunk data is sliced from a view, so that it is only copied
+        # once, when delivered
+        view = memoryview(buffer)
+        try:
+            while p < end:
+                if state == CHUNK_DATA:
+                    q = min(end, p + remaining)
+                    piece = view[p:q]
+                    slices.append(piece)
+                    pieces.append(piece)
+                    remaining -= q - p
+                    p = q
+                    if remaining == 0:
+                        state = CHUNK_END
+                elif state == CHUNK_END:
+                    if end - p < 2:
+                        break
+                    if buffer[p:p + 2] != CRLF:
+                        raise ValueError("Chunk data not terminated by CRLF")
+                    p += 2
+                    state = CHUNK_SIZE
+                else:
+                    eol = buffer.find(CRLF, p)
+                    if eol == -1:
+                        if end - p > max_chunk_line_size:
+                            raise ValueError("Chunk line too long")
+                        break
+                    line = bytes(view[p:eol])
+                    p = eol + 2
+                    if state == CHUNK_SIZE:
+                        size, _, extensions = line.partition(b";")
+                        if extensions:
+                            size = size.rstrip(b" \t")
+                        # int() alone would also accept signs, prefixes
+                        # and surrounding whitespace
+                        if not chunk_size_pattern.match(size):
+                            raise ValueError("Invalid chunk size %r" % size)
+                        remaining = int(size, 16)
+                        if extensions:
+                            if pieces:
+                                delivered, pieces = pieces, []
+                                self._deliver(response, delivered)
+                            extensions = parse_chunk_extensions(b";" + extensions)
+                            response.on_chunk_extensions(extensions)
+                        state = CHUNK_DATA if remaining else CHUNK_TRAILER
+                    elif line:
+                        log.info("R[%d]: %s", self.fd, line.decode())
+                        if line[:1] in (SP, HT):
+                            if self.chunk_trailer is not None:
+                                response.trailers.fold(line.strip())
+                        else:
+                            name, _, value = line.partition(b":")
+                            response.trailers.add(name, intern_bytes(value.strip()))
+                            self.chunk_trailer = name
+                    else:
+                        # Empty line after last chunk: end of message
+                        if pieces:
+                            delivered, pieces = pieces, []
+                            self._deliver(response, delivered)
+                        self.end_response(response)
+                        return p
+        finally:
+            self.chunk_state = state
+            self.chunk_remaining = remaining
+            try:
+                if pieces:
+                    self._deliver(response, pieces)
+            finally:
+                # Release the buffer straight away, even when failing,
+                # so that it can be resized
+                for piece in slices:
+                    piece.release()
+                view.release()
+        return p
 
-    def on_final_chunk_trailer(self, response, data):
-        # TODO: parse chunk trailer <https://tools.ietf.org/html/rfc7230#section-4.1.2>
-        return False
+    def _deliver(self, response, pieces):
+        if len(pieces) == 1:
+            data = bytes(pieces[0])
+        else:
+            data = b"".join(pieces)
+        if len(data) > 1024:
+            log.info("R[%d]: %d bytes", self.fd, len(data))
+        else:
+            log.info("R[%d]: %r", self.fd, data)
+        response.on_body_data(data)
 
 
 class HTTPRequest(object):
@@ -307,19 +717,84 @@ class HTTPRequest(object):
     def trace(cls, target, **headers):
         return HTTPRequest(b"TRACE", target, **headers)
 
-    def __init__(self, method, target, body=None, **headers):
+    expectation = None
+
+    def __init__(self, method, target, body=None, compress=None, expect_continue=False,
+                 **headers):
         self.method = method
         self.target = target
         self.body = body
+        self.compress = compress
+        self.expect_continue = expect_continue
         self.headers = headers
 
 
+class ContinueExpectation(object):
+    """ Decision on whether to send the content of a request sent with
+    `Expect: 100-continue`. The first decision made stands, whether that
+    comes from a 100 (Continue) response, from a final response or from
+    the transmitter giving up waiting.
+    """
+
+    proceed = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._decided = Event()
+
+    def decide(self, proceed):
+        with self._lock:
+            if self.proceed is None:
+                self.proceed = proceed
+                self._decided.set()
+            return self.proceed
+
+    def wait(self, timeout=None):
+        self._decided.wait(timeout)
+        return self.decide(True)
+
+
 class HTTPResponse(object):
 
+    # Set to True to receive headers as a MessageHeaderView over the raw
+    # header block instead of a fully populated MessageHeaderDict
+    lazy_headers = False
+
+    # Content received with a supported Content-Encoding is decoded
+    # before being passed to on_content. To have servers compress
+    # responses, send an Accept-Encoding header, e.g. ACCEPT_ENCODING.
+    decode_content = True
+    decoder = None
+
+    # Set to True by responses that are done with the data passed to
+    # on_body_data by the time it returns, such as by copying it out.
+    # These are given views of the receive buffer rather than copies.
+    copies_body_data = False
+
+    # Content passed to the default on_content implementation is
+    # collected into `body`, a ContentBuffer. Content larger than
+    # `spill_size` is held in a temporary file rather than in memory.
+    spill_size = None
+    body = None
+
+    # Deadlines in seconds, each None for no deadline: for the first
+    # data of the response to arrive, for the longest gap between
+    # arrivals of data and for the whole response. A response that
+    # misses a deadline fails with a TimeoutError and its connection is
+    # closed, since the responses following it can no longer be read.
+    first_byte_timeout = None
+    read_timeout = None
+    total_timeout = None
+    timers = ()
+    first_byte_timer = None
+
     http_version = None
     status_code = None
     reason_phrase = None
     headers = None
+    trailers = None
+    request = None
+    error = None
     end = None
 
     def __new__(cls, *args, **kwargs):
@@ -339,12 +814,271 @@ class HTTPResponse(object):
     def __getitem__(self, name):
         return self.headers[name]
 
+    def on_head(self):
+        """ Called once the status line and headers have been received.
+        """
+        if self.decode_content:
+            coding = self.headers.get(b"content-encoding")
+            if coding:
+                self.decoder = ContentDecoder.for_coding(coding)
+
+    def on_interim(self):
+        """ Called for each interim (1xx) response received before the
+        final response. The status line and headers of the interim
+        response are available as usual until the final response
+        replaces them.
+        """
+
+    def on_chunk_extensions(self, extensions):
+        pass
+
     def on_body_data(self, data):
-        # TODO: buffer raw data and coerce to typed content for certain content types
-        self.on_content(data)
+        decoder = self.decoder
+        if decoder is None:
+            self.on_content(data)
+        else:
+            for decoded in decoder.decode(data):
+                self.on_content(decoded)
 
     def on_content(self, data):
-        pass
+        body = self.body
+        if body is None:
+            size_hint = None
+            if self.decoder is None:
+                size_hint = int(self.headers.get(b"content-length", 0)) or None
+            self.body = body = ContentBuffer(size_hint, self.spill_size)
+        body.write(data)
+
+    def on_end(self):
+        """ Called once the response is complete, before the `end`
+        event is set.
+        """
+        decoder = self.decoder
+        if decoder is not None:
+            for decoded in decoder.flush():
+                self.on_content(decoded)
+
+    def on_error(self, error):
+        """ Called if the response fails, before the `end` event is set.
+        The error is also available as `error`.
+        """
+
+    def content(self):
+        """ Return the collected content, coerced to a type suitable for
+        the content type. JSON is decoded to Python values and text is
+        decoded to a string, using the charset provided. All other
+        content is returned as bytes.
+        """
+        body = self.body
+        data = body.getvalue() if body is not None else b""
+        content_type, params = parse_header(self.headers.get(b"content-type"))
+        if content_type is None:
+            return data
+        content_type = content_type.lower()
+        charset = (params.get(b"charset") or b"utf-8").decode("ascii")
+        if content_type == b"application/json" or content_type.endswith(b"+json"):
+            if not data:
+                return None
+            return json_loads(data.decode(charset))
+        elif content_type.startswith(b"text/"):
+            return data.decode(charset)
+        else:
+            return data
+
+
+class ForwardingResponse(HTTPResponse):
+    """ Response that passes everything it receives on to a target
+    response, marking the target as ended when it ends itself. This is
+    used by layers that stand between a connection and the response
+    supplied by a caller.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.first_byte_timeout = target.first_byte_timeout
+        self.read_timeout = target.read_timeout
+        self.total_timeout = target.total_timeout
+
+    def forward_head(self):
+        target = self.target
+        target.http_version = self.http_version
+        target.status_code = self.status_code
+        target.reason_phrase = self.reason_phrase
+        target.headers = self.headers
+        target.on_head()
+
+    def forward_end(self):
+        target = self.target
+        target.trailers = self.trailers
+        try:
+            target.on_end()
+        finally:
+            target.end.set()
+
+    def forward_error(self, error):
+        target = self.target
+        target.error = error
+        try:
+            target.on_error(error)
+        finally:
+            target.end.set()
+
+    def on_head(self):
+        self.forward_head()
+
+    def on_chunk_extensions(self, extensions):
+        self.target.on_chunk_extensions(extensions)
+
+    def on_body_data(self, data):
+        self.target.on_body_data(data)
+
+    def on_end(self):
+        self.forward_end()
+
+    def on_error(self, error):
+        self.forward_error(error)
+
+
+class HTTPReadIntoResponse(HTTPResponse):
+    """ Response that writes successful (2xx) content directly into a
+    caller-provided writable buffer, such as a bytearray, an array or an
+    mmap, starting at `offset`. Content that would overflow the buffer
+    fails the response with a BufferError. Content for other status
+    codes is collected as normal.
+
+    Content delimited by Content-Length is copied into the buffer
+    straight from the connection's receive buffer, without any
+    intermediate copy.
+    """
+
+    copies_body_data = True
+
+    def __init__(self, buffer, offset=0):
+        self.view = memoryview(buffer).cast("B")
+        self.offset = self.position = offset
+
+    def on_head(self):
+        super(HTTPReadIntoResponse, self).on_head()
+        if 200 <= self.status_code < 300 and self.decoder is None:
+            content_length = int(self.headers.get(b"content-length", 0))
+            if self.offset + content_length > len(self.view):
+                raise BufferError("Content length %d exceeds buffer space %d" %
+                                  (content_length, len(self.view) - self.offset))
+
+    def on_content(self, data):
+        if not 200 <= self.status_code < 300:
+            super(HTTPReadIntoResponse, self).on_content(data)
+            return
+        position = self.position
+        end = position + len(data)
+        if end > len(self.view):
+            raise BufferError("Content exceeds buffer space %d" % (len(self.view) - self.offset))
+        self.view[position:end] = data
+        self.position = end
+
+    def content(self):
+        """ Return a memoryview over the part of the buffer that has
+        been filled with content.
+        """
+        if not 200 <= self.status_code < 300:
+            return super(HTTPReadIntoResponse, self).content()
+        return self.view[self.offset:self.position]
+
+
+class ContentBuffer(object):
+    """ Growable buffer for received content. Data is appended to a
+    single bytearray, preallocated if the size is known in advance, and
+    is moved into a temporary file once more than `spill_size` bytes
+    have been written.
+    """
+
+    def __init__(self, size_hint=None, spill_size=None):
+        self.spill_size = spill_size or default_spill_size
+        self.length = 0
+        if size_hint and size_hint > self.spill_size:
+            self.buffer = None
+            self.file = TemporaryFile()
+        else:
+            self.buffer = bytearray(size_hint or 0)
+            self.file = None
+
+    def __repr__(self):
+        return "<%s length=%d%s>" % (self.__class__.__name__, self.length,
+                                     " spilled" if self.spilled() else "")
+
+    def __len__(self):
+        return self.length
+
+    def spilled(self):
+        return self.file is not None
+
+    def write(self, data):
+        length = self.length
+        end = length + len(data)
+        if self.file is None:
+            if end <= self.spill_size:
+                buffer = self.buffer
+                if end <= len(buffer):
+                    buffer[length:end] = data
+                else:
+                    del buffer[length:]
+                    buffer += data
+                self.length = end
+                return
+            self.file = TemporaryFile()
+            self.file.write(memoryview(self.buffer)[:length])
+            self.buffer = None
+        self.file.write(data)
+        self.length = end
+
+    def getvalue(self):
+        """ Return the content as bytes.
+        """
+        if self.file is None:
+            return bytes(self.buffer[:self.length])
+        self.file.seek(0)
+        return self.file.read(self.length)
+
+    def view(self):
+        """ Return a memoryview of the content. For spilled
+        content, this maps the temporary file into memory. No more data
+        should be written after a view has been taken.
+        """
+        if self.file is None:
+            return memoryview(self.buffer)[:self.length]
+        if not self.length:
+            return memoryview(b"")
+        self.file.flush()
+        return memoryview(mmap(self.file.fileno(), self.length, access=ACCESS_READ))
+
+    def reader(self):
+        """ Return a file-like object from which the content can be read.
+        """
+        if self.file is None:
+            return BytesIO(self.view())
+        if not self.length:
+            return BytesIO()
+        self.file.flush()
+        return mmap(self.file.fileno(), self.length, access=ACCESS_READ)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.buffer = None
+
+
+def parse_chunk_extensions(value):
+    """ Parse chunk extensions, as described by RFC 7230 section 4.1.1,
+    into a dictionary. Quoted values are unquoted and extensions without
+    a value map to None.
+    """
+    extensions = {}
+    # Chunk extensions share their syntax with header parameters
+    for name, quoted_value in header_parameter_pattern.findall(value):
+        if quoted_value.startswith(b'"'):
+            quoted_value = quoted_pair_pattern.sub(br"\1", quoted_value[1:-1])
+        extensions[name.lower()] = quoted_value or None
+    return extensions
 
 
 def basic_auth(*args):
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Coalescing of identical in-flight requests.
+"""
+
+from logging import getLogger
+from threading import Lock
+
+from shortwave.http.client import HTTP, HTTPResponse
+from shortwave.messaging import MessageHeaderDict
+
+
+__all__ = ["CoalescingHTTP", "SharedResponse"]
+
+log = getLogger("shortwave.http")
+
+coalescable_methods = {b"GET", b"HEAD"}
+
+
+class SharedResponse(HTTPResponse):
+    """ Response shared by every caller waiting on the same request.
+    Everything received is passed on to each target response. Body data
+    is also kept so that targets joining part way through can be brought
+    up to date, but only up to `max_replay_size` bytes; beyond that, the
+    response can no longer be joined.
+
+    Targets are only ever called from the receiving thread and never
+    with the lock held, so a target is free to make further requests
+    from within its callbacks.
+    """
+
+    max_replay_size = 1048576
+
+    def __init__(self, key, on_finish):
+        self.key = key
+        self.on_finish = on_finish
+        self.targets = []
+        self.joiners = []
+        self.pieces = []
+        self.size = 0
+        self.head_received = False
+        self._lock = Lock()
+
+    def join(self, target):
+        """ Attach a target response. A target joining after the head
+        has arrived is brought up to date by the receiving thread along
+        with whatever arrives next. Returns False if the shared response
+        has finished, or has outgrown its replay buffer, and can no
+        longer be joined.
+        """
+        with self._lock:
+            if self.end.is_set() or self.pieces is None:
+                return False
+            if self.head_received:
+                self.joiners.append(target)
+            else:
+                self.targets.append(target)
+            return True
+
+    def _head(self, target):
+        target.http_version = self.http_version
+        target.status_code = self.status_code
+        target.reason_phrase = self.reason_phrase
+        target.headers = self.headers
+        target.on_head()
+
+    def _dispatch(self, target, method, *args):
+        try:
+            method(*args)
+        except Exception as error:
+            log.error("Shared response target %r failed: %s", target, error)
+            self._fail(target, error)
+            return False
+        else:
+            return True
+
+    def _fail(self, target, error):
+        target.error = error
+        try:
+            target.on_error(error)
+        finally:
+            target.end.set()
+
+    def _collect(self):
+        """ Move any new joiners over to the targets, returning them
+        along with the pieces to replay to them. Must be called with the
+        lock held.
+        """
+        joiners = self.joiners
+        if not joiners:
+            return (), ()
+        self.joiners = []
+        self.targets.extend(joiners)
+        return joiners, list(self.pieces)
+
+    def _replay(self, joiners, pieces):
+        """ Bring new joiners up to date, returning those that failed.
+        """
+        return [target for target in joiners
+                if not (self._dispatch(target, self._head, target) and
+                        all(self._dispatch(target, target.on_body_data, piece)
+                            for piece in pieces))]
+
+    def _broadcast(self, targets, failed, name, *args):
+        failed = list(failed)
+        for target in targets:
+            if target not in failed and \
+                    not self._dispatch(target, getattr(target, name), *args):
+                failed.append(target)
+        self._drop(failed)
+
+    def _drop(self, failed):
+        if failed:
+            with self._lock:
+                self.targets = [target for target in self.targets if target not in failed]
+
+    def on_head(self):
+        with self._lock:
+            self.head_received = True
+            targets = list(self.targets)
+        self._drop([target for target in targets
+                    if not self._dispatch(target, self._head, target)])
+
+    def on_chunk_extensions(self, extensions):
+        with self._lock:
+            joiners, pieces = self._collect()
+            targets = list(self.targets)
+        self._broadcast(targets, self._replay(joiners, pieces),
+                        "on_chunk_extensions", extensions)
+
+    def on_body_data(self, data):
+        data = bytes(data)
+        with self._lock:
+            joiners, pieces = self._collect()
+            targets = list(self.targets)
+            if self.pieces is not None:
+                self.size += len(data)
+                if self.size > self.max_replay_size:
+                    self.pieces = None
+                else:
+                    self.pieces.append(data)
+        self._broadcast(targets, self._replay(joiners, pieces), "on_body_data", data)
+
+    def on_end(self):
+        self.on_finish(self)
+        with self._lock:
+            joiners, pieces = self._collect()
+            targets = self.targets
+            self.targets = []
+            self.pieces = None
+            # Set here rather than by the connection so that no target
+            # can join between delivery and completion
+            self.end.set()
+        failed = self._replay(joiners, pieces)
+        for target in targets:
+            if target in failed:
+                continue
+            target.trailers = self.trailers
+            try:
+                target.on_end()
+            except Exception as error:
+                self._fail(target, error)
+            else:
+                target.end.set()
+
+    def on_error(self, error):
+        self.on_finish(self)
+        with self._lock:
+            targets = self.targets + self.joiners
+            self.targets = []
+            self.joiners = []
+            self.pieces = None
+            self.end.set()
+        for target in targets:
+            self._fail(target, error)
+
+
+class CoalescingHTTP(HTTP):
+    """ HTTP connection that sends only one of any number of identical
+    safe requests that are in flight at the same time. Requests are
+    identical if they share a method, target and headers. Every caller
+    receives its own copy of the response.
+
+    The shared request runs to the deadlines of the response supplied
+    with it. A later caller only joins it if its own response has the
+    same deadlines; otherwise its request is sent separately.
+    """
+
+    def __init__(self, authority, receiver=None, rx_buffer_size=None, **headers):
+        super(CoalescingHTTP, self).__init__(authority, receiver, rx_buffer_size, **headers)
+        self.in_flight = {}
+        self._in_flight_lock = Lock()
+
+    @classmethod
+    def request_key(cls, request):
+        if request.method not in coalescable_methods or request.body is not None or \
+                request.expect_continue:
+            return None
+        return (request.method, request.target,
+                tuple(sorted(MessageHeaderDict(request.headers).items())))
+
+    def _finish(self, shared):
+        with self._in_flight_lock:
+            if self.in_flight.get(shared.key) is shared:
+                del self.in_flight[shared.key]
+
+    def append(self, request, response):
+        key = self.request_key(request)
+        if key is None:
+            super(CoalescingHTTP, self).append(request, response)
+            return
+        response.request = request
+        key += (response.first_byte_timeout, response.read_timeout, response.total_timeout)
+        with self._in_flight_lock:
+            shared = self.in_flight.get(key)
+            if shared is not None and shared.join(response):
+                log.debug("Coalesced %s %s", request.method.decode("latin-1"),
+                          request.target.decode("latin-1"))
+                return
+            shared = SharedResponse(key, self._finish)
+            shared.first_byte_timeout = response.first_byte_timeout
+            shared.read_timeout = response.read_timeout
+            shared.total_timeout = response.total_timeout
+            shared.join(response)
+            self.in_flight[key] = shared
+        super(CoalescingHTTP, self).append(request, shared)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content codings, as described by RFC 7231 section 3.1.2.
+"""
+
+from zlib import compressobj, decompressobj, error as zlib_error, MAX_WBITS, Z_SYNC_FLUSH
+
+from shortwave.compat import bstr
+
+
+__all__ = ["ACCEPT_ENCODING", "ContentDecoder", "ContentEncoder"]
+
+# Value for an Accept-Encoding header covering all supported codings
+ACCEPT_ENCODING = b"gzip, deflate"
+
+# Maximum amount of decoded data produced from a single step
+default_max_step_size = 65536
+
+wbits = {
+    b"gzip": 16 + MAX_WBITS,
+    b"x-gzip": 16 + MAX_WBITS,
+    b"deflate": MAX_WBITS,
+}
+
+
+class ContentEncoder(object):
+    """ Incremental gzip encoder for request content.
+    """
+
+    coding = b"gzip"
+
+    def __init__(self, level=6):
+        self._compressor = compressobj(level, 8, 16 + MAX_WBITS)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.coding.decode())
+
+    def encode(self, data):
+        """ Encode a piece of data, returning whatever encoded output is
+        available. This may be empty.
+        """
+        return self._compressor.compress(data)
+
+    def sync(self):
+        """ Return all encoded output for data passed in so far, without
+        ending the stream.
+        """
+        return self._compressor.flush(Z_SYNC_FLUSH)
+
+    def flush(self):
+        """ Return any remaining encoded output and end the stream.
+        """
+        return self._compressor.flush()
+
+    def encode_all(self, data):
+        """ Encode a complete piece of data in one go.
+        """
+        return self._compressor.compress(data) + self._compressor.flush()
+
+    def encode_chunks(self, chunks):
+        """ Encode an iterable of chunks, yielding encoded chunks. An
+        empty input chunk produces a sync flush, followed by an empty
+        chunk so that the flush carries through to the output. Text
+        chunks are encoded as UTF-8 first.
+        """
+        for chunk in chunks:
+            if chunk:
+                encoded = self._compressor.compress(bstr(chunk))
+                if encoded:
+                    yield encoded
+            else:
+                yield self._compressor.flush(Z_SYNC_FLUSH)
+                yield b""
+        yield self._compressor.flush()
+
+
+class ContentDecoder(object):
+    """ Incremental decoder for gzip and deflate content codings. Data
+    is decompressed as it arrives and decoded output is produced in
+    pieces of no more than `max_step_size` bytes, so that a small
+    amount of highly compressed input cannot expand into a single
+    huge allocation.
+    """
+
+    @classmethod
+    def for_coding(cls, coding, max_step_size=None):
+        """ Return a decoder for the given Content-Encoding value, or
+        None if the coding is identity or is not supported.
+        """
+        coding = coding.strip().lower()
+        if coding in wbits:
+            return cls(coding, max_step_size)
+        return None
+
+    def __init__(self, coding, max_step_size=None):
+        self.coding = coding
+        self.max_step_size = max_step_size or default_max_step_size
+        self._decompressor = decompressobj(wbits[coding])
+        self._started = False
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.coding.decode())
+
+    def decode(self, data):
+        """ Decode a piece of encoded data, yielding decoded pieces.
+        """
+        max_step_size = self.max_step_size
+        data = bytes(data)
+        while data:
+            decompressor = self._decompressor
+            try:
+                decoded = decompressor.decompress(data, max_step_size)
+            except zlib_error:
+                if self._started or self.coding != b"deflate":
+                    raise
+                # Some servers send raw deflate data without a zlib wrapper
+                self._decompressor = decompressobj(-MAX_WBITS)
+                continue
+            self._started = True
+            if decoded:
+                yield decoded
+            if decompressor.unconsumed_tail:
+                data = decompressor.unconsumed_tail
+            elif decompressor.eof and decompressor.unused_data:
+                # Concatenated gzip members
+                data = decompressor.unused_data
+                self._decompressor = decompressobj(wbits[self.coding])
+            else:
+                data = b""
+
+    def flush(self):
+        """ Yield any remaining decoded data.
+        """
+        decoded = self._decompressor.flush()
+        if decoded:
+            yield decoded
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Hedged requests, for reducing tail latency by racing a duplicate request
+against one that is slow to respond.
+"""
+
+from collections import deque
+from logging import getLogger
+from threading import Event, Lock
+
+from shortwave.compat import monotonic
+from shortwave.http.client import HTTP, ForwardingResponse
+
+
+__all__ = ["HedgedHTTP"]
+
+log = getLogger("shortwave.http")
+
+idempotent_methods = {b"GET", b"HEAD", b"PUT", b"DELETE", b"OPTIONS", b"TRACE"}
+
+
+class Race(object):
+    """ Decides which of a number of duplicate responses is passed on
+    to the caller. The first to receive a head wins. If every runner
+    fails before that, the race is decided without a winner.
+    """
+
+    def __init__(self):
+        self.winner = None
+        self.runners = 0
+        self.decided = Event()
+        self._lock = Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.decided.is_set():
+                return False
+            self.runners += 1
+            return True
+
+    def claim(self, runner):
+        with self._lock:
+            if self.winner is None and not self.decided.is_set():
+                self.winner = runner
+                self.decided.set()
+            return self.winner is runner
+
+    def drop_out(self, runner):
+        """ Remove a failed runner from the race, returning True if it
+        was the last one remaining and the failure should be reported.
+        """
+        with self._lock:
+            if self.winner is runner:
+                return True
+            self.runners -= 1
+            if self.winner is None and self.runners == 0:
+                self.decided.set()
+                return True
+            return False
+
+
+class HedgedResponse(ForwardingResponse):
+    """ One of a number of duplicate responses in a race. Only the
+    winner is forwarded to the target.
+    """
+
+    def __init__(self, target, race):
+        super(HedgedResponse, self).__init__(target)
+        self.race = race
+        self.started = monotonic()
+        self.head_time = None
+
+    def won(self):
+        return self.race.winner is self
+
+    def on_head(self):
+        if self.race.claim(self):
+            self.head_time = monotonic() - self.started
+            self.forward_head()
+
+    def on_chunk_extensions(self, extensions):
+        if self.won():
+            self.target.on_chunk_extensions(extensions)
+
+    def on_body_data(self, data):
+        if self.won():
+            self.target.on_body_data(data)
+
+    def on_end(self):
+        if self.won():
+            self.forward_end()
+
+    def on_error(self, error):
+        if self.race.drop_out(self):
+            self.forward_error(error)
+
+
+class HedgedHTTP(object):
+    """ Client that sends each idempotent request on a primary
+    connection and, if no head has been received after `delay` seconds,
+    sends a duplicate on a second connection, to `hedge_authority` if
+    given. Whichever head arrives first is passed on to the caller's
+    response and the connection carrying the loser is closed. A hedge
+    that wins takes over as the primary connection.
+
+    Requests are never pipelined behind others: each is sent on a
+    connection with no responses outstanding, opening one if needed.
+    Head latencies therefore exclude earlier content, and closing a
+    losing connection cannot cut short any other response.
+
+    If `percentile` is given, the delay is instead taken from that
+    percentile of recently observed head latencies, once enough have
+    been observed, with `delay` used until then.
+
+    Requests with other methods are never duplicated. Like `HTTP`,
+    instances are not intended to be shared between threads.
+    """
+
+    Connection = HTTP
+
+    #: Number of recent head latencies kept for percentile calculation
+    latency_samples = 100
+
+    #: Number of head latencies needed before percentile calculation is used
+    min_latency_samples = 20
+
+    def __init__(self, authority, hedge_authority=None, delay=0.1, percentile=None,
+                 **headers):
+        self.authorities = [authority, hedge_authority or authority]
+        self.delay = delay
+        self.percentile = percentile
+        self.headers = headers
+        self.connections = [[], []]
+        self.latencies = deque(maxlen=self.latency_samples)
+        self.hedges = 0
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.authorities[0].decode())
+
+    def hedge_delay(self):
+        """ Return the time to wait for a head before hedging.
+        """
+        percentile = self.percentile
+        latencies = self.latencies
+        if percentile is None or len(latencies) < self.min_latency_samples:
+            return self.delay
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+    def connection(self, index):
+        """ Return a connection to the primary (0) or hedge (1)
+        authority that has no responses outstanding.
+        """
+        connections = self.connections[index]
+        connections[:] = [http for http in connections if not http.stopped()]
+        for http in connections:
+            if not http.responses:
+                return http
+        http = self.Connection(self.authorities[index], **self.headers)
+        connections.append(http)
+        return http
+
+    def _send(self, index, request, response):
+        http = self.connection(index)
+        try:
+            http.append(request, response)
+            http.transmit()
+        except (IOError, OSError) as error:
+            self._discard(index, http, error)
+            raise
+        return http
+
+    def _discard(self, index, http, error=None):
+        connections = self.connections[index]
+        if http in connections:
+            connections.remove(http)
+        http.abort(error)
+
+    def request(self, request, response, timeout=None):
+        """ Send a request and wait until a head has been received for
+        it, hedging if that takes too long. Returns the response, which
+        may still be receiving content.
+        """
+        race = Race()
+        race.enter()
+        primary = HedgedResponse(response, race)
+        primary_http = self._send(0, request, primary)
+        hedge = hedge_http = None
+        if request.method in idempotent_methods and \
+                not race.decided.wait(self.hedge_delay()) and race.enter():
+            log.debug("%r: hedging %s", self, request.target.decode("latin-1"))
+            self.hedges += 1
+            hedge = HedgedResponse(response, race)
+            try:
+                hedge_http = self._send(1, request, hedge)
+            except (IOError, OSError) as error:
+                # The hedge may already have been failed with its connection
+                if not hedge.end.is_set():
+                    hedge.error = error
+                    hedge.on_error(error)
+                    hedge.end.set()
+                hedge = None
+        race.decided.wait(timeout)
+        winner = race.winner
+        if winner is primary:
+            self.latencies.append(primary.head_time)
+        elif winner is not None:
+            # The primary is abandoned before its head arrives, but took
+            # at least as long as the hedge did to win. Leaving it out
+            # would bias the percentile towards fast responses.
+            self.latencies.append(winner.started + winner.head_time - primary.started)
+        if hedge is not None:
+            if winner is hedge:
+                # The hedge connection has proved faster, so promote it
+                self._discard(0, primary_http, IOError("Lost to hedged request"))
+                self.connections.reverse()
+                self.authorities.reverse()
+            else:
+                self._discard(1, hedge_http, IOError("Lost to primary request"))
+        return response
+
+    def close(self):
+        for index, connections in enumerate(self.connections):
+            for http in list(connections):
+                self._discard(index, http)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Multipart content, as described by RFC 2046 (section 5.1) and, for
+form submissions, RFC 7578.
+"""
+
+from binascii import hexlify
+from logging import getLogger
+from os import fstat, urandom
+from os.path import basename
+
+from shortwave.compat import bstr
+from shortwave.http.client import HTTPResponse, ContentBuffer
+from shortwave.messaging import CRLF, MessageHeaderDict, parse_header
+
+
+__all__ = ["MultipartParser", "MultipartResponse", "MultipartEncoder", "Part"]
+
+log = getLogger("shortwave.http")
+
+PREAMBLE = 0
+HEADERS = 1
+BODY = 2
+EPILOGUE = 3
+
+# Longest part header block accepted before giving up
+max_part_header_size = 65536
+
+# Size of blocks read from files being encoded
+file_block_size = 65536
+
+
+class MultipartParser(object):
+    """ Incremental parser for multipart content. Data can be fed in
+    pieces of any size, with `on_part_begin`, `on_part_data` and
+    `on_part_end` called as parts are found. Each byte is examined for
+    a delimiter only once, apart from the few at the end of each piece
+    that could be the start of a delimiter split across pieces.
+    """
+
+    def __init__(self, boundary, on_part_begin=None, on_part_data=None, on_part_end=None):
+        if not boundary:
+            raise ValueError("A multipart boundary is required")
+        self.delimiter = CRLF + b"--" + bstr(boundary)
+        if on_part_begin is not None:
+            self.on_part_begin = on_part_begin
+        if on_part_data is not None:
+            self.on_part_data = on_part_data
+        if on_part_end is not None:
+            self.on_part_end = on_part_end
+        # The first delimiter need not be preceded by a line break
+        self.buffer = bytearray(CRLF)
+        self.state = PREAMBLE
+
+    def on_part_begin(self, headers):
+        pass
+
+    def on_part_data(self, data):
+        pass
+
+    def on_part_end(self):
+        pass
+
+    def finished(self):
+        return self.state == EPILOGUE
+
+    def feed(self, data):
+        """ Parse another piece of content.
+        """
+        if self.state == EPILOGUE:
+            return
+        buffer = self.buffer
+        buffer += data
+        delimiter = self.delimiter
+        delimiter_size = len(delimiter)
+        p = 0
+        while True:
+            state = self.state
+            if state == HEADERS:
+                if buffer[p:p + 2] == CRLF:
+                    header_end, body_start = p, p + 2
+                else:
+                    header_end = buffer.find(b"\r\n\r\n", p)
+                    if header_end == -1:
+                        if len(buffer) - p > max_part_header_size:
+                            raise ValueError("Part header block too long")
+                        break
+                    body_start = header_end + 4
+                self.state = BODY
+                self.on_part_begin(MessageHeaderDict.from_bytes(memoryview(buffer)[p:header_end]))
+                p = body_start
+            elif state == BODY or state == PREAMBLE:
+                found = buffer.find(delimiter, p)
+                if found == -1:
+                    # Hold back anything that could begin a delimiter
+                    keep = max(p, len(buffer) - delimiter_size + 1)
+                    if state == BODY and keep > p:
+                        self.on_part_data(bytes(buffer[p:keep]))
+                    p = keep
+                    break
+                after = found + delimiter_size
+                closing = buffer[after:after + 2] == b"--"
+                eol = -1 if closing else buffer.find(CRLF, after)
+                if len(buffer) < after + 2 or (not closing and eol == -1):
+                    # The rest of the delimiter line is yet to arrive
+                    if len(buffer) - after > max_part_header_size:
+                        raise ValueError("Multipart delimiter line too long")
+                    if state == BODY and found > p:
+                        self.on_part_data(bytes(buffer[p:found]))
+                    p = found
+                    break
+                if state == BODY:
+                    if found > p:
+                        self.on_part_data(bytes(buffer[p:found]))
+                    self.on_part_end()
+                if closing:
+                    self.state = EPILOGUE
+                    p = len(buffer)
+                    break
+                # Any transport padding up to the end of the line is skipped
+                self.state = HEADERS
+                p = eol + 2
+            else:
+                p = len(buffer)
+                break
+        del buffer[:p]
+
+    def close(self):
+        """ Check that the content ended properly.
+        """
+        if self.state != EPILOGUE:
+            raise ValueError("Multipart content ended without a closing delimiter")
+
+
+class Part(object):
+    """ A single part of multipart content, with its own headers and a
+    ContentBuffer holding its body.
+    """
+
+    def __init__(self, headers, spill_size=None):
+        self.headers = headers
+        self.body = ContentBuffer(spill_size=spill_size)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.headers.get(b"content-type"))
+
+    def name(self):
+        """ Return the form field name given in Content-Disposition, if
+        any.
+        """
+        _, params = parse_header(self.headers.get(b"content-disposition"))
+        return params.get(b"name") if params else None
+
+    def filename(self):
+        _, params = parse_header(self.headers.get(b"content-disposition"))
+        return params.get(b"filename") if params else None
+
+    def content(self):
+        return self.body.getvalue()
+
+
+class MultipartResponse(HTTPResponse):
+    """ Response that parses `multipart/*` content as it arrives. By
+    default each part is collected into a Part in `parts`, but the
+    `on_part_begin`, `on_part_data` and `on_part_end` hooks can be
+    overridden to stream parts elsewhere. Content of any other type is
+    collected as normal.
+    """
+
+    parser = None
+
+    def __init__(self):
+        self.parts = []
+
+    def on_head(self):
+        super(MultipartResponse, self).on_head()
+        content_type, params = parse_header(self.headers.get(b"content-type"))
+        if content_type and content_type.lower().startswith(b"multipart/"):
+            self.parser = MultipartParser(params.get(b"boundary"), self.on_part_begin,
+                                          self.on_part_data, self.on_part_end)
+
+    def on_content(self, data):
+        parser = self.parser
+        if parser is None:
+            super(MultipartResponse, self).on_content(data)
+        else:
+            parser.feed(data)
+
+    def on_end(self):
+        super(MultipartResponse, self).on_end()
+        if self.parser is not None:
+            self.parser.close()
+
+    def on_part_begin(self, headers):
+        self.parts.append(Part(headers, self.spill_size))
+
+    def on_part_data(self, data):
+        self.parts[-1].body.write(data)
+
+    def on_part_end(self):
+        pass
+
+
+class MultipartEncoder(object):
+    """ Multipart content to be sent as the body of a request. Fields
+    and files are added with `add_field` and `add_file`; file content is
+    read in blocks as it is sent rather than loaded up front.
+
+    An encoder can be used directly as a body. It is sent with a
+    Content-Length, computed from the sizes of its parts, and its
+    `content_type` is used as the Content-Type unless one is given.
+    To send with chunked transfer coding instead, use `chunks` as the
+    body and pass `content_type` as a header.
+    """
+
+    def __init__(self, subtype=b"form-data", boundary=None):
+        self.boundary = boundary or hexlify(urandom(16))
+        self.content_type = b"multipart/" + subtype + b"; boundary=" + self.boundary
+        self.parts = []
+
+    def __iter__(self):
+        boundary = self.boundary
+        for headers, content, size in self.parts:
+            yield b"--" + boundary + CRLF + headers.to_bytes() + CRLF
+            if isinstance(content, bytes):
+                yield content
+            else:
+                for block in self._read(content, size):
+                    yield block
+            yield CRLF
+        yield b"--" + boundary + b"--" + CRLF
+
+    def _read(self, content, size):
+        f, position = content
+        opened = not hasattr(f, "read")
+        if opened:
+            f = open(f, "rb")
+        try:
+            if position is not None:
+                f.seek(position)
+            remaining = size
+            while remaining:
+                block = f.read(min(file_block_size, remaining))
+                if not block:
+                    raise IOError("File ended %d bytes early" % remaining)
+                remaining -= len(block)
+                yield block
+        finally:
+            if opened:
+                f.close()
+
+    def chunks(self):
+        """ Return a generator of pieces of content, suitable for use as
+        a chunked request body.
+        """
+        return iter(self)
+
+    def content_length(self):
+        boundary_size = len(self.boundary)
+        length = boundary_size + 6
+        for headers, _, size in self.parts:
+            length += boundary_size + 6 + len(headers.to_bytes()) + size + 2
+        return length
+
+    def add(self, headers, content, size=None):
+        """ Add a part with the given headers. Content may be bytes, or a
+        `(file, position)` pair where `file` is a path or an open binary
+        file, in which case `size` bytes are read from `position` when
+        the content is sent.
+        """
+        if isinstance(content, bytes):
+            size = len(content)
+        elif size is None:
+            raise ValueError("The size of file content must be given")
+        self.parts.append((MessageHeaderDict(headers), content, size))
+
+    def add_field(self, name, value, content_type=None):
+        headers = MessageHeaderDict()
+        headers[b"Content-Disposition"] = b'form-data; name="' + quote_field(name) + b'"'
+        if content_type:
+            headers[b"Content-Type"] = bstr(content_type)
+        self.add(headers, bstr(value))
+
+    def add_file(self, name, file, filename=None, content_type=b"application/octet-stream"):
+        """ Add a file, given as a path or an open binary file. Content is
+        read from the current position of an open file, to its end.
+        """
+        if hasattr(file, "read"):
+            position = file.tell()
+            size = fstat(file.fileno()).st_size - position
+            if filename is None:
+                filename = basename(getattr(file, "name", "")) or None
+        else:
+            position = None
+            with open(file, "rb") as f:
+                size = fstat(f.fileno()).st_size
+            if filename is None:
+                filename = basename(file)
+        disposition = b'form-data; name="' + quote_field(name) + b'"'
+        if filename:
+            disposition += b'; filename="' + quote_field(filename) + b'"'
+        headers = MessageHeaderDict()
+        headers[b"Content-Disposition"] = disposition
+        headers[b"Content-Type"] = bstr(content_type)
+        self.add(headers, (file, position), size)
+
+
+def quote_field(value):
+    """ Escape a field name or file name for use in a quoted
+    Content-Disposition parameter, as required by HTML forms.
+    """
+    return bstr(value).replace(b"\r", b"%0D").replace(b"\n", b"%0A").replace(b'"', b"%22")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming decoding of newline-delimited JSON and of JSON text sequences
+(RFC 7464).
+"""
+
+from json import loads as json_loads
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from shortwave.http.client import HTTPResponse
+from shortwave.messaging import parse_header
+
+
+__all__ = ["NDJSONResponse"]
+
+LF = b"\n"
+RS = b"\x1e"
+WHITESPACE = b" \t\r\n"
+
+# Content types that settle how records are separated. Content of
+# any other type is recognised by its first byte instead.
+sequence_content_types = {b"application/json-seq"}
+line_content_types = {b"application/x-ndjson", b"application/ndjson",
+                      b"application/jsonl", b"application/x-jsonlines"}
+
+# Placed on the queue of an iterated response once no more objects
+# will follow
+_end_of_records = object()
+
+
+class NDJSONResponse(HTTPResponse):
+    """ Response that splits content into JSON records as it arrives,
+    across any chunk boundaries. Records are separated by line feeds
+    and blank records are skipped.
+
+    JSON text sequences (RFC 7464), recognised by their content type
+    or by content that starts with a record separator (0x1E), are
+    instead split on record separators, so that texts may span several
+    lines. As the end of a text is only known once the next separator
+    arrives, each text is held back until then or until the content
+    ends.
+
+    Each record is decoded with `loads`, which defaults to
+    `json.loads`, and passed to `on_object`. If no `on_object` callback
+    is supplied, objects are instead queued for retrieval by iterating
+    over the response. Receiving never waits for the iterator, as that
+    would hold up every connection on the receiver, so once more than
+    `max_queue_size` objects are waiting the response fails with a
+    BufferError. Objects already queued can still be iterated over
+    before the error is raised.
+    """
+
+    max_queue_size = 1024
+
+    sequence = None
+
+    def __init__(self, on_object=None, loads=None):
+        self.pending = bytearray()
+        self.loads = loads or json_loads
+        self.queue = None
+        if on_object is None:
+            # Unbounded, so that the end of the records can always be
+            # marked; the limit is applied to objects in _enqueue
+            self.queue = Queue()
+            on_object = self._enqueue
+        self.on_object = on_object
+
+    def __iter__(self):
+        queue = self.queue
+        if queue is None:
+            raise TypeError("Objects for %r are passed to a callback" % self)
+        while True:
+            obj = queue.get()
+            if obj is _end_of_records:
+                break
+            yield obj
+        if self.error is not None:
+            raise self.error
+
+    def on_head(self):
+        super(NDJSONResponse, self).on_head()
+        content_type, _ = parse_header(self.headers.get(b"content-type"))
+        if content_type is not None:
+            content_type = content_type.lower()
+            if content_type in sequence_content_types:
+                self.sequence = True
+            elif content_type in line_content_types:
+                self.sequence = False
+
+    def on_content(self, data):
+        pending = self.pending
+        if self.sequence is None:
+            self.sequence = bytes(data[:1]) == RS
+        separator = RS if self.sequence else LF
+        start = 0
+        scan = len(pending)
+        pending += data
+        while True:
+            eol = pending.find(separator, scan)
+            if eol == -1:
+                break
+            self._decode(pending[start:eol])
+            start = scan = eol + 1
+        if start:
+            del pending[:start]
+
+    def on_end(self):
+        try:
+            super(NDJSONResponse, self).on_end()
+            record = self.pending[:]
+            del self.pending[:]
+            self._decode(record)
+        finally:
+            self._finish()
+
+    def on_error(self, error):
+        try:
+            super(NDJSONResponse, self).on_error(error)
+        finally:
+            self._finish()
+
+    def _decode(self, record):
+        record = bytes(record).lstrip(RS).strip(WHITESPACE)
+        if record:
+            self.on_object(self.loads(record))
+
+    def _enqueue(self, obj):
+        queue = self.queue
+        if queue.qsize() >= self.max_queue_size:
+            raise BufferError("More than %d objects waiting to be iterated over" %
+                              self.max_queue_size)
+        queue.put(obj)
+
+    def _finish(self):
+        if self.queue is not None:
+            self.queue.put(_end_of_records)
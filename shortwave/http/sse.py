@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Server-sent events, as described by the HTML Living Standard (section
+9.2, "Server-sent events").
+"""
+
+from collections import namedtuple
+from logging import getLogger
+from re import compile as re_compile
+from socket import error as socket_error
+from threading import Event
+
+from shortwave.http.client import HTTP, HTTPRequest, HTTPResponse
+
+
+__all__ = ["ServerSentEvent", "EventStreamResponse", "EventSource"]
+
+log = getLogger("shortwave.http")
+
+line_end_pattern = re_compile(br"\r\n|\r|\n")
+
+# Delay in seconds before reconnecting, if the server does not specify one
+default_retry = 3.0
+
+
+class ServerSentEvent(namedtuple("ServerSentEvent", ["event", "data", "id"])):
+    """ A single event received from an event stream. The `event` type
+    defaults to "message" and `data` is a string.
+    """
+
+
+class EventStreamResponse(HTTPResponse):
+    """ Response that parses a `text/event-stream` as content arrives.
+    Complete events are passed to `on_event` and the most recent event
+    ID and reconnection time are tracked in `last_event_id` and `retry`.
+    Each line is examined only once, with any incomplete line held back
+    until more content arrives.
+    """
+
+    def __init__(self, on_event, last_event_id=None, retry=None):
+        self.on_event = on_event
+        self.last_event_id = last_event_id
+        # An ID takes effect only once its event has been dispatched
+        self.event_id = last_event_id
+        self.retry = retry
+        self.pending = bytearray()
+        self.event_type = None
+        self.data = []
+
+    def on_content(self, data):
+        pending = self.pending
+        # Anything held back contains no line ends, other than perhaps a
+        # CR that may be the first half of a CRLF, so only the new
+        # content needs to be searched
+        scan_from = len(pending)
+        if pending[-1:] == b"\r":
+            scan_from -= 1
+        pending += data
+        on_line = self.on_line
+        start = 0
+        end = len(pending)
+        for match in line_end_pattern.finditer(pending, scan_from):
+            line_end = match.start()
+            if line_end == end - 1 and pending[line_end:] == b"\r":
+                # This CR may be the first half of a CRLF
+                break
+            on_line(bytes(pending[start:line_end]))
+            start = match.end()
+        if start:
+            del pending[:start]
+
+    def on_line(self, line):
+        if not line:
+            self.dispatch()
+            return
+        name, colon, value = line.partition(b":")
+        if not name:
+            # Comment
+            return
+        if value[:1] == b" ":
+            value = value[1:]
+        if name == b"data":
+            self.data.append(value)
+        elif name == b"event":
+            self.event_type = value.decode("utf-8", "replace")
+        elif name == b"id":
+            if b"\0" not in value:
+                self.event_id = value.decode("utf-8", "replace")
+        elif name == b"retry":
+            if value.isdigit():
+                self.retry = int(value) / 1000.0
+
+    def dispatch(self):
+        data = self.data
+        event_type = self.event_type or "message"
+        self.data = []
+        self.event_type = None
+        self.last_event_id = self.event_id
+        if data:
+            data = b"\n".join(data).decode("utf-8", "replace")
+            self.on_event(ServerSentEvent(event_type, data, self.last_event_id))
+
+
+class EventSource(object):
+    """ Client for an event stream. Calling `run` connects to the
+    stream and passes events to `on_event` until `close` is called,
+    reconnecting whenever the stream ends or the connection fails. Each
+    reconnection waits for the delay most recently specified by the
+    server and sends the ID of the last event received.
+
+    The stream is not reconnected if the server responds with anything
+    other than 200, such as 204 (No Content).
+    """
+
+    Connection = HTTP
+
+    def __init__(self, authority, target, on_event, last_event_id=None, **headers):
+        self.authority = authority
+        self.target = target
+        self.on_event = on_event
+        self.last_event_id = last_event_id
+        self.retry = default_retry
+        self.headers = headers
+        self.status_code = None
+        self.http = None
+        self._closed = Event()
+
+    def __repr__(self):
+        return "<%s %s%s>" % (self.__class__.__name__, self.authority.decode(),
+                              self.target.decode())
+
+    def closed(self):
+        return self._closed.is_set()
+
+    def close(self):
+        self._closed.set()
+        http = self.http
+        if http is not None:
+            http.abort()
+
+    def connect(self):
+        """ Make a single connection to the stream and wait for it to
+        end. Returns the response.
+        """
+        headers = dict(self.headers, accept=b"text/event-stream",
+                       cache_control=b"no-cache")
+        if self.last_event_id is not None:
+            headers["last_event_id"] = self.last_event_id.encode("utf-8")
+        response = EventStreamResponse(self.on_event, self.last_event_id, self.retry)
+        self.http = http = self.Connection(self.authority)
+        try:
+            http.append(HTTPRequest.get(self.target, **headers), response)
+            http.transmit()
+            if not self.closed():
+                response.end.wait()
+        finally:
+            self.http = None
+            http.abort()
+            self.last_event_id = response.last_event_id
+            if response.retry is not None:
+                self.retry = response.retry
+        return response
+
+    def run(self):
+        while not self.closed():
+            try:
+                response = self.connect()
+            except (IOError, OSError, socket_error) as error:
+                log.error("%r: %s", self, error)
+            else:
+                self.status_code = response.status_code
+                if response.status_code != 200:
+                    break
+            self._closed.wait(self.retry)
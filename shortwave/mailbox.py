@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Readers for archives of RFC 822 messages, in mbox and maildir layouts.
+Archives are memory mapped rather than read, so scanning one takes
+constant memory whatever its size.
+"""
+
+from logging import getLogger
+from mmap import mmap, ACCESS_READ
+from os import listdir
+from os.path import isfile, join as path_join
+
+from shortwave.messaging import Message
+
+
+__all__ = ["MboxReader", "MaildirReader"]
+
+log = getLogger("shortwave.mailbox")
+
+FROM_LINE = b"From "
+NEW_FROM_LINE = b"\n" + FROM_LINE
+
+
+def map_file(path):
+    """ Memory map a file for reading, returning None for an empty file,
+    which cannot be mapped.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        if not f.tell():
+            return None
+        return mmap(f.fileno(), 0, access=ACCESS_READ)
+
+
+class MboxReader(object):
+    """ Reader for an mbox archive, in which each message starts with a
+    `From ` line. Iterating yields a Message for each entry, found by
+    searching the mapped archive for line starts.
+
+    Bodies are not unescaped, so any `>From ` lines quoted by the
+    mboxrd or mboxo conventions appear as stored. Body views should be
+    released before the reader is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = map_file(path)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        data = self.data
+        for start, end in self.offsets():
+            eol = data.find(b"\n", start, end)
+            if eol == -1:
+                eol = end
+            envelope = data[start:eol].rstrip(b"\r")
+            yield Message(data, min(eol + 1, end), end, envelope=envelope, key=start)
+
+    def offsets(self):
+        """ Yield `(start, end)` offsets for each entry, including its
+        `From ` line but not the empty line that separates it from the
+        next.
+        """
+        data = self.data
+        if data is None:
+            return
+        size = len(data)
+        if data[:len(FROM_LINE)] == FROM_LINE:
+            start = 0
+        else:
+            start = data.find(NEW_FROM_LINE)
+            if start == -1:
+                return
+            start += 1
+        find = data.find
+        while start < size:
+            found = find(NEW_FROM_LINE, start)
+            if found == -1:
+                next_start = end = size
+            else:
+                next_start = end = found + 1
+            # Drop the separating empty line
+            if data[end - 2:end] == b"\n\n":
+                end -= 1
+            elif data[end - 4:end] == b"\r\n\r\n":
+                end -= 2
+            yield start, end
+            start = next_start
+
+    def close(self):
+        data = self.data
+        self.data = None
+        if data is not None:
+            try:
+                data.close()
+            except BufferError:
+                # Views of message bodies are still held elsewhere, so
+                # leave the mapping to be released when they are
+                log.debug("%r: leaving mapping open for outstanding views", self)
+
+
+class MaildirReader(object):
+    """ Reader for a maildir, in which each message is held in its own
+    file within the `new` and `cur` subdirectories. Iterating yields a
+    Message for each file, keyed by file name, with the file mapped for
+    as long as the Message is kept.
+    """
+
+    subdirectories = ("new", "cur")
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.path)
+
+    def __iter__(self):
+        for subdirectory in self.subdirectories:
+            directory = path_join(self.path, subdirectory)
+            try:
+                names = sorted(listdir(directory))
+            except OSError:
+                continue
+            for name in names:
+                if name.startswith("."):
+                    continue
+                path = path_join(directory, name)
+                if not isfile(path):
+                    continue
+                data = map_file(path)
+                yield Message(data if data is not None else b"", key=name)
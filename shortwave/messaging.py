@@ -15,10 +15,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from shortwave.compat import bstr, xstr, SPACE
+from collections import OrderedDict
+from re import compile as re_compile
+from time import gmtime, time
+
+from shortwave.compat import bstr, xstr, unicode, frozen_mapping
 
 
 SP = b" "
+HT = b"\t"
 CR = b"\r"
 LF = b"\n"
 COLON = b":"
@@ -28,11 +33,67 @@ NUMBER_SIGN = b"#"
 QUESTION_MARK = b"?"
 
 CRLF = CR + LF
+FOLD_STARTERS = (SP, HT)
+COLON_SP = COLON + SP
 SLASH_SLASH = SLASH + SLASH
 
 
+# Maximum number of entries held by the header_name cache
+max_header_name_cache_size = 4096
+
+_header_name_cache = {}
+
+
+class HeaderNames(dict):
+    """ Dictionary of known headers, mapping matchable names to names
+    with canonical casing. Changes invalidate the header_name cache.
+    """
+
+    def __setitem__(self, key, value):
+        super(HeaderNames, self).__setitem__(key, value)
+        _reset_header_name_cache()
+
+    def __delitem__(self, key):
+        super(HeaderNames, self).__delitem__(key)
+        _reset_header_name_cache()
+
+    def update(self, *args, **kwargs):
+        super(HeaderNames, self).update(*args, **kwargs)
+        _reset_header_name_cache()
+
+    def setdefault(self, key, default=None):
+        value = super(HeaderNames, self).setdefault(key, default)
+        _reset_header_name_cache()
+        return value
+
+    def pop(self, key, *default):
+        value = super(HeaderNames, self).pop(key, *default)
+        _reset_header_name_cache()
+        return value
+
+    def popitem(self):
+        item = super(HeaderNames, self).popitem()
+        _reset_header_name_cache()
+        return item
+
+    def clear(self):
+        super(HeaderNames, self).clear()
+        _reset_header_name_cache()
+
+
+def _reset_header_name_cache():
+    cache = _header_name_cache
+    cache.clear()
+    for matchable_name, canonical_name in header_names.items():
+        entry = (matchable_name, canonical_name)
+        cache[matchable_name] = entry
+        cache[canonical_name] = entry
+        cache[canonical_name.lower()] = entry
+        cache[xstr(canonical_name)] = entry
+
+
 # Dictionary of known headers
-header_names = {
+header_names = HeaderNames({
     "bcc": b"bcc",
     "cc": b"cc",
     "comments": b"Comments",
@@ -57,125 +118,698 @@ header_names = {
     "sender": b"Sender",
     "subject": b"Subject",
     "to": b"To",
-}
+})
 
+_reset_header_name_cache()
 
-class MessageHeaderDict(dict):
+
+# Maximum number of byte strings held by the intern table and by the
+# candidates for it, and the longest byte string that will be interned
+max_interned_size = 4096
+max_interned_length = 64
+
+# Values known to turn up in most messages, which are always interned.
+# Others are interned adaptively, the second time they are seen.
+known_values = (
+    b"HTTP/1.0", b"HTTP/1.1", b"OK", b"Created", b"No Content", b"Not Modified",
+    b"Not Found", b"close", b"keep-alive", b"Keep-Alive", b"chunked", b"gzip", b"deflate",
+    b"identity", b"bytes", b"none", b"0", b"*", b"no-cache", b"no-store", b"private",
+    b"public", b"Accept-Encoding", b"Origin", b"application/json",
+    b"application/json; charset=utf-8", b"application/json;charset=UTF-8",
+    b"application/octet-stream", b"application/x-ndjson", b"text/event-stream",
+    b"text/html", b"text/html; charset=utf-8", b"text/html; charset=UTF-8",
+    b"text/plain", b"text/plain; charset=utf-8", b"text/plain; charset=UTF-8",
+    b"1.0", b"7bit", b"8bit", b"quoted-printable", b"base64",
+)
+
+_known_values = dict((value, value) for value in known_values)
+_interned = OrderedDict()
+_intern_candidates = OrderedDict()
+
+
+def intern_bytes(value):
+    """ Return a shared copy of a short byte string that has been seen
+    before, so that parsers hand out one object for values that repeat
+    from message to message. Each string is held as a candidate the
+    first time it is seen and the object seen first is interned on the
+    second sighting. Both the candidates and the intern table are least
+    recently used caches of `max_interned_size` entries, so values that
+    stop turning up are eventually evicted; known values never are.
+    """
+    interned = _known_values.get(value)
+    if interned is not None:
+        return interned
+    if len(value) > max_interned_length:
+        return value
+    table = _interned
+    interned = table.pop(value, None)
+    if interned is None:
+        candidates = _intern_candidates
+        interned = candidates.pop(value, None)
+        if interned is None:
+            _evict(candidates)
+            candidates[value] = value
+            return value
+        _evict(table)
+    table[value] = interned
+    return interned
+
+
+def _evict(cache):
+    if len(cache) >= max_interned_size:
+        try:
+            cache.popitem(last=False)
+        except KeyError:
+            pass
+
+
+class MessageHeaderDict(object):
+    """ Ordered collection of message header fields that also behaves as
+    a mapping from header names to values. Names match regardless of
+    case and of whether hyphens or underscores are used.
+
+    Fields are held in parallel lists of matchable names, canonical
+    names and values, so repeated fields such as `Received` or
+    `Set-Cookie` keep their values and their order. Mapping access
+    returns the last value for a name, while `get_all` returns every
+    one. An index of positions by name is only built when a lookup is
+    made and is discarded whenever fields are removed.
+    """
+
+    __slots__ = ("_keys", "_names", "_values", "_index")
 
     @classmethod
     def from_bytes(cls, b):
-        # TODO
-        pass
+        """ Parse a block of RFC 822 header lines, given as bytes or any
+        other object supporting the buffer protocol. Lines may end with
+        CRLF, LF or CR, folded lines are unfolded and repeated fields are
+        all retained. Parsing stops at the first empty line; lines that
+        are neither fields nor continuations are ignored.
+        """
+        if not isinstance(b, bytes):
+            b = bytes(b)
+        # Only split up to the end of the block, not through any body
+        end = len(b)
+        for separator in (b"\r\n\r\n", b"\n\n"):
+            found = b.find(separator, 0, end)
+            if found != -1:
+                end = found
+        keys = []
+        names = []
+        values = []
+        index = {}
+        lookup = _header_name_cache.get
+        intern_value = intern_bytes
+        for line in b[:end].splitlines():
+            if not line:
+                break
+            if line[:1] in FOLD_STARTERS:
+                if values:
+                    values[-1] += SP + line.strip()
+                continue
+            name, colon, value = line.partition(COLON)
+            if not colon:
+                continue
+            name = name.rstrip()
+            entry = lookup(name) or header_name(name)
+            key = entry[0]
+            try:
+                index[key].append(len(keys))
+            except KeyError:
+                index[key] = [len(keys)]
+            keys.append(key)
+            names.append(entry[1])
+            values.append(intern_value(value.strip()))
+        inst = cls()
+        inst._keys = keys
+        inst._names = names
+        inst._values = values
+        inst._index = index
+        return inst
 
     def __init__(self, iterable=None, **kwargs):
-        super(MessageHeaderDict, self).__init__()
-        self.update(iterable, **kwargs)
+        self._keys = []
+        self._names = []
+        self._values = []
+        self._index = None
+        if iterable:
+            try:
+                iterable = iterable.items()
+            except AttributeError:
+                pass
+            for name, value in iterable:
+                self.add(name, value)
+        for name in kwargs:
+            self.add(name, kwargs[name])
 
     def __repr__(self):
         return xstr(self.to_bytes())
 
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __contains__(self, name):
+        matchable_name, _ = header_name(name)
+        return matchable_name in self.index()
+
+    def __eq__(self, other):
+        if not isinstance(other, MessageHeaderDict):
+            return NotImplemented
+        return sorted(zip(self._keys, self._values)) == sorted(zip(other._keys, other._values))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
     def __getitem__(self, name):
         matchable_name, _ = header_name(name)
-        _, value = super(MessageHeaderDict, self).__getitem__(matchable_name)
-        return value
+        positions = self.index()[matchable_name]
+        return self._values[positions[-1]]
 
     def __setitem__(self, name, value):
         matchable_name, canonical_name = header_name(name)
-        if isinstance(value, bytes):
-            super(MessageHeaderDict, self).__setitem__(matchable_name, (canonical_name, value))
+        if not isinstance(value, bytes):
+            value = bstr(value)
+        positions = self.index().get(matchable_name)
+        if positions:
+            first = positions[0]
+            self._names[first] = canonical_name
+            self._values[first] = value
+            if len(positions) > 1:
+                self._remove(positions[1:])
         else:
-            super(MessageHeaderDict, self).__setitem__(matchable_name, (canonical_name, bstr(value)))
+            self.add(name, value)
 
     def __delitem__(self, name):
         matchable_name, _ = header_name(name)
-        super(MessageHeaderDict, self).__delitem__(matchable_name)
+        self._remove(self.index()[matchable_name])
+
+    def _remove(self, positions):
+        for position in reversed(positions):
+            del self._keys[position]
+            del self._names[position]
+            del self._values[position]
+        self._index = None
+
+    def index(self):
+        """ Return a dictionary of field positions, keyed by matchable
+        name.
+        """
+        index = self._index
+        if index is None:
+            index = self._index = {}
+            for position, key in enumerate(self._keys):
+                try:
+                    index[key].append(position)
+                except KeyError:
+                    index[key] = [position]
+        return index
+
+    def add(self, name, value):
+        """ Add a field, retaining any existing fields with the same name.
+        """
+        matchable_name, canonical_name = header_name(name)
+        if not isinstance(value, bytes):
+            value = bstr(value)
+        index = self._index
+        if index is not None:
+            position = len(self._keys)
+            try:
+                index[matchable_name].append(position)
+            except KeyError:
+                index[matchable_name] = [position]
+        self._keys.append(matchable_name)
+        self._names.append(canonical_name)
+        self._values.append(value)
+
+    def fold(self, value):
+        """ Extend the value of the last field added with a continuation
+        line, as found in folded headers.
+        """
+        self._values[-1] += SP + value
 
     def copy(self):
         return self.__class__(self)
 
     def get(self, name, default=None):
         matchable_name, _ = header_name(name)
-        try:
-            _, value = super(MessageHeaderDict, self).__getitem__(matchable_name)
-        except KeyError:
-            return default
-        else:
-            return value
+        positions = self.index().get(matchable_name)
+        if positions:
+            return self._values[positions[-1]]
+        return default
+
+    def get_all(self, name):
+        """ Return a list of all values for a name, in order.
+        """
+        matchable_name, _ = header_name(name)
+        values = self._values
+        return [values[position] for position in self.index().get(matchable_name, ())]
+
+    def pop(self, name, *default):
+        matchable_name, _ = header_name(name)
+        positions = self.index().get(matchable_name)
+        if not positions:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        value = self._values[positions[-1]]
+        self._remove(positions)
+        return value
 
     def update(self, other=None, **kwargs):
+        """ Replace fields with those from another mapping or sequence of
+        pairs. Repeated fields in the source are all retained.
+        """
+        pairs = []
         if other:
             try:
-                for name in other.keys():
-                    self[name] = other[name]
+                pairs.extend(other.items())
             except AttributeError:
-                for name, value in other:
-                    self[name] = value
-        for name in kwargs:
-            self[name] = kwargs[name]
+                pairs.extend(other)
+        pairs.extend(kwargs.items())
+        if not pairs:
+            return
+        index = self.index()
+        replaced = set(header_name(name)[0] for name, _ in pairs)
+        positions = sorted(position for key in replaced for position in index.get(key, ()))
+        if positions:
+            self._remove(positions)
+        for name, value in pairs:
+            self.add(name, value)
+
+    def items(self):
+        return list(zip(self._names, self._values))
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return list(self._values)
+
+    def write_to(self, out):
+        """ Write the fields, in the order they were added, to either a
+        list, as separate pieces suitable for vectored sending, or a
+        bytearray. Returns `out`.
+        """
+        names = self._names
+        values = self._values
+        if isinstance(out, list):
+            extend = out.extend
+            for i in range(len(values)):
+                extend((names[i], COLON_SP, values[i], CRLF))
+        else:
+            for i in range(len(values)):
+                out += names[i]
+                out += COLON_SP
+                out += values[i]
+                out += CRLF
+        return out
+
+    def to_bytes(self):
+        return bytes(self.write_to(bytearray()))
+
+
+class MessageHeaderView(object):
+    """ Read-only view over a raw block of RFC 822 header lines. Line
+    offsets are indexed on first access but names and values are only
+    extracted when a specific header is requested. Unlike
+    MessageHeaderDict, repeated headers are all retained and can be
+    retrieved using `get_all`. Where a single value is requested for a
+    repeated header, the last value is returned, matching the result
+    of loading the same lines into a MessageHeaderDict.
+    """
+
+    def __init__(self, data, start=0, end=None):
+        self.data = bytes(data)
+        self.start = start
+        self.end = len(self.data) if end is None else end
+        self._index = None
+
+    def __repr__(self):
+        return xstr(self.to_bytes())
+
+    def __len__(self):
+        return len(self.index())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, name):
+        return bool(self._find(name, last=True))
+
+    def __getitem__(self, name):
+        found = self._find(name, last=True)
+        if not found:
+            raise KeyError(name)
+        return found[0]
+
+    def index(self):
+        """ Return a list of `(start, colon, end)` offsets, one for each
+        header, building the list on first use. Folded continuation
+        lines extend the header they follow and the header block is
+        terminated by the first empty line.
+        """
+        if self._index is None:
+            data = self.data
+            end = self.end
+            index = []
+            p = self.start
+            while p < end:
+                eol = data.find(LF, p, end)
+                if eol == -1:
+                    eol = q = end
+                else:
+                    q = eol + 1
+                if eol > p and data[eol - 1:eol] == CR:
+                    eol -= 1
+                if eol == p:
+                    break
+                if data[p:p + 1] in (SP, HT):
+                    if index:
+                        s, colon, _ = index[-1]
+                        index[-1] = (s, colon, eol)
+                else:
+                    colon = data.find(COLON, p, eol)
+                    if colon != -1:
+                        index.append((p, colon, eol))
+                p = q
+            self._index = index
+        return self._index
+
+    def _value(self, colon, end):
+        value = self.data[colon + 1:end]
+        if LF in value:
+            value = SP.join(line.strip() for line in value.splitlines())
+        return intern_bytes(value.strip())
+
+    def _find(self, name, last=False):
+        key = bstr(name).lower().replace(b"_", b"-")
+        size = len(key)
+        data = self.data
+        values = []
+        for start, colon, end in self.index():
+            if colon - start == size and data[start:colon].lower() == key:
+                values.append(self._value(colon, end))
+        if last and values:
+            return values[-1:]
+        return values
+
+    def get(self, name, default=None):
+        found = self._find(name, last=True)
+        if found:
+            return found[0]
+        return default
+
+    def get_all(self, name):
+        """ Return a list of all values for the named header, in the
+        order they appear.
+        """
+        return self._find(name)
 
     def items(self):
-        return list(super(MessageHeaderDict, self).values())
+        data = self.data
+        return [(header_name(data[start:colon])[1], self._value(colon, end))
+                for start, colon, end in self.index()]
 
     def keys(self):
-        return list(canonical_name for canonical_name, _ in super(MessageHeaderDict, self).values())
+        data = self.data
+        return [header_name(data[start:colon])[1] for start, colon, _ in self.index()]
 
     def values(self):
-        return list(value for _, value in super(MessageHeaderDict, self).values())
+        return [self._value(colon, end) for _, colon, end in self.index()]
+
+    def to_dict(self):
+        """ Materialise this view as a MessageHeaderDict.
+        """
+        return MessageHeaderDict(self.items())
+
+    def to_bytes(self):
+        return self.data[self.start:self.end]
+
+
+class Message(object):
+    """ An RFC 822 message held within a larger buffer, such as a memory
+    mapped archive, between `start` and `end`. Nothing is copied or
+    parsed until needed: the header block is located and wrapped in a
+    MessageHeaderView on first access to `headers`, and `body` is a
+    memoryview slice of the underlying buffer.
+
+    Messages read from an mbox archive carry the `From ` line that
+    preceded them as `envelope`.
+    """
+
+    def __init__(self, data, start=0, end=None, envelope=None, key=None):
+        self.data = data
+        self.start = start
+        self.end = len(data) if end is None else end
+        self.envelope = envelope
+        self.key = key
+        self._boundary = None
+        self._headers = None
+
+    def __repr__(self):
+        return "<%s %s bytes=%d>" % (self.__class__.__name__, self.key or self.start, len(self))
+
+    def __len__(self):
+        return self.end - self.start
+
+    def boundary(self):
+        """ Return the offsets of the end of the header block and of the
+        start of the body.
+        """
+        if self._boundary is None:
+            data = self.data
+            start = self.start
+            end = self.end
+            if data[start:start + 1] == LF:
+                boundary = (start, start + 1)
+            elif data[start:start + 2] == CRLF:
+                boundary = (start, start + 2)
+            else:
+                boundary = (end, end)
+                found = data.find(b"\n\n", start, end)
+                if found != -1:
+                    boundary = (found + 1, found + 2)
+                    end = found
+                found = data.find(b"\r\n\r\n", start, end)
+                if found != -1:
+                    boundary = (found + 2, found + 4)
+            self._boundary = boundary
+        return self._boundary
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            header_end, _ = self.boundary()
+            self._headers = MessageHeaderView(self.data[self.start:header_end])
+        return self._headers
+
+    @property
+    def body(self):
+        _, body_start = self.boundary()
+        return memoryview(self.data)[body_start:self.end]
 
     def to_bytes(self):
-        b = []
-        for name, value in sorted(self.items()):
-            b += [name, b": ", value, CRLF]
-        return b"".join(b)
+        return self.data[self.start:self.end]
 
 
 def parse_header(value):
+    """ Split a header value into its main value and a dictionary of
+    parameters, as used by Content-Type (RFC 7231 section 3.1.1.1) and
+    similar headers. Parameter names are lowercased, quoted-string
+    values are unquoted and unescaped, and parameters without a value
+    map to None.
+
+    Results are immutable and are cached, keyed by the raw value, in a
+    least recently used cache of `max_parsed_header_cache_size` entries.
+    """
     if value is None:
         return None, None
     if not isinstance(value, bytes):
         value = bstr(value)
-    p = 0
-    delimiter = value.find(b";", p)
-    eol = len(value)
-    if p <= delimiter < eol:
-        string_value = value[p:delimiter]
-        params = {}
-        while delimiter < eol:
-            # Skip whitespace after previous delimiter
-            p = delimiter + 1
-            while p < eol and value[p] == SPACE:
-                p += 1
-            # Find next delimiter
-            delimiter = value.find(b";", p)
-            if delimiter == -1:
-                delimiter = eol
-            # Add parameter
-            eq = value.find(b"=", p)
-            if p <= eq < delimiter:
-                params[value[p:eq]] = value[(eq + 1):delimiter]
-            elif p < delimiter:
-                params[value[p:delimiter]] = None
-    else:
-        string_value = value[p:]
-        params = {}
-    return string_value, params
+    cache = _parsed_header_cache
+    try:
+        parsed = cache.pop(value)
+    except KeyError:
+        delimiter = value.find(b";")
+        if delimiter == -1:
+            parsed = (value.strip(), _no_parameters)
+        else:
+            params = {}
+            for match in header_parameter_pattern.finditer(value, delimiter):
+                name, parameter_value = match.groups()
+                if parameter_value is not None and parameter_value.startswith(b'"'):
+                    parameter_value = quoted_pair_pattern.sub(br"\1", parameter_value[1:-1])
+                params[name.lower()] = parameter_value
+            parsed = (value[:delimiter].strip(), frozen_mapping(params))
+        if len(cache) >= max_parsed_header_cache_size:
+            try:
+                cache.popitem(last=False)
+            except KeyError:
+                pass
+    cache[value] = parsed
+    return parsed
 
 
 def header_name(name):
     """ Normalise a header name to produce a string variant usable for
     matching and a byte variant with canonical casing.
 
+    Results are cached by the name as given, whether a string or bytes
+    in any casing. The cache holds at most `max_header_name_cache_size`
+    entries, beyond which the most recently added are evicted so that
+    known headers and those seen early remain cached.
+
     :param name:
     :return:
     """
+    cache = _header_name_cache
+    try:
+        return cache[name]
+    except KeyError:
+        cacheable = True
+    except TypeError:
+        # Unhashable, such as a bytearray
+        cacheable = False
     matchable_name = xstr(name).replace("-", "_").lower()
     try:
         canonical_name = header_names[matchable_name]
     except KeyError:
         canonical_name = bstr(name).replace(b"_", b"-").title()
-    return matchable_name, canonical_name
+    entry = (matchable_name, canonical_name)
+    if cacheable:
+        if len(cache) >= max_header_name_cache_size:
+            try:
+                cache.popitem()
+            except KeyError:
+                pass
+        cache[name] = entry
+    return entry
 
 
-def internet_time(value):
-    # TODO
-    return bstr(value)
+WEEKDAYS = (b"Mon", b"Tue", b"Wed", b"Thu", b"Fri", b"Sat", b"Sun")
+MONTHS = (b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+          b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec")
+MONTH_NUMBERS = dict((month, number) for number, month in enumerate(MONTHS, 1))
+
+rfc850_date_pattern = re_compile(br"[A-Za-z]+, (\d\d)-([A-Za-z]{3})-(\d\d) "
+                                 br"(\d\d):(\d\d):(\d\d) GMT$")
+asctime_date_pattern = re_compile(br"[A-Za-z]{3} ([A-Za-z]{3}) ([ \d]\d) "
+                                  br"(\d\d):(\d\d):(\d\d) (\d{4})$")
+
+header_parameter_pattern = re_compile(br'[ \t]*;[ \t]*([^=;\s]+)'
+                                      br'(?:[ \t]*=[ \t]*("(?:[^"\\]|\\.)*"|[^;\s]*))?')
+quoted_pair_pattern = re_compile(br"\\(.)")
+
+# Maximum number of entries held by the parse_header cache
+max_parsed_header_cache_size = 1024
+_parsed_header_cache = OrderedDict()
+_no_parameters = frozen_mapping({})
+
+# Most recently formatted second and its IMF-fixdate form
+_internet_time_cache = (None, None)
+
+# Recently parsed dates, which tend to repeat across responses
+max_parsed_time_cache_size = 1024
+_parsed_time_cache = {}
+
+
+def _days_from_civil(year, month, day):
+    """ Return the number of days from 1970-01-01 to a date in the
+    proleptic Gregorian calendar.
+    """
+    if month <= 2:
+        year -= 1
+    era = (year if year >= 0 else year - 399) // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def internet_time(value=None):
+    """ Format a time, given as seconds since the epoch, as an
+    IMF-fixdate (RFC 7231 section 7.1.1.1), such as
+    `Sun, 06 Nov 1994 08:49:37 GMT`. The current time is used if no
+    value is given. Strings and bytes are returned unchanged, as bytes.
+
+    The most recently formatted second is cached, so repeatedly
+    formatting the current time costs little more than a comparison.
+    """
+    global _internet_time_cache
+    if value is None:
+        value = time()
+    elif isinstance(value, (bytes, bytearray, unicode)):
+        return bstr(value)
+    second = int(value)
+    cached_second, formatted = _internet_time_cache
+    if second == cached_second:
+        return formatted
+    t = gmtime(second)
+    formatted = (WEEKDAYS[t.tm_wday] + b", " + bstr("{:02d}".format(t.tm_mday)) + b" " +
+                 MONTHS[t.tm_mon - 1] + b" " +
+                 bstr("{:04d} {:02d}:{:02d}:{:02d} GMT".format(
+                     t.tm_year, t.tm_hour, t.tm_min, t.tm_sec)))
+    _internet_time_cache = (second, formatted)
+    return formatted
+
+
+def parse_internet_time(value):
+    """ Parse an HTTP-date in any of the three formats allowed by RFC
+    7231 (IMF-fixdate, RFC 850 or asctime), returning seconds since the
+    epoch as an integer, or None if the value cannot be parsed.
+
+    IMF-fixdate values, which are all that current senders generate,
+    are read from fixed positions without the use of regular
+    expressions. Recent results are cached.
+    """
+    if not value:
+        return None
+    if not isinstance(value, bytes):
+        value = bstr(value)
+    try:
+        return _parsed_time_cache[value]
+    except KeyError:
+        pass
+    parsed = _parse_internet_time(value.strip())
+    if len(_parsed_time_cache) >= max_parsed_time_cache_size:
+        _parsed_time_cache.clear()
+    _parsed_time_cache[value] = parsed
+    return parsed
+
+
+def _parse_internet_time(value):
+    try:
+        if len(value) == 29 and value[3:5] == b", " and value[25:] == b" GMT":
+            # IMF-fixdate: Sun, 06 Nov 1994 08:49:37 GMT
+            year = int(value[12:16])
+            month = MONTH_NUMBERS[value[8:11]]
+            day = int(value[5:7])
+            hour, minute, second = int(value[17:19]), int(value[20:22]), int(value[23:25])
+        else:
+            match = rfc850_date_pattern.match(value)
+            if match:
+                day, month, year, hour, minute, second = match.groups()
+                year = int(year)
+                this_year = gmtime().tm_year
+                year += this_year - this_year % 100
+                if year > this_year + 50:
+                    year -= 100
+            else:
+                match = asctime_date_pattern.match(value)
+                if not match:
+                    return None
+                month, day, hour, minute, second, year = match.groups()
+                year = int(year)
+            month = MONTH_NUMBERS[month.title()]
+            day, hour, minute, second = int(day), int(hour), int(minute), int(second)
+    except (KeyError, ValueError):
+        return None
+    if not (1 <= day <= 31 and hour < 24 and minute < 60 and second < 61):
+        return None
+    return ((_days_from_civil(year, month, day) * 24 + hour) * 60 + minute) * 60 + second
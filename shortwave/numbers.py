@@ -16,3 +16,5 @@
 # limitations under the License.
 
 HTTP_PORT = 80
+
+SMTP_PORT = 25
@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+from functools import partial
+from logging import getLogger
+from socket import gethostname
+from re import compile as re_compile
+from threading import Event
+
+from shortwave.compat import bstr, TimeoutError
+from shortwave.messaging import CRLF, Message, MessageHeaderDict, internet_time
+from shortwave.numbers import SMTP_PORT
+from shortwave.transmission import Connection
+from shortwave.uri import parse_authority
+
+__all__ = ["SMTPError", "SMTPReply", "SMTPDelivery", "SMTP", "parse_extensions",
+           "message_pieces"]
+
+log = getLogger("shortwave.smtp")
+
+bare_lf_pattern = re_compile(br"(?<!\r)\n")
+
+
+class SMTPError(IOError):
+    """ Raised when a server gives a negative reply to a command that
+    cannot be recovered from, such as the greeting or EHLO.
+    """
+
+    def __init__(self, reply):
+        text = reply.text.decode("utf-8", "replace")
+        super(SMTPError, self).__init__("%s %s" % (reply.code, text))
+        self.reply = reply
+
+
+class SMTPReply(object):
+    """ The reply to a single command, filled in by the receiver thread.
+    Multiline replies are collected in `lines`, without reply codes. If
+    given, `callback` is called with the reply once it is complete or
+    has failed, just before `end` is set.
+    """
+
+    code = None
+    error = None
+
+    def __init__(self, command=None, callback=None):
+        self.command = command
+        self.callback = callback
+        self.lines = []
+        self.end = Event()
+
+    def __repr__(self):
+        return "<%s %r code=%r>" % (self.__class__.__name__, self.command, self.code)
+
+    @property
+    def text(self):
+        return b"\n".join(self.lines)
+
+    def ok(self):
+        return self.code is not None and 200 <= self.code < 300
+
+
+class SMTPDelivery(object):
+    """ The outcome of a single mail transaction. Results arrive
+    asynchronously on the receiver thread: `on_recipient` is called as
+    each RCPT reply comes in and either `on_end` or `on_error` once the
+    transaction is over, after which `end` is set.
+    """
+
+    sender = None
+    recipients = ()
+    mail_reply = None
+    reply = None
+    error = None
+
+    def __init__(self):
+        self.results = {}
+        self.end = Event()
+
+    def __repr__(self):
+        return "<%s from=%r to=%d>" % (self.__class__.__name__, self.sender,
+                                       len(self.recipients))
+
+    def accepted(self):
+        """ Return a list of the recipients accepted by the server, in
+        the order in which they were given.
+        """
+        results = self.results
+        return [r for r in self.recipients if r in results and results[r].ok()]
+
+    def rejected(self):
+        """ Return a dictionary of rejected recipients mapped to the
+        replies that rejected them.
+        """
+        return dict((r, reply) for r, reply in self.results.items() if not reply.ok())
+
+    def succeeded(self):
+        return self.reply is not None and self.reply.ok() and bool(self.accepted())
+
+    def wait(self, timeout=None):
+        return self.end.wait(timeout)
+
+    def set_mail_reply(self, reply):
+        self.mail_reply = reply
+        if reply.error is not None:
+            self.fail(reply.error)
+
+    def set_recipient_reply(self, recipient, reply):
+        if reply.error is not None:
+            self.fail(reply.error)
+            return
+        self.results[recipient] = reply
+        self.on_recipient(recipient, reply)
+
+    def set_data_reply(self, reply):
+        # An intermediate 354 reply means the content is to follow and
+        # the transaction ends with the reply to that instead
+        if reply.code != 354:
+            self.set_final_reply(reply)
+
+    def set_final_reply(self, reply):
+        if self.end.is_set():
+            return
+        if reply.error is not None:
+            self.fail(reply.error)
+            return
+        self.reply = reply
+        try:
+            self.on_end()
+        finally:
+            self.end.set()
+
+    def fail(self, error):
+        if self.end.is_set():
+            return
+        self.error = error
+        try:
+            self.on_error(error)
+        finally:
+            self.end.set()
+
+    def on_recipient(self, recipient, reply):
+        pass
+
+    def on_end(self):
+        pass
+
+    def on_error(self, error):
+        pass
+
+
+class SMTP(Connection):
+    """ Client connection to an SMTP server, as described by RFC 5321.
+    The connection greets the server on construction and can then carry
+    any number of mail transactions, each started with `send`.
+
+    Where the server offers PIPELINING (RFC 2920), all commands for a
+    transaction are written in a single send. Where it also offers
+    CHUNKING (RFC 3030), the message is sent with BDAT, directly after
+    the envelope commands, so a whole transaction costs no round trips
+    on the sending side. Otherwise the message is dot-stuffed and sent
+    after a 354 reply to DATA.
+    """
+
+    data_limit = CRLF
+
+    # Maximum time in seconds to wait for a reply that must arrive
+    # before the client can go on, such as the greeting or a 354
+    reply_timeout = 300.0
+
+    # These can be switched off to avoid using extensions that a
+    # server offers
+    pipelining = True
+    chunking = True
+
+    def __init__(self, authority, receiver=None, rx_buffer_size=None, hostname=None):
+        user_info, host, port = parse_authority(authority)
+        # The server speaks first, so a reply must be waiting for the
+        # greeting before any data can arrive
+        greeting = SMTPReply()
+        self.replies = deque([greeting])
+        self.extensions = {}
+        self.transactions = 0
+        super(SMTP, self).__init__((host, port or SMTP_PORT), receiver, rx_buffer_size)
+        self.greeting = self.wait(greeting)
+        if not greeting.ok():
+            self.close()
+            raise SMTPError(greeting)
+        self.hello(hostname or bstr(gethostname()))
+
+    def request(self, replies, payload=()):
+        """ Transmit the commands for a sequence of replies in a single
+        send, followed by any payload, and return the replies. A reply
+        without a command waits for the server to answer the payload.
+        """
+        data = []
+        for reply in replies:
+            if reply.command is not None:
+                data.append(reply.command)
+                data.append(CRLF)
+        data.extend(payload)
+        self.replies.extend(replies)
+        self.transmitter.transmit(*data)
+        return replies
+
+    def command(self, command):
+        """ Send a single command and wait for its reply.
+        """
+        return self.wait(self.request([SMTPReply(command)])[0])
+
+    def wait(self, reply):
+        if not reply.end.wait(self.reply_timeout):
+            error = TimeoutError("No reply to %r within %gs" % (
+                reply.command, self.reply_timeout))
+            self.abort(error)
+            raise error
+        if reply.error is not None:
+            raise reply.error
+        return reply
+
+    def hello(self, hostname):
+        reply = self.command(b"EHLO " + hostname)
+        if reply.ok():
+            self.extensions = parse_extensions(reply.lines[1:])
+            return reply
+        reply = self.command(b"HELO " + hostname)
+        if not reply.ok():
+            raise SMTPError(reply)
+        self.extensions = {}
+        return reply
+
+    def send(self, sender, recipients, message, delivery=None):
+        """ Start a mail transaction and return an SMTPDelivery that will
+        hold its results. The message can be raw bytes, a Message or a
+        tuple of MessageHeaderDict and body; header fields are sent
+        as they are, without first being serialised into one block.
+        """
+        if delivery is None:
+            delivery = SMTPDelivery()
+        recipients = list(recipients)
+        delivery.sender = sender
+        delivery.recipients = recipients
+        pieces = message_pieces(message)
+        size = sum(map(len, pieces))
+        extensions = self.extensions
+        pipelining = self.pipelining and b"PIPELINING" in extensions
+        chunking = self.chunking and b"CHUNKING" in extensions
+
+        replies = []
+        if self.transactions:
+            # Clear out anything left behind by a failed transaction
+            replies.append(SMTPReply(b"RSET"))
+        self.transactions += 1
+        mail = b"MAIL FROM:<" + sender + b">"
+        if b"SIZE" in extensions:
+            mail += b" SIZE=" + bstr(size)
+        mail_reply = SMTPReply(mail, delivery.set_mail_reply)
+        replies.append(mail_reply)
+        for recipient in recipients:
+            replies.append(SMTPReply(b"RCPT TO:<" + recipient + b">",
+                                     partial(delivery.set_recipient_reply, recipient)))
+        if chunking:
+            last = SMTPReply(b"BDAT " + bstr(size) + b" LAST", delivery.set_final_reply)
+            payload = pieces
+        else:
+            last = SMTPReply(b"DATA", delivery.set_data_reply)
+            payload = ()
+        replies.append(last)
+
+        if pipelining:
+            self.request(replies, payload)
+        else:
+            for reply in replies[:-1]:
+                self.wait(self.request([reply])[0])
+                if reply is mail_reply and not reply.ok():
+                    delivery.set_final_reply(reply)
+                    return delivery
+            if not delivery.accepted():
+                delivery.set_final_reply(replies[-2])
+                return delivery
+            self.request([last], payload)
+
+        if not chunking:
+            self.wait(last)
+            if last.code == 354:
+                final = SMTPReply(None, delivery.set_final_reply)
+                self.request([final], dot_stuff(pieces))
+        return delivery
+
+    def quit(self):
+        """ End the session politely and close the connection.
+        """
+        try:
+            if self.transmitter:
+                self.command(b"QUIT")
+        except (IOError, TimeoutError) as error:
+            log.warning("X[%d]: %s", self.fd, error)
+        finally:
+            self.close()
+
+    def abort(self, error=None):
+        """ Fail all outstanding replies with the given error and close
+        the connection immediately.
+        """
+        self.fail(error)
+        self.close()
+
+    def fail(self, error=None):
+        """ Fail all outstanding replies with the given error.
+        """
+        if error is not None:
+            log.error("X[%d]: %s", self.fd, error)
+        replies = self.replies
+        while replies:
+            reply = replies.popleft()
+            reply.error = error
+            try:
+                if reply.callback is not None:
+                    reply.callback(reply)
+            finally:
+                reply.end.set()
+        del self.buffer[:]
+
+    def on_data(self, data):
+        line = bytes(data)
+        log.info("R[%d]: %s", self.fd, line.decode("utf-8", "replace"))
+        replies = self.replies
+        if not replies:
+            log.warning("R[%d]: Unexpected reply", self.fd)
+            return
+        reply = replies[0]
+        reply.lines.append(line[4:])
+        if line[3:4] == b"-":
+            return
+        try:
+            code = int(line[:3])
+        except ValueError:
+            self.fail(IOError("Malformed reply %r" % line))
+            return
+        replies.popleft()
+        reply.code = code
+        try:
+            if reply.callback is not None:
+                reply.callback(reply)
+        finally:
+            reply.end.set()
+
+    def on_stop(self):
+        if self.replies:
+            self.fail(IOError("Connection closed with %d reply(s) outstanding" %
+                              len(self.replies)))
+
+
+def parse_extensions(lines):
+    """ Parse the lines of an EHLO reply that follow the first into a
+    dictionary of upper-cased extension keywords mapped to their
+    parameters.
+    """
+    extensions = {}
+    for line in lines:
+        keyword, _, parameters = line.strip().partition(b" ")
+        if keyword:
+            extensions[keyword.upper()] = parameters
+    return extensions
+
+
+def message_pieces(message):
+    """ Return a list of bytes-like pieces that make up a message,
+    without joining them. Bare LF line endings, as found in mailbox
+    files, are converted to the CRLF that SMTP requires, which BDAT in
+    particular sends as-is; only pieces that contain them are copied.
+
+    Header fields given separately from the body are given a Date
+    field, as required by RFC 5322, if they do not already have one.
+    """
+    if isinstance(message, tuple):
+        headers, body = message
+        if not isinstance(headers, MessageHeaderDict):
+            headers = MessageHeaderDict(headers)
+        elif b"date" not in headers:
+            # Leave the caller's header fields as they were
+            headers = headers.copy()
+        if b"date" not in headers:
+            # RFC 5322 calls for a numeric zone rather than GMT
+            headers[b"Date"] = internet_time()[:-3] + b"+0000"
+        pieces = headers.write_to([])
+        pieces.append(CRLF)
+        pieces.append(body)
+    elif isinstance(message, Message):
+        pieces = [memoryview(message.data)[message.start:message.end]]
+    elif isinstance(message, (bytes, bytearray, memoryview)):
+        pieces = [message]
+    else:
+        raise TypeError("Unsupported message type %r" % type(message))
+    search = bare_lf_pattern.search
+    return [bare_lf_pattern.sub(CRLF, piece) if search(piece) else piece
+            for piece in pieces]
+
+
+def dot_stuff(pieces):
+    """ Prepare message pieces for sending after DATA, doubling any dot
+    at the start of a line and adding the end-of-data marker.
+    """
+    data = b"".join(pieces)
+    if data.startswith(b"."):
+        data = b"." + data
+    data = data.replace(b"\r\n.", b"\r\n..")
+    if not data.endswith(CRLF):
+        data += CRLF
+    return [data, b".\r\n"]
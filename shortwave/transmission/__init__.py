@@ -40,8 +40,10 @@ class Connection(Transceiver):
     data_limit = None
 
     def __init__(self, address, receiver=None, rx_buffer_size=None, *args, **kwargs):
-        super(Connection, self).__init__(address, receiver, rx_buffer_size, *args, **kwargs)
+        # The buffer must exist before the receiver is attached, as
+        # data may arrive straight away
         self.buffer = bytearray()
+        super(Connection, self).__init__(address, receiver, rx_buffer_size, *args, **kwargs)
 
     def on_receive(self, view):
         from shortwave.compat import integer
@@ -68,6 +70,13 @@ class Connection(Transceiver):
                 finally:
                     end += len(data_limit)
                     del buffer[:end]
+            elif callable(data_limit):
+                # A callable limiter handles data directly from the buffer
+                # and returns the number of bytes it has used
+                used = data_limit(buffer)
+                if not used:
+                    break
+                del buffer[:used]
             else:
                 raise TypeError("Unsupported limiter %r" % data_limit)
 
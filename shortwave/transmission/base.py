@@ -15,18 +15,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from errno import ENOTCONN, EBADF
-from logging import getLogger
+from collections import deque
+from errno import ENOTCONN, EBADF, EAGAIN, EWOULDBLOCK
+from itertools import islice
+from logging import getLogger, INFO
+from select import select
 from socket import socket as _socket, error as socket_error, \
     AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY, SHUT_RD, SHUT_WR
 from threading import Thread
 
-from shortwave.concurrency import synchronized
+from shortwave.concurrency import synchronized, TimerWheel
 
 log = getLogger("shortwave.transmission")
 
 default_buffer_size = 524288
 
+# Maximum number of buffers passed to a single sendmsg call (IOV_MAX)
+max_vector_length = 1024
+
 
 class BaseTransmitter(object):
     """ A Transmitter handles the outgoing half of a network conversation.
@@ -39,14 +45,47 @@ class BaseTransmitter(object):
         self.fd = self.socket.fileno()
 
     def transmit(self, *data):
-        joined = b"".join(data)
-        log.info("T[%d]: %s", self.fd, joined)
-        self.socket.sendall(joined)
+        """ Log and send one or more bytes-like pieces of data.
+        """
+        if log.isEnabledFor(INFO):
+            log.info("T[%d]: %s", self.fd, b"".join(data))
+        self.send(*data)
+
+    def send(self, *data):
+        """ Send one or more bytes-like pieces of data without logging
+        them. Where possible, the pieces are passed to the socket
+        together as a vector rather than first being joined into a
+        single string.
+        """
+        socket = self.socket
+        try:
+            sendmsg = socket.sendmsg
+        except AttributeError:
+            socket.sendall(b"".join(data))
+            return
+        views = deque(memoryview(piece).cast("B") for piece in data if len(piece))
+        while views:
+            try:
+                sent = sendmsg(list(islice(views, max_vector_length)))
+            except socket_error as error:
+                if error.errno in (EAGAIN, EWOULDBLOCK):
+                    select((), (socket,), ())
+                    continue
+                raise
+            while sent:
+                view = views[0]
+                if sent < len(view):
+                    views[0] = view[sent:]
+                    break
+                sent -= len(view)
+                views.popleft()
 
 
 class BaseReceiver(Thread):
     """ A Receiver handles the incoming halves of one or more network
-    conversations.
+    conversations. Each receiver also drives a timer wheel, so that
+    timeouts for its conversations are handled on the same thread as
+    their incoming data.
     """
 
     _stopped = False
@@ -54,6 +93,7 @@ class BaseReceiver(Thread):
     def __init__(self):
         super(BaseReceiver, self).__init__()
         self.clients = {}
+        self.timers = TimerWheel()
 
     def __repr__(self):
         return "<%s at 0x%x>" % (self.__class__.__name__, id(self))
@@ -87,12 +127,18 @@ class BaseTransceiver(object):
     Tx = BaseTransmitter
     Rx = BaseReceiver
 
+    socket = None
     transmitter = None
     receiver = None
 
-    @staticmethod
-    def new_socket(address):
+    #: Time in seconds to wait for a connection to be established,
+    #: or None to wait indefinitely
+    connect_timeout = None
+
+    @classmethod
+    def new_socket(cls, address):
         socket = _socket(AF_INET, SOCK_STREAM)
+        socket.settimeout(cls.connect_timeout)
         socket.connect(address)
         socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
         socket.setblocking(0)
@@ -112,7 +158,12 @@ class BaseTransceiver(object):
         self.receiver.attach(self, rx_buffer_size)
 
     def __del__(self):
-        self.close()
+        # Garbage collection can happen during another close, on the
+        # thread that holds the close lock, so the lock must not be
+        # waited for here. A socket that never connected has nothing
+        # to close.
+        if self.socket and not self.close.locked():
+            self.close()
 
     def __repr__(self):
         return "<%s #%d>" % (self.__class__.__name__, self.fd)
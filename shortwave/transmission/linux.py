@@ -34,9 +34,9 @@ class LinuxCorkingTransmitter(BaseTransmitter):
     sent.
     """
 
-    def transmit(self, *data):
+    def send(self, *data):
         self.socket.setsockopt(IPPROTO_TCP, TCP_CORK, 1)
-        super(LinuxCorkingTransmitter, self).transmit(*data)
+        super(LinuxCorkingTransmitter, self).send(*data)
         self.socket.setsockopt(IPPROTO_TCP, TCP_CORK, 0)
 
 
@@ -49,20 +49,22 @@ class LinuxEventPollReceiver(BaseReceiver):
         self._poll = epoll()
 
     def attach(self, transceiver, buffer_size):
-        fd = transceiver.socket.fileno()
-        self._poll.register(fd, EPOLLET | EPOLLIN)
+        # Register the client before polling, in case data is waiting
         super(LinuxEventPollReceiver, self).attach(transceiver, buffer_size)
+        self._poll.register(transceiver.socket.fileno(), EPOLLET | EPOLLIN)
 
     def run(self):
         log.debug("Started %r", self)
         poll = self._poll.poll
+        timers = self.timers
         try:
             while not self.stopped():
-                events = poll(0.1)
+                events = poll(timers.tick)
                 if self.stopped():
                     break
                 for fd, event in events:
                     self._handle_event(fd, event)
+                timers.advance()
         finally:
             self._poll.close()
             log.debug("Stopped %r", self)
@@ -72,6 +74,7 @@ class LinuxEventPollReceiver(BaseReceiver):
         if event & EPOLLIN:
             received = 0
             receiving = -1
+            closed = False
             while receiving:
                 try:
                     receiving = transceiver.socket.recv_into(buffer)
@@ -97,7 +100,11 @@ class LinuxEventPollReceiver(BaseReceiver):
                             transceiver.on_receive(view[:receiving])
                         finally:
                             received += receiving
-            if not received:
+                    else:
+                        # The peer has closed the connection, possibly
+                        # straight after sending the data received above
+                        closed = True
+            if closed or not received:
                 transceiver.stop_rx()
         elif event & EPOLLHUP:
             transceiver.stop_rx()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from socket import socket as _socket, AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY
+
+from shortwave.http import HTTP
+
+
+class LoopbackHTTP(HTTP):
+    """ HTTP connection attached to one end of a loopback TCP pair, for
+    testing without a network. The other end is available as `peer` and
+    incoming data can either be written there or fed directly into
+    `on_receive`.
+    """
+
+    peer = None
+
+    @staticmethod
+    def new_socket(address):
+        listener = _socket(AF_INET, SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        socket = _socket(AF_INET, SOCK_STREAM)
+        socket.connect(listener.getsockname())
+        peer, _ = listener.accept()
+        listener.close()
+        socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        socket.setblocking(0)
+        LoopbackHTTP.peer = peer
+        return socket
+
+    def __init__(self, authority=b"localhost", *args, **kwargs):
+        super(LoopbackHTTP, self).__init__(authority, *args, **kwargs)
+        self.peer = LoopbackHTTP.peer
+
+    def feed(self, *data):
+        for d in data:
+            self.on_receive(memoryview(d))
+
+    def sent(self):
+        """ Return all data sent so far by the client.
+        """
+        self.peer.setblocking(0)
+        received = []
+        while True:
+            try:
+                chunk = self.peer.recv(65536)
+            except (IOError, OSError):
+                break
+            if not chunk:
+                break
+            received.append(chunk)
+        return b"".join(received)
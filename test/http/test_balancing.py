@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.compat import monotonic
+from shortwave.http import HTTPRequest, HTTPResponse, Backend, BalancedHTTP, POWER_OF_TWO
+from shortwave.http.balancing import BackendResponse
+
+from test.http import LoopbackHTTP
+
+
+class LoopbackBackend(Backend):
+    Connection = LoopbackHTTP
+
+
+class LoopbackBalancedHTTP(BalancedHTTP):
+    Backend = LoopbackBackend
+
+
+OK = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+
+class BalancedHTTPTestCase(TestCase):
+
+    def setUp(self):
+        self.client = LoopbackBalancedHTTP([b"alpha", b"beta", b"gamma"])
+
+    def tearDown(self):
+        for backend in self.client.backends:
+            for http in backend.connections:
+                http.abort()
+
+    def test_requests_spread_across_backends(self):
+        client = self.client
+        chosen = [client.append(HTTPRequest.get(b"/"), HTTPResponse()) for _ in range(6)]
+        assert [backend.authority for backend in chosen[:3]] == [b"alpha", b"beta", b"gamma"]
+        assert [backend.outstanding() for backend in client.backends] == [2, 2, 2]
+
+    def test_completed_responses_free_backend(self):
+        client = self.client
+        alpha = client.append(HTTPRequest.get(b"/"), HTTPResponse())
+        client.append(HTTPRequest.get(b"/"), HTTPResponse())
+        alpha.connections[0].feed(OK)
+        assert client.append(HTTPRequest.get(b"/"), HTTPResponse()) is not client.backends[1]
+
+    def test_failed_backend_is_ejected(self):
+        client = self.client
+        response = HTTPResponse()
+        alpha = client.append(HTTPRequest.get(b"/"), response)
+        alpha.connections[0].fail(IOError("gone"))
+        assert isinstance(response.error, IOError)
+        assert alpha.ejected()
+        chosen = [client.append(HTTPRequest.get(b"/"), HTTPResponse()) for _ in range(4)]
+        assert alpha not in chosen
+        failed = alpha.connections[0]
+        assert alpha.connection() is not failed
+        assert failed.stopped()
+
+    def test_pipelined_failures_count_once(self):
+        backend = LoopbackBackend(b"alpha")
+        http = backend.connection()
+        try:
+            responses = [HTTPResponse() for _ in range(5)]
+            for response in responses:
+                http.append(HTTPRequest.get(b"/"), BackendResponse(response, backend, http))
+            http.fail(IOError("gone"))
+            assert all(isinstance(response.error, IOError) for response in responses)
+            assert backend.failures == 1
+            assert backend.ejected_until - monotonic() <= backend.ejection_time
+        finally:
+            http.abort()
+
+    def test_ejection_time_doubles(self):
+        backend = LoopbackBackend(b"alpha")
+        backend.eject()
+        first = backend.ejected_until
+        backend.eject()
+        assert backend.ejected_until - first > backend.ejection_time
+        backend.on_success()
+        assert not backend.ejected()
+
+    def test_all_ejected_uses_all(self):
+        client = self.client
+        for backend in client.backends:
+            backend.eject()
+        assert client.available() == client.backends
+
+    def test_response_content_is_forwarded(self):
+        client = self.client
+        response = HTTPResponse()
+        backend = client.append(HTTPRequest.get(b"/"), response)
+        backend.connections[0].feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+        assert response.end.is_set()
+        assert response.content() == b"bumblebee"
+
+    def test_connections_per_backend(self):
+        backend = LoopbackBackend(b"alpha", size=2)
+        try:
+            first = backend.connection()
+            first.append(HTTPRequest.get(b"/"), HTTPResponse())
+            second = backend.connection()
+            assert second is not first
+            second.append(HTTPRequest.get(b"/"), HTTPResponse())
+            assert backend.connection() in (first, second)
+            assert len(backend.connections) == 2
+        finally:
+            for http in backend.connections:
+                http.abort()
+
+    def test_power_of_two_choices(self):
+        client = LoopbackBalancedHTTP([b"alpha", b"beta", b"gamma"], strategy=POWER_OF_TWO)
+        try:
+            client.backends[0].eject()
+            for _ in range(4):
+                client.append(HTTPRequest.get(b"/"), HTTPResponse())
+            assert client.backends[0].outstanding() == 0
+            assert sum(backend.outstanding() for backend in client.backends) == 4
+        finally:
+            for backend in client.backends:
+                for http in backend.connections:
+                    http.abort()
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            BalancedHTTP([b"alpha"], strategy="random")
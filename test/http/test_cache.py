@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+from unittest import TestCase
+
+from shortwave.http import HTTPRequest, HTTPResponse, CacheEntry, CachingHTTP, HTTPCache, \
+    MemoryCacheStore, DiskCacheStore
+from shortwave.messaging import MessageHeaderDict
+
+from test.http import LoopbackHTTP
+
+
+class LoopbackCachingHTTP(LoopbackHTTP, CachingHTTP):
+    pass
+
+
+def entry(key=b"/", body=b"bumblebee", request_time=None, response_time=None, **headers):
+    now = time()
+    return CacheEntry(key, 200, b"OK", b"HTTP/1.1", MessageHeaderDict(headers), body,
+                      request_time or now, response_time or now)
+
+
+class CacheEntryTestCase(TestCase):
+
+    def test_max_age_freshness(self):
+        assert entry(cache_control=b"max-age=60").freshness_lifetime() == 60
+
+    def test_expires_freshness(self):
+        e = entry(date=b"Sun, 06 Nov 1994 08:49:37 GMT", expires=b"Sun, 06 Nov 1994 08:50:37 GMT")
+        assert e.freshness_lifetime() == 60
+
+    def test_invalid_expires_is_stale(self):
+        assert entry(expires=b"0").freshness_lifetime() == 0
+
+    def test_heuristic_freshness(self):
+        e = entry(date=b"Sun, 06 Nov 1994 08:49:37 GMT",
+                  last_modified=b"Sun, 06 Nov 1994 08:32:57 GMT")
+        assert e.freshness_lifetime() == 100
+
+    def test_age_includes_age_header_and_resident_time(self):
+        now = time()
+        e = entry(age=b"30", request_time=now - 12, response_time=now - 10)
+        assert 41 < e.age(now) < 43
+
+    def test_no_cache_is_never_fresh(self):
+        assert not entry(cache_control=b"max-age=60, no-cache").is_fresh()
+
+    def test_validators(self):
+        e = entry(etag=b'"abc"', last_modified=b"Sun, 06 Nov 1994 08:32:57 GMT")
+        assert e.validators() == {"if_none_match": b'"abc"',
+                                  "if_modified_since": b"Sun, 06 Nov 1994 08:32:57 GMT"}
+
+    def test_round_trip(self):
+        e = entry(etag=b'"abc"')
+        e.vary = {"accept_encoding": b"gzip"}
+        copy = CacheEntry.from_bytes(e.to_bytes())
+        assert copy.key == e.key
+        assert copy.headers == e.headers
+        assert copy.body == e.body
+        assert copy.vary == e.vary
+
+
+class CacheStoreTestCase(TestCase):
+
+    def test_memory_store_evicts_least_recently_used(self):
+        first, second, third = entry(b"/1"), entry(b"/2"), entry(b"/3")
+        store = MemoryCacheStore(2 * len(first))
+        store.put(first)
+        store.put(second)
+        store.get(b"/1")
+        store.put(third)
+        assert store.get(b"/1") is first
+        assert store.get(b"/2") is None
+        assert store.get(b"/3") is third
+
+    def test_disk_store(self):
+        path = mkdtemp()
+        try:
+            store = DiskCacheStore(path)
+            store.put(entry(b"/1"))
+            assert store.get(b"/1").body == b"bumblebee"
+            store.remove(b"/1")
+            assert store.get(b"/1") is None
+        finally:
+            rmtree(path)
+
+    def test_disk_tier_refills_memory(self):
+        path = mkdtemp()
+        try:
+            HTTPCache(path=path).put(entry(b"/1"))
+            cache = HTTPCache(path=path)
+            assert cache.get(b"/1").body == b"bumblebee"
+            assert len(cache.memory) == 1
+        finally:
+            rmtree(path)
+
+
+class CachingHTTPTestCase(TestCase):
+
+    def setUp(self):
+        self.http = LoopbackCachingHTTP(cache=HTTPCache())
+
+    def tearDown(self):
+        self.http.close()
+
+    def fetch(self, request, *data):
+        http = self.http
+        response = HTTPResponse()
+        http.append(request, response)
+        http.transmit()
+        sent = http.sent()
+        http.feed(*data)
+        assert response.end.is_set()
+        return response, sent
+
+    def test_fresh_response_is_served_from_cache(self):
+        response, sent = self.fetch(HTTPRequest.get(b"/"),
+                                    b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                                    b"Content-Length: 9\r\n\r\nbumblebee")
+        assert sent.startswith(b"GET / HTTP/1.1")
+        response, sent = self.fetch(HTTPRequest.get(b"/"))
+        assert sent == b""
+        assert response.status_code == 200
+        assert response.content() == b"bumblebee"
+
+    def test_stale_response_is_revalidated(self):
+        self.fetch(HTTPRequest.get(b"/"),
+                   b'HTTP/1.1 200 OK\r\nCache-Control: max-age=0\r\nETag: "abc"\r\n'
+                   b"Content-Length: 9\r\n\r\nbumblebee")
+        response, sent = self.fetch(HTTPRequest.get(b"/"),
+                                    b'HTTP/1.1 304 Not Modified\r\nETag: "abc"\r\n'
+                                    b"Cache-Control: max-age=60\r\n\r\n")
+        assert b'If-None-Match: "abc"' in sent
+        assert response.status_code == 200
+        assert response.content() == b"bumblebee"
+        response, sent = self.fetch(HTTPRequest.get(b"/"))
+        assert sent == b""
+
+    def test_changed_response_replaces_entry(self):
+        self.fetch(HTTPRequest.get(b"/"),
+                   b'HTTP/1.1 200 OK\r\nCache-Control: no-cache\r\nETag: "abc"\r\n'
+                   b"Content-Length: 9\r\n\r\nbumblebee")
+        response, _ = self.fetch(HTTPRequest.get(b"/"),
+                                 b'HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\nETag: "def"\r\n'
+                                 b"Content-Length: 6\r\n\r\nhornet")
+        assert response.content() == b"hornet"
+        response, sent = self.fetch(HTTPRequest.get(b"/"))
+        assert sent == b""
+        assert response.content() == b"hornet"
+
+    def test_no_store_is_not_cached(self):
+        self.fetch(HTTPRequest.get(b"/"),
+                   b"HTTP/1.1 200 OK\r\nCache-Control: no-store, max-age=60\r\n"
+                   b"Content-Length: 9\r\n\r\nbumblebee")
+        assert len(self.http.cache.memory) == 0
+
+    def test_unsafe_method_invalidates_entry(self):
+        self.fetch(HTTPRequest.get(b"/"),
+                   b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                   b"Content-Length: 9\r\n\r\nbumblebee")
+        self.fetch(HTTPRequest.post(b"/", b"wasp"), b"HTTP/1.1 204 No Content\r\n\r\n")
+        assert self.http.cache.get(b"localhost/") is None
+
+    def test_vary_mismatch_is_not_served(self):
+        self.fetch(HTTPRequest.get(b"/", accept_language=b"en"),
+                   b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\nVary: Accept-Language\r\n"
+                   b"Content-Length: 9\r\n\r\nbumblebee")
+        _, sent = self.fetch(HTTPRequest.get(b"/", accept_language=b"en"))
+        assert sent == b""
+        _, sent = self.fetch(HTTPRequest.get(b"/", accept_language=b"fr"),
+                             b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        assert sent.startswith(b"GET / HTTP/1.1")
+
+    def test_oversized_body_is_not_collected(self):
+        self.http.cache.memory.max_size = 64
+        response, _ = self.fetch(HTTPRequest.get(b"/"),
+                                 b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                                 b"Transfer-Encoding: chunked\r\n\r\n",
+                                 b"28\r\n" + 40 * b"a" + b"\r\n",
+                                 b"28\r\n" + 40 * b"b" + b"\r\n",
+                                 b"0\r\n\r\n")
+        assert response.content() == 40 * b"a" + 40 * b"b"
+        assert len(self.http.cache.memory) == 0
+
+    def test_oversized_content_length_is_not_collected(self):
+        self.http.cache.memory.max_size = 64
+        response, _ = self.fetch(HTTPRequest.get(b"/"),
+                                 b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                                 b"Content-Length: 80\r\n\r\n", 80 * b"a")
+        assert response.content() == 80 * b"a"
+        assert len(self.http.cache.memory) == 0
@@ -15,7 +15,623 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from select import EPOLLIN
+from threading import Event, Thread
+from time import sleep
 from unittest import TestCase
+from zlib import compress, compressobj, decompress
+
+from shortwave.http import HTTPRequest, HTTPResponse, HTTPReadIntoResponse, ContentBuffer, \
+    ContentDecoder, parse_chunk_extensions
+from shortwave.compat import bstr, TimeoutError
+from shortwave.messaging import MessageHeaderDict, MessageHeaderView, parse_internet_time
+from shortwave.transmission import Receiver
+
+from test.http import LoopbackHTTP
+
+
+class LazyHTTPResponse(HTTPResponse):
+    lazy_headers = True
+
+
+class ContentHTTPResponse(HTTPResponse):
+
+    def __init__(self):
+        self.content = []
+
+    def on_content(self, data):
+        self.content.append(bytes(data))
+
+
+class RecordingHTTPResponse(HTTPResponse):
+
+    def __init__(self):
+        self.data = []
+        self.extensions = []
+
+    def on_chunk_extensions(self, extensions):
+        self.extensions.append(extensions)
+
+    def on_body_data(self, data):
+        self.data.append(bytes(data))
+
+
+class ResponseHeadTestCase(TestCase):
+
+    def test_headers_are_parsed_into_dict_by_default(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                      b"Content-Length: 0\r\n\r\n")
+            assert response.end.is_set()
+            assert response.http_version == b"HTTP/1.1"
+            assert response.status_code == 200
+            assert response.reason_phrase == b"OK"
+            assert isinstance(response.headers, MessageHeaderDict)
+            assert response.headers["content_type"] == b"text/plain"
+        finally:
+            http.close()
+
+    def test_head_split_across_packets(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 204 No", b" Content\r\nX-Foo: b", b"ar\r\n", b"\r\n")
+            assert response.end.is_set()
+            assert response.reason_phrase == b"No Content"
+            assert response.headers["X-Foo"] == b"bar"
+        finally:
+            http.close()
+
+    def test_lazy_headers(self):
+        http = LoopbackHTTP()
+        response = LazyHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nSet-Cookie: a=1\r\nSet-Cookie: b=2\r\n"
+                      b"Content-Length: 0\r\n\r\n")
+            assert response.end.is_set()
+            assert isinstance(response.headers, MessageHeaderView)
+            assert response.headers.get_all("set_cookie") == [b"a=1", b"b=2"]
+        finally:
+            http.close()
+
+
+class FailingHTTPResponse(HTTPResponse):
+
+    calls = 0
+
+    def on_body_data(self, data):
+        self.calls += 1
+        raise ValueError("Unwanted")
+
+
+class ChunkedTransferTestCase(TestCase):
+
+    head = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+
+    def test_chunks_in_one_buffer_are_delivered_together(self):
+        http = LoopbackHTTP()
+        response = RecordingHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head + b"3\r\nbum\r\n3\r\nble\r\n3\r\nbee\r\n0\r\n\r\n")
+            assert response.end.is_set()
+            assert response.data == [b"bumblebee"]
+        finally:
+            http.close()
+
+    def test_chunks_split_across_packets(self):
+        http = LoopbackHTTP()
+        response = RecordingHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            data = self.head + b"3\r\nbum\r\nA\r\nblebee-bee\r\n0\r\n\r\n"
+            for i in range(len(data)):
+                http.feed(data[i:i + 1])
+            assert response.end.is_set()
+            assert b"".join(response.data) == b"bumblebee-bee"
+        finally:
+            http.close()
+
+    def test_invalid_chunk_size_fails_response(self):
+        for size in (b"-2", b"+2", b"0x2", b" 2"):
+            http = LoopbackHTTP()
+            response = RecordingHTTPResponse()
+            try:
+                http.append(HTTPRequest.get(b"/"), response)
+                http.feed(self.head + size + b"\r\nbu\r\n0\r\n\r\n")
+                assert response.end.is_set()
+                assert isinstance(response.error, ValueError)
+                assert response.data == []
+            finally:
+                http.close()
+
+    def test_extensions_and_trailers(self):
+        http = LoopbackHTTP()
+        response = RecordingHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head + b'3;name="a \\"b\\"";flag\r\nbum\r\n0\r\n'
+                                  b"Checksum: 1234\r\n\r\n")
+            assert response.end.is_set()
+            assert response.extensions == [{b"name": b'a "b"', b"flag": None}]
+            assert response.trailers["checksum"] == b"1234"
+        finally:
+            http.close()
+
+    def test_failed_delivery_is_not_repeated(self):
+        http = LoopbackHTTP()
+        response = FailingHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head + b"3\r\nbum\r\n3;x\r\nble\r\n0\r\n\r\n")
+            assert response.end.is_set()
+            assert isinstance(response.error, ValueError)
+            assert response.calls == 1
+        finally:
+            http.close()
+
+    def test_pipelined_response_after_chunked_response(self):
+        http = LoopbackHTTP()
+        first = RecordingHTTPResponse()
+        second = RecordingHTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), first)
+            http.append(HTTPRequest.get(b"/"), second)
+            http.feed(self.head + b"3\r\nbum\r\n0\r\n\r\n"
+                      b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nbee")
+            assert first.data == [b"bum"]
+            assert second.end.is_set()
+            assert second.data == [b"bee"]
+        finally:
+            http.close()
+
+    def test_parse_chunk_extensions(self):
+        assert parse_chunk_extensions(b"; A = 1 ;b") == {b"a": b"1", b"b": None}
+
+
+class ChunkedRequestTestCase(TestCase):
+
+    @staticmethod
+    def chunk_sizes(data):
+        _, _, body = data.partition(b"\r\n\r\n")
+        sizes = []
+        while body:
+            size, _, body = body.partition(b"\r\n")
+            sizes.append(int(size, 16))
+            body = body[sizes[-1] + 2:]
+        return sizes
+
+    def test_small_chunks_are_coalesced(self):
+        http = LoopbackHTTP()
+
+        def lines():
+            for i in range(1000):
+                yield b"line %03d\n" % i
+
+        try:
+            http.transmitter.chunk_buffer_size = 4000
+            http.append(HTTPRequest.post(b"/", lines), HTTPResponse())
+            http.transmit()
+            assert self.chunk_sizes(http.sent()) == [4005, 4005, 990, 0]
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+    def test_empty_chunk_forces_flush(self):
+        http = LoopbackHTTP()
+
+        def content():
+            yield b"bum"
+            yield b""
+            yield b"ble"
+            yield b"bee"
+
+        try:
+            http.append(HTTPRequest.post(b"/", content), HTTPResponse())
+            http.transmit()
+            assert self.chunk_sizes(http.sent()) == [3, 6, 0]
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+
+class ContentDecodingTestCase(TestCase):
+
+    @staticmethod
+    def gzip(data):
+        encoder = compressobj(9, 8, 31)
+        return encoder.compress(data) + encoder.flush()
+
+    def test_gzip_response_is_decoded(self):
+        http = LoopbackHTTP()
+        response = ContentHTTPResponse()
+        body = self.gzip(b"hello, world" * 100)
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\n"
+                      b"Content-Length: %d\r\n\r\n" % len(body), body[:10], body[10:])
+            assert response.end.is_set()
+            assert b"".join(response.content) == b"hello, world" * 100
+        finally:
+            http.close()
+
+    def test_decoded_output_is_bounded(self):
+        decoder = ContentDecoder.for_coding(b"deflate", max_step_size=1000)
+        pieces = list(decoder.decode(compress(b"\x00" * 100000)))
+        assert len(pieces) == 100
+        assert all(len(piece) == 1000 for piece in pieces)
+
+    def test_raw_deflate(self):
+        encoder = compressobj(9, 8, -15)
+        data = encoder.compress(b"bumblebee") + encoder.flush()
+        decoder = ContentDecoder.for_coding(b"deflate")
+        assert b"".join(decoder.decode(data)) == b"bumblebee"
+
+    def test_concatenated_gzip_members(self):
+        decoder = ContentDecoder.for_coding(b"gzip")
+        data = self.gzip(b"bumble") + self.gzip(b"bee")
+        assert b"".join(decoder.decode(data)) == b"bumblebee"
+
+    def test_identity_has_no_decoder(self):
+        assert ContentDecoder.for_coding(b"identity") is None
+
+
+class ContentEncodingTestCase(TestCase):
+
+    def send(self, request, compress=False):
+        http = LoopbackHTTP()
+        try:
+            http.transmitter.compress = compress
+            http.append(request, HTTPResponse())
+            http.transmit()
+            head, _, body = http.sent().partition(b"\r\n\r\n")
+            return head, body
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+    def test_large_body_is_compressed(self):
+        head, body = self.send(HTTPRequest.post(b"/", b"x" * 5000, compress=True))
+        assert b"Content-Encoding: gzip" in head
+        assert b"Content-Length: %d" % len(body) in head
+        assert decompress(body, 31) == b"x" * 5000
+
+    def test_headers_sent_in_order_with_host_first(self):
+        head, _ = self.send(HTTPRequest.post(b"/", b"bumblebee", x_first=b"1", accept=b"*/*"))
+        lines = head.split(b"\r\n")
+        assert lines[:2] == [b"POST / HTTP/1.1", b"Host: localhost"]
+        assert lines.index(b"X-First: 1") < lines.index(b"Accept: */*")
+
+    def test_encoded_content_is_not_compressed_again(self):
+        for name in ("content_encoding", "Content-Encoding", b"Content-Encoding"):
+            request = HTTPRequest.post(b"/", b"x" * 5000, compress=True)
+            request.headers[name] = b"br"
+            head, body = self.send(request)
+            assert b"Content-Encoding: gzip" not in head
+            assert body == b"x" * 5000
+
+    def test_connection_level_compression(self):
+        head, body = self.send(HTTPRequest.post(b"/", b"x" * 5000), compress=True)
+        assert decompress(body, 31) == b"x" * 5000
+
+    def test_small_body_is_not_compressed(self):
+        head, body = self.send(HTTPRequest.post(b"/", b"x" * 10, compress=True))
+        assert b"Content-Encoding" not in head
+        assert body == b"x" * 10
+
+    def test_request_can_opt_out(self):
+        head, body = self.send(HTTPRequest.post(b"/", b"x" * 5000, compress=False), compress=True)
+        assert body == b"x" * 5000
+
+    def test_chunked_body_is_compressed(self):
+
+        def content():
+            for _ in range(100):
+                yield b"bumblebee\n"
+
+        head, body = self.send(HTTPRequest.post(b"/", content, compress=True))
+        assert b"Content-Encoding: gzip" in head
+        encoded = []
+        while body:
+            size, _, body = body.partition(b"\r\n")
+            size = int(size, 16)
+            encoded.append(body[:size])
+            body = body[size + 2:]
+        assert decompress(b"".join(encoded), 31) == b"bumblebee\n" * 100
+
+    def test_chunked_text_body_is_compressed(self):
+
+        def content():
+            yield u"bumble"
+            yield b"bee"
+
+        head, body = self.send(HTTPRequest.post(b"/", content, compress=True))
+        assert b"Content-Encoding: gzip" in head
+        encoded = []
+        while body:
+            size, _, body = body.partition(b"\r\n")
+            size = int(size, 16)
+            encoded.append(body[:size])
+            body = body[size + 2:]
+        assert decompress(b"".join(encoded), 31) == b"bumblebee"
+
+
+class ContentTestCase(TestCase):
+
+    def get(self, head, *body):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(head, *body)
+            assert response.end.is_set()
+            return response
+        finally:
+            http.close()
+
+    def test_text_content(self):
+        response = self.get(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                            b"Content-Length: 14\r\n\r\n", b"hello, ", b"world\r\n")
+        assert response.content() == u"hello, world\r\n"
+
+    def test_json_content(self):
+        response = self.get(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                            b"Transfer-Encoding: chunked\r\n\r\n",
+                            b"6\r\n{\"bee\"\r\n", b"A\r\n:\"bumble\"}\r\n0\r\n\r\n")
+        assert response.content() == {"bee": "bumble"}
+
+    def test_binary_content(self):
+        response = self.get(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\n", b"\x00\x01\x02")
+        assert response.content() == b"\x00\x01\x02"
+        assert response.body.view().tobytes() == b"\x00\x01\x02"
+
+    def test_buffer_is_preallocated(self):
+        buffer = ContentBuffer(6)
+        buffer.write(b"bum")
+        assert len(buffer.buffer) == 6
+        buffer.write(b"blebee")
+        assert buffer.getvalue() == b"bumblebee"
+
+    def test_buffer_spills_to_file(self):
+        buffer = ContentBuffer(spill_size=8)
+        buffer.write(b"bumble")
+        assert not buffer.spilled()
+        buffer.write(b"bee")
+        assert buffer.spilled()
+        assert buffer.getvalue() == b"bumblebee"
+        assert buffer.view()[6:].tobytes() == b"bee"
+        assert buffer.reader().read() == b"bumblebee"
+        buffer.close()
+
+
+class ReadIntoTestCase(TestCase):
+
+    def test_content_is_written_into_buffer(self):
+        http = LoopbackHTTP()
+        buffer = bytearray(12)
+        response = HTTPReadIntoResponse(buffer, 2)
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n",
+                      b"6\r\nbumble\r\n", b"3\r\nbee\r\n0\r\n\r\n")
+            assert response.end.is_set()
+            assert response.error is None
+            assert buffer == b"\x00\x00bumblebee\x00"
+            assert response.content().tobytes() == b"bumblebee"
+        finally:
+            http.close()
+
+    def test_content_length_content_is_written_into_buffer(self):
+        http = LoopbackHTTP()
+        buffer = bytearray(9)
+        response, following = HTTPReadIntoResponse(buffer), HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.append(HTTPRequest.get(b"/"), following)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumb", b"le",
+                      b"bee" + b"HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\nhornet")
+            assert response.end.is_set()
+            assert response.error is None
+            assert buffer == b"bumblebee"
+            assert following.content() == b"hornet"
+        finally:
+            http.close()
+
+    def test_overflow_fails_response(self):
+        http = LoopbackHTTP()
+        response = HTTPReadIntoResponse(bytearray(4))
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+            assert response.end.is_set()
+            assert isinstance(response.error, BufferError)
+        finally:
+            http.close()
+
+
+class RequestHeadersTestCase(TestCase):
+
+    def test_headers_sent_without_body(self):
+        http = LoopbackHTTP()
+        try:
+            http.append(HTTPRequest.get(b"/", accept=b"text/plain"), HTTPResponse())
+            http.transmit()
+            head = http.sent()
+            assert head.startswith(b"GET / HTTP/1.1\r\n")
+            assert b"\r\nAccept: text/plain\r\n" in head
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+    def test_request_is_logged_once(self):
+        http = LoopbackHTTP()
+        try:
+            with self.assertLogs("shortwave", "INFO") as logs:
+                http.append(HTTPRequest.get(b"/bumblebee"), HTTPResponse())
+                http.transmit()
+            assert sum(b"GET /bumblebee" in bstr(line) for line in logs.output) == 1
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+    def test_output_list_is_reused(self):
+        http = LoopbackHTTP()
+        try:
+            data = http.transmitter.data
+            for target in (b"/a", b"/b"):
+                http.append(HTTPRequest.get(target), HTTPResponse())
+                http.transmit()
+                assert http.transmitter.data is data
+                assert data == []
+            assert http.sent().count(b"GET /") == 2
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n" * 2)
+            http.close()
+
+    def test_date_is_sent_on_request(self):
+        http = LoopbackHTTP()
+        try:
+            http.transmitter.send_date = True
+            http.append(HTTPRequest.get(b"/"), HTTPResponse())
+            http.transmit()
+            head = http.sent()
+            date = head.partition(b"\r\nDate: ")[2].partition(b"\r\n")[0]
+            assert parse_internet_time(date) is not None
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+
+class ConnectionCloseTestCase(TestCase):
+
+    def test_close_straight_after_data_is_detected(self):
+        # Drive an idle receiver by hand, so that the data and the close
+        # are certain to be read in the same burst
+        receiver = Receiver()
+        http = LoopbackHTTP(receiver=receiver)
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+            http.peer.close()
+            receiver._handle_event(http.fd, EPOLLIN)
+            assert response.end.is_set()
+            assert http.receiver is None
+        finally:
+            http.close()
+            receiver._poll.close()
+
+    def test_content_delimited_by_close(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\nbumblebee")
+            http.peer.close()
+            assert response.end.wait(5)
+            assert response.error is None
+            assert response.content() == b"bumblebee"
+        finally:
+            http.close()
+
+    def test_outstanding_responses_fail_on_close(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumble")
+            http.peer.close()
+            assert response.end.wait(5)
+            assert isinstance(response.error, IOError)
+        finally:
+            http.close()
+
+    def test_not_modified_response_has_no_content(self):
+        http = LoopbackHTTP()
+        first, second = HTTPResponse(), HTTPResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), first)
+            http.append(HTTPRequest.get(b"/"), second)
+            http.feed(b"HTTP/1.1 304 Not Modified\r\nContent-Length: 9\r\n\r\n"
+                      b"HTTP/1.1 204 No Content\r\n\r\n")
+            assert first.end.is_set()
+            assert second.end.is_set()
+            assert second.status_code == 204
+        finally:
+            http.close()
+
+    def test_head_response_has_no_content(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.append(HTTPRequest.head(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\n")
+            assert response.end.is_set()
+        finally:
+            http.close()
+
+
+class ExpectContinueTestCase(TestCase):
+
+    def transmit_in_background(self, http):
+        thread = Thread(target=http.transmit)
+        thread.start()
+        return thread
+
+    def test_content_sent_after_continue(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.transmitter.continue_timeout = 5
+            http.append(HTTPRequest.put(b"/", b"bumblebee", expect_continue=True), response)
+            thread = self.transmit_in_background(http)
+            head = b""
+            while not head.endswith(b"\r\n\r\n"):
+                head += http.peer.recv(4096)
+            assert b"Expect: 100-continue" in head
+            http.feed(b"HTTP/1.1 100 Continue\r\n\r\n")
+            thread.join()
+            assert http.sent() == b"bumblebee"
+            http.feed(b"HTTP/1.1 201 Created\r\nContent-Length: 0\r\n\r\n")
+            assert response.end.is_set()
+            assert response.status_code == 201
+        finally:
+            http.close()
+
+    def test_content_not_sent_after_final_response(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.transmitter.continue_timeout = 5
+            http.append(HTTPRequest.put(b"/", b"bumblebee", expect_continue=True), response)
+            thread = self.transmit_in_background(http)
+            head = b""
+            while not head.endswith(b"\r\n\r\n"):
+                head += http.peer.recv(4096)
+            http.feed(b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\n\r\n")
+            thread.join()
+            assert response.end.is_set()
+            assert response.status_code == 413
+            assert http.socket is None
+        finally:
+            http.close()
+
+    def test_content_sent_after_timeout(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        try:
+            http.transmitter.continue_timeout = 0.01
+            http.append(HTTPRequest.put(b"/", b"bumblebee", expect_continue=True), response)
+            http.transmit()
+            assert http.sent().endswith(b"\r\n\r\nbumblebee")
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
 
 
 # class GetMethodTestCase(TestCase):
@@ -59,7 +675,8 @@ from unittest import TestCase
 #         from shortwave import http
 #
 #         response = http.post(b"http://shortwave.tech/json?foo=bar", b"bumblebee")
-#         assert response.content() == {"method": "POST", "query": "foo=bar", "content": "bumblebee"}
+#         assert response.content() == {"method": "POST", "query": "foo=bar",
+#                                       "content": "bumblebee"}
 #
 #     def test_can_put_json(self):
 #         from shortwave import http
@@ -100,3 +717,106 @@ from unittest import TestCase
 #                                           "content": '{"bee":"bumble"}'}
 #         finally:
 #             http.close()
+
+
+class TimeoutTestCase(TestCase):
+
+    def test_total_timeout(self):
+        timed_out = Event()
+
+        class TimingOutHTTP(LoopbackHTTP):
+
+            def on_timeout(self, response, deadline):
+                try:
+                    super(TimingOutHTTP, self).on_timeout(response, deadline)
+                finally:
+                    timed_out.set()
+
+        http = TimingOutHTTP()
+        response = HTTPResponse()
+        response.total_timeout = 0.2
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.transmit()
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumble")
+            assert response.end.wait(5)
+            assert isinstance(response.error, TimeoutError)
+            # The connection is closed just after the response fails
+            assert timed_out.wait(5)
+            assert http.stopped()
+        finally:
+            http.close()
+
+    def test_first_byte_timeout(self):
+        http = LoopbackHTTP()
+        first, second = HTTPResponse(), HTTPResponse()
+        first.first_byte_timeout = 0.2
+        try:
+            http.append(HTTPRequest.get(b"/"), first)
+            http.append(HTTPRequest.get(b"/"), second)
+            http.transmit()
+            assert first.end.wait(5)
+            assert isinstance(first.error, TimeoutError)
+            assert isinstance(second.error, TimeoutError)
+        finally:
+            http.close()
+
+    def test_read_timeout_resets_on_data(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        response.read_timeout = 0.3
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.transmit()
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\n")
+            for piece in (b"bum", b"ble", b"bee"):
+                assert not response.end.wait(0.15)
+                http.peer.sendall(piece)
+            assert response.end.wait(5)
+            assert response.error is None
+            assert response.content() == b"bumblebee"
+        finally:
+            http.close()
+
+    def test_read_timeout(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        response.read_timeout = 0.2
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.transmit()
+            http.peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumble")
+            assert response.end.wait(5)
+            assert isinstance(response.error, TimeoutError)
+        finally:
+            http.close()
+
+    def test_completed_response_does_not_time_out(self):
+        http = LoopbackHTTP()
+        response = HTTPResponse()
+        response.total_timeout = 0.2
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+            assert response.timers == ()
+            assert not http.stopped()
+        finally:
+            http.close()
+
+    def test_idle_timeout(self):
+
+        class IdleHTTP(LoopbackHTTP):
+            idle_timeout = 0.2
+
+        http = IdleHTTP()
+        try:
+            http.append(HTTPRequest.get(b"/"), HTTPResponse())
+            http.transmit()
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+            for _ in range(50):
+                if http.stopped():
+                    break
+                sleep(0.1)
+            assert http.stopped()
+        finally:
+            http.close()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.compat import TimeoutError
+from shortwave.http import HTTPRequest, HTTPResponse, HTTPReadIntoResponse, CoalescingHTTP
+
+from test.http import LoopbackHTTP
+
+
+class LoopbackCoalescingHTTP(LoopbackHTTP, CoalescingHTTP):
+    pass
+
+
+class CoalescingHTTPTestCase(TestCase):
+
+    def setUp(self):
+        self.http = LoopbackCoalescingHTTP()
+
+    def tearDown(self):
+        self.http.abort()
+
+    def test_identical_requests_are_sent_once(self):
+        http = self.http
+        first, second = HTTPResponse(), HTTPResponse()
+        http.append(HTTPRequest.get(b"/"), first)
+        http.append(HTTPRequest.get(b"/"), second)
+        http.transmit()
+        assert http.sent().count(b"GET / HTTP/1.1") == 1
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+        for response in (first, second):
+            assert response.end.is_set()
+            assert response.status_code == 200
+            assert response.content() == b"bumblebee"
+        assert not http.in_flight
+
+    def test_late_joiner_receives_earlier_content(self):
+        http = self.http
+        first, second = HTTPResponse(), HTTPResponse()
+        http.append(HTTPRequest.get(b"/"), first)
+        http.transmit()
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumble")
+        http.append(HTTPRequest.get(b"/"), second)
+        http.transmit()
+        assert http.sent().count(b"GET") == 1
+        http.feed(b"bee")
+        assert first.content() == b"bumblebee"
+        assert second.content() == b"bumblebee"
+
+    def test_request_after_completion_is_sent(self):
+        http = self.http
+        http.append(HTTPRequest.get(b"/"), HTTPResponse())
+        http.transmit()
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        http.append(HTTPRequest.get(b"/"), HTTPResponse())
+        http.transmit()
+        assert http.sent().count(b"GET") == 2
+
+    def test_different_headers_are_not_coalesced(self):
+        http = self.http
+        http.append(HTTPRequest.get(b"/", accept=b"text/plain"), HTTPResponse())
+        http.append(HTTPRequest.get(b"/", accept=b"text/html"), HTTPResponse())
+        http.transmit()
+        assert http.sent().count(b"GET") == 2
+
+    def test_unsafe_requests_are_not_coalesced(self):
+        http = self.http
+        http.append(HTTPRequest.delete(b"/"), HTTPResponse())
+        http.append(HTTPRequest.delete(b"/"), HTTPResponse())
+        http.transmit()
+        assert http.sent().count(b"DELETE") == 2
+
+    def test_failing_target_does_not_affect_others(self):
+        http = self.http
+        small, normal = HTTPReadIntoResponse(bytearray(4)), HTTPResponse()
+        http.append(HTTPRequest.get(b"/"), small)
+        http.append(HTTPRequest.get(b"/"), normal)
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+        assert isinstance(small.error, BufferError)
+        assert normal.error is None
+        assert normal.content() == b"bumblebee"
+
+    def test_error_is_shared(self):
+        http = self.http
+        first, second = HTTPResponse(), HTTPResponse()
+        http.append(HTTPRequest.get(b"/"), first)
+        http.append(HTTPRequest.get(b"/"), second)
+        http.fail(IOError("gone"))
+        assert isinstance(first.error, IOError)
+        assert isinstance(second.error, IOError)
+        assert not http.in_flight
+
+    def test_oversized_response_cannot_be_joined(self):
+        http = self.http
+        http.append(HTTPRequest.get(b"/"), HTTPResponse())
+        http.transmit()
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumble")
+        http.in_flight[list(http.in_flight)[0]].max_replay_size = 4
+        http.feed(b"b")
+        http.append(HTTPRequest.get(b"/"), HTTPResponse())
+        http.transmit()
+        assert http.sent().count(b"GET") == 2
+
+    def test_target_can_make_requests_from_callbacks(self):
+        http = self.http
+        followed = HTTPResponse()
+
+        class FollowingResponse(HTTPResponse):
+
+            def on_head(self):
+                http.append(HTTPRequest.get(b"/"), followed)
+
+        first, second = FollowingResponse(), HTTPResponse()
+        http.append(HTTPRequest.get(b"/"), first)
+        http.append(HTTPRequest.get(b"/"), second)
+        http.transmit()
+        http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+        assert first.content() == b"bumblebee"
+        assert second.content() == b"bumblebee"
+        assert followed.content() == b"bumblebee"
+        assert http.sent().count(b"GET") == 1
+
+    def test_deadlines_apply_to_shared_request(self):
+        http = self.http
+        response = HTTPResponse()
+        response.total_timeout = 0.2
+        http.append(HTTPRequest.get(b"/"), response)
+        http.transmit()
+        assert response.end.wait(2.0)
+        assert isinstance(response.error, TimeoutError)
+
+    def test_different_deadlines_are_not_coalesced(self):
+        http = self.http
+        first, second = HTTPResponse(), HTTPResponse()
+        second.total_timeout = 30
+        http.append(HTTPRequest.get(b"/"), first)
+        http.append(HTTPRequest.get(b"/"), second)
+        http.transmit()
+        assert http.sent().count(b"GET") == 2
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.http import HTTPRequest, HTTPResponse, HedgedHTTP
+
+from test.http import LoopbackHTTP
+
+
+class RespondingHTTP(LoopbackHTTP):
+    """ Loopback connection that replies to each transmission with the
+    data given for its authority, if any.
+    """
+
+    replies = {}
+
+    def __init__(self, authority=b"localhost", *args, **kwargs):
+        super(RespondingHTTP, self).__init__(authority, *args, **kwargs)
+        self.reply = self.replies.get(authority)
+
+    def transmit(self):
+        pending = bool(self.requests)
+        super(RespondingHTTP, self).transmit()
+        if pending and self.reply:
+            self.feed(self.reply)
+
+
+class LoopbackHedgedHTTP(HedgedHTTP):
+    Connection = RespondingHTTP
+
+
+class HedgedHTTPTestCase(TestCase):
+
+    def setUp(self):
+        RespondingHTTP.replies = {}
+
+    def test_fast_primary_is_not_hedged(self):
+        RespondingHTTP.replies[b"primary"] = (b"HTTP/1.1 200 OK\r\n"
+                                              b"Content-Length: 9\r\n\r\nbumblebee")
+        hedged = LoopbackHedgedHTTP(b"primary", b"hedge", delay=5)
+        try:
+            response = hedged.request(HTTPRequest.get(b"/"), HTTPResponse())
+            assert response.end.is_set()
+            assert response.content() == b"bumblebee"
+            assert hedged.hedges == 0
+            assert hedged.connections[1] == []
+            assert len(hedged.latencies) == 1
+        finally:
+            hedged.close()
+
+    def test_slow_primary_is_hedged(self):
+        RespondingHTTP.replies[b"hedge"] = (b"HTTP/1.1 200 OK\r\n"
+                                            b"Content-Length: 6\r\n\r\nhornet")
+        hedged = LoopbackHedgedHTTP(b"primary", b"hedge", delay=0.01)
+        try:
+            response = hedged.request(HTTPRequest.get(b"/"), HTTPResponse())
+            assert response.end.is_set()
+            assert response.error is None
+            assert response.content() == b"hornet"
+            assert hedged.hedges == 1
+            assert hedged.authorities == [b"hedge", b"primary"]
+            assert hedged.connections[1] == []
+            # The abandoned primary's latency is recorded, not the hedge's
+            assert len(hedged.latencies) == 1
+            assert hedged.latencies[0] >= 0.01
+        finally:
+            hedged.close()
+
+    def test_losing_primary_does_not_cut_short_earlier_responses(self):
+        RespondingHTTP.replies[b"primary"] = (b"HTTP/1.1 200 OK\r\n"
+                                              b"Content-Length: 9\r\n\r\nbumble")
+        hedged = LoopbackHedgedHTTP(b"primary", b"hedge", delay=0.01)
+        try:
+            first = hedged.request(HTTPRequest.get(b"/a"), HTTPResponse())
+            first_http = hedged.connections[0][0]
+            RespondingHTTP.replies[b"primary"] = None
+            RespondingHTTP.replies[b"hedge"] = (b"HTTP/1.1 200 OK\r\n"
+                                                b"Content-Length: 6\r\n\r\nhornet")
+            second = hedged.request(HTTPRequest.get(b"/b"), HTTPResponse())
+            assert second.content() == b"hornet"
+            assert hedged.hedges == 1
+            first_http.feed(b"bee")
+            assert first.end.is_set()
+            assert first.error is None
+            assert first.content() == b"bumblebee"
+        finally:
+            hedged.close()
+
+    def test_non_idempotent_request_is_not_hedged(self):
+        hedged = LoopbackHedgedHTTP(b"primary", b"hedge", delay=0.01)
+        try:
+            response = hedged.request(HTTPRequest.post(b"/", b"wasp"), HTTPResponse(),
+                                      timeout=0.05)
+            assert not response.end.is_set()
+            assert hedged.hedges == 0
+        finally:
+            hedged.close()
+        assert response.end.is_set()
+
+    def test_winner_error_is_reported(self):
+        RespondingHTTP.replies[b"primary"] = (b"HTTP/1.1 200 OK\r\n"
+                                              b"Content-Length: 9\r\n\r\nbumble")
+        hedged = LoopbackHedgedHTTP(b"primary", b"hedge", delay=5)
+        try:
+            response = hedged.request(HTTPRequest.get(b"/"), HTTPResponse())
+            hedged.connections[0][0].fail(IOError("gone"))
+            assert response.end.is_set()
+            assert isinstance(response.error, IOError)
+        finally:
+            hedged.close()
+
+    def test_percentile_delay(self):
+        hedged = HedgedHTTP(b"localhost", delay=1.0, percentile=0.9)
+        assert hedged.hedge_delay() == 1.0
+        hedged.latencies.extend(i / 100.0 for i in range(100))
+        assert hedged.hedge_delay() == 0.9
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from shortwave.http import HTTPRequest, HTTPResponse, MultipartParser, MultipartResponse, \
+    MultipartEncoder
+
+from test.http import LoopbackHTTP
+
+
+CONTENT = (b"preamble\r\n"
+           b"--frontier\r\n"
+           b"Content-Type: text/plain\r\n"
+           b"\r\n"
+           b"first\r\n--front line\r\n"
+           b"--frontier  \r\n"
+           b"\r\n"
+           b"second\r\n"
+           b"--frontier--\r\n"
+           b"epilogue")
+
+
+class RecordingParser(MultipartParser):
+
+    def __init__(self, boundary):
+        super(RecordingParser, self).__init__(boundary)
+        self.parts = []
+
+    def on_part_begin(self, headers):
+        self.parts.append([headers, b"", False])
+
+    def on_part_data(self, data):
+        self.parts[-1][1] += data
+
+    def on_part_end(self):
+        self.parts[-1][2] = True
+
+
+class MultipartParserTestCase(TestCase):
+
+    def parse(self, content, size):
+        parser = RecordingParser(b"frontier")
+        for i in range(0, len(content), size):
+            parser.feed(content[i:i + size])
+        parser.close()
+        return parser.parts
+
+    def check(self, parts):
+        assert len(parts) == 2
+        headers, body, ended = parts[0]
+        assert headers.get(b"content-type") == b"text/plain"
+        assert body == b"first\r\n--front line"
+        assert ended
+        headers, body, ended = parts[1]
+        assert len(headers) == 0
+        assert body == b"second"
+        assert ended
+
+    def test_parse_whole(self):
+        self.check(self.parse(CONTENT, len(CONTENT)))
+
+    def test_parse_byte_by_byte(self):
+        self.check(self.parse(CONTENT, 1))
+
+    def test_parse_in_pieces(self):
+        for size in (2, 3, 7, 13):
+            self.check(self.parse(CONTENT, size))
+
+    def test_content_without_preamble(self):
+        parts = self.parse(CONTENT[CONTENT.index(b"--frontier"):], 5)
+        self.check(parts)
+
+    def test_unterminated_content(self):
+        parser = MultipartParser(b"frontier")
+        parser.feed(CONTENT[:40])
+        with self.assertRaises(ValueError):
+            parser.close()
+
+    def test_boundary_required(self):
+        with self.assertRaises(ValueError):
+            MultipartParser(None)
+
+
+class MultipartEncoderTestCase(TestCase):
+
+    def encoder(self):
+        encoder = MultipartEncoder(boundary=b"frontier")
+        encoder.add_field("name", "bumblebee")
+        encoder.add_field(b'we"ird', b"{}", content_type=b"application/json")
+        return encoder
+
+    def test_encoding(self):
+        content = b"".join(self.encoder())
+        assert content == (b'--frontier\r\nContent-Disposition: form-data; name="name"\r\n\r\n'
+                           b"bumblebee\r\n"
+                           b'--frontier\r\nContent-Disposition: form-data; name="we%22ird"\r\n'
+                           b"Content-Type: application/json\r\n\r\n"
+                           b"{}\r\n"
+                           b"--frontier--\r\n")
+
+    def test_content_length(self):
+        encoder = self.encoder()
+        assert encoder.content_length() == len(b"".join(encoder))
+
+    def test_files_are_streamed(self):
+        with NamedTemporaryFile() as f:
+            f.write(b"x" * 200000)
+            f.flush()
+            encoder = MultipartEncoder()
+            encoder.add_file("upload", f.name, content_type=b"text/plain")
+            f.seek(100000)
+            encoder.add_file("rest", f)
+            pieces = list(encoder)
+            assert max(len(piece) for piece in pieces) <= 65536
+            assert encoder.content_length() == sum(len(piece) for piece in pieces)
+            parser = RecordingParser(encoder.boundary)
+            for piece in pieces:
+                parser.feed(piece)
+            parser.close()
+            assert [len(body) for _, body, _ in parser.parts] == [200000, 100000]
+            assert b"filename=" in parser.parts[0][0][b"content-disposition"]
+
+    def test_send_as_fixed_length_body(self):
+        http = LoopbackHTTP()
+        try:
+            encoder = self.encoder()
+            http.append(HTTPRequest.post(b"/", encoder), HTTPResponse())
+            http.transmit()
+            head, _, body = http.sent().partition(b"\r\n\r\n")
+            assert b"Content-Type: multipart/form-data; boundary=frontier" in head
+            assert b"Content-Length: %d" % len(body) in head
+            assert body == b"".join(encoder)
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+    def test_send_as_chunked_body(self):
+        http = LoopbackHTTP()
+        try:
+            encoder = self.encoder()
+            http.append(HTTPRequest.post(b"/", encoder.chunks, content_type=encoder.content_type),
+                        HTTPResponse())
+            http.transmit()
+            head, _, _ = http.sent().partition(b"\r\n\r\n")
+            assert b"Transfer-Encoding: chunked" in head
+            assert b"Content-Type: multipart/form-data; boundary=frontier" in head
+        finally:
+            http.feed(b"HTTP/1.1 204 No Content\r\n\r\n")
+            http.close()
+
+
+class MultipartResponseTestCase(TestCase):
+
+    def test_parts_collected(self):
+        http = LoopbackHTTP()
+        response = MultipartResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\n"
+                      b"Content-Type: multipart/mixed; boundary=\"frontier\"\r\n"
+                      b"Content-Length: %d\r\n\r\n" % len(CONTENT), CONTENT[:50], CONTENT[50:])
+            assert response.end.is_set()
+            assert response.error is None
+            assert [part.content() for part in response.parts] == [b"first\r\n--front line",
+                                                                   b"second"]
+        finally:
+            http.close()
+
+    def test_other_content_is_collected_normally(self):
+        http = LoopbackHTTP()
+        response = MultipartResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nbumblebee")
+            assert response.content() == b"bumblebee"
+            assert response.parts == []
+        finally:
+            http.close()
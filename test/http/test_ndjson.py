@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.http import HTTPRequest, NDJSONResponse
+
+from test.http import LoopbackHTTP
+
+
+class NDJSONResponseTestCase(TestCase):
+
+    head = (b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n")
+
+    def test_records_split_across_chunks(self):
+        http = LoopbackHTTP()
+        objects = []
+        response = NDJSONResponse(objects.append)
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head, b"9\r\n{\"a\": 1}\n\r\n", b"4\r\n{\"b\"\r\n",
+                      b"6\r\n: 2}\n\n\r\n", b"8\r\n{\"c\": 3}\r\n0\r\n\r\n")
+            assert response.end.is_set()
+            assert objects == [{"a": 1}, {"b": 2}, {"c": 3}]
+        finally:
+            http.close()
+
+    def test_json_text_sequence(self):
+        objects = []
+        response = NDJSONResponse(objects.append)
+        response.on_content(b"\x1e1\n\x1e\"two\"\n\x1e[3]\n")
+        # The last text is only known to be complete at the end
+        assert objects == [1, "two"]
+        response.on_end()
+        assert objects == [1, "two", [3]]
+
+    def test_multi_line_json_text_sequence(self):
+        objects = []
+        response = NDJSONResponse(objects.append)
+        response.on_content(b'\x1e{\n  "a": 1\n}\n\x1e[2')
+        response.on_content(b']\n')
+        response.on_end()
+        assert objects == [{"a": 1}, [2]]
+
+    def test_json_text_sequence_by_content_type(self):
+        http = LoopbackHTTP()
+        objects = []
+        response = NDJSONResponse(objects.append)
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Type: application/json-seq\r\n"
+                      b"Content-Length: 12\r\n\r\n\n\x1e[\n1\n]\n\x1e2\n\n")
+            assert response.end.is_set()
+            assert objects == [[1], 2]
+        finally:
+            http.close()
+
+    def test_custom_loads(self):
+        objects = []
+        response = NDJSONResponse(objects.append, loads=bytes.upper)
+        response.on_content(b"a\nb\n")
+        assert objects == [b"A", b"B"]
+
+    def test_iteration(self):
+        http = LoopbackHTTP()
+        response = NDJSONResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head, b"6\r\n1\n2\n3\n\r\n0\r\n\r\n")
+            assert list(response) == [1, 2, 3]
+        finally:
+            http.close()
+
+    def test_iteration_ends_on_error(self):
+        http = LoopbackHTTP()
+        response = NDJSONResponse()
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head, b"4\r\n1\n2\n\r\n")
+            http.fail(IOError("Gone"))
+            iterator = iter(response)
+            assert next(iterator) == 1
+            assert next(iterator) == 2
+            with self.assertRaises(IOError):
+                next(iterator)
+        finally:
+            http.close()
+
+    def test_overflowing_queue_fails_response(self):
+        http = LoopbackHTTP()
+        response = NDJSONResponse()
+        response.max_queue_size = 4
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(self.head, b"c\r\n1\n2\n3\n4\n5\n6\n\r\n0\r\n\r\n")
+            assert response.end.is_set()
+            assert isinstance(response.error, BufferError)
+            iterator = iter(response)
+            assert [next(iterator) for _ in range(4)] == [1, 2, 3, 4]
+            with self.assertRaises(BufferError):
+                next(iterator)
+        finally:
+            http.close()
+
+    def test_sequence_is_sniffed_for_other_content_types(self):
+        http = LoopbackHTTP()
+        objects = []
+        response = NDJSONResponse(objects.append)
+        try:
+            http.append(HTTPRequest.get(b"/"), response)
+            http.feed(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                      b"Content-Length: 9\r\n\r\n\x1e[\n1\n]\n\x1e2")
+            assert response.end.is_set()
+            assert objects == [[1], 2]
+        finally:
+            http.close()
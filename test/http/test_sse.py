@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from socket import socket, AF_INET, SOCK_STREAM
+from threading import Thread
+from unittest import TestCase
+
+from shortwave.http import EventStreamResponse, EventSource, ServerSentEvent
+
+
+class EventStreamResponseTestCase(TestCase):
+
+    def test_events_split_across_chunks(self):
+        events = []
+        response = EventStreamResponse(events.append)
+        for data in [b": comment\r\nid: 1\r\ndata: hel", b"lo\r", b"\ndata: world\r\n\r",
+                     b"\nevent: update\nid: 2\nretry: 2500\ndata:{}\n\n"]:
+            response.on_content(data)
+        assert events == [ServerSentEvent("message", "hello\nworld", "1"),
+                          ServerSentEvent("update", "{}", "2")]
+        assert response.last_event_id == "2"
+        assert response.retry == 2.5
+
+    def test_event_without_data_is_not_dispatched(self):
+        events = []
+        response = EventStreamResponse(events.append)
+        response.on_content(b"event: ping\n\ndata\n\n")
+        assert events == [ServerSentEvent("message", "", None)]
+
+    def test_id_takes_effect_on_dispatch(self):
+        events = []
+        response = EventStreamResponse(events.append, last_event_id="1")
+        response.on_content(b"id: 2\ndata: b\n")
+        assert response.last_event_id == "1"
+        response.on_content(b"\n")
+        assert events == [ServerSentEvent("message", "b", "2")]
+        assert response.last_event_id == "2"
+
+    def test_long_line_in_many_pieces(self):
+        events = []
+        response = EventStreamResponse(events.append)
+        response.on_content(b"data: ")
+        for _ in range(100):
+            response.on_content(b"buzz ")
+        response.on_content(b"\r")
+        response.on_content(b"data: bee\r")
+        response.on_content(b"\r")
+        assert events == []
+        response.on_content(b"\n")
+        assert events == [ServerSentEvent("message", 100 * "buzz " + "\nbee", None)]
+        assert response.pending == b""
+
+
+class EventSourceTestCase(TestCase):
+
+    def test_reconnects_with_last_event_id(self):
+        listener = socket(AF_INET, SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(2)
+        authority = ("127.0.0.1:%d" % listener.getsockname()[1]).encode("ascii")
+        requests = []
+        events = []
+        bodies = [b"retry: 10\nid: 1\ndata: one\n\n", b"data: two\n\n"]
+
+        def serve():
+            for body in bodies:
+                peer, _ = listener.accept()
+                request = b""
+                while not request.endswith(b"\r\n\r\n"):
+                    request += peer.recv(4096)
+                requests.append(request)
+                peer.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n\r\n" + body)
+                peer.close()
+
+        def on_event(event):
+            events.append(event)
+            if len(events) == 2:
+                source.close()
+
+        source = EventSource(authority, b"/events", on_event)
+        server = Thread(target=serve)
+        server.start()
+        try:
+            source.run()
+        finally:
+            server.join()
+            listener.close()
+        assert [event.data for event in events] == ["one", "two"]
+        assert b"Last-Event-ID: 1" not in requests[0]
+        assert b"Last-Event-ID: 1" in requests[1]
+        assert source.retry == 0.01
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from socket import socket as _socket, AF_INET, SOCK_STREAM, SHUT_RDWR
+from threading import Thread
+
+
+class StandInSMTPServer(Thread):
+    """ Minimal in-process SMTP server for testing. Connections are
+    served one at a time. Replies are held back until all data received
+    so far has been handled, as a pipelining server would do, and every
+    command and reply is recorded in `log` so that tests can see which
+    commands arrived before which replies were sent.
+
+    Senders and recipients containing `reject` are refused.
+    """
+
+    extensions = (b"PIPELINING", b"CHUNKING", b"SIZE 10240000", b"8BITMIME")
+
+    def __init__(self, extensions=None):
+        super(StandInSMTPServer, self).__init__()
+        self.daemon = True
+        if extensions is not None:
+            self.extensions = extensions
+        self.listener = _socket(AF_INET, SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(5)
+        self.authority = ("127.0.0.1:%d" % self.listener.getsockname()[1]).encode("ascii")
+        self.connections = 0
+        self.messages = []
+        self.log = []
+        self.start()
+
+    def stop(self):
+        try:
+            self.listener.shutdown(SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self.listener.close()
+
+    def run(self):
+        while True:
+            try:
+                socket, _ = self.listener.accept()
+            except (IOError, OSError):
+                return
+            self.connections += 1
+            try:
+                self.serve(socket)
+            except (IOError, OSError):
+                pass
+            finally:
+                socket.close()
+
+    def serve(self, socket):
+        replies = []
+        buffer = bytearray()
+        session = {"sender": None, "recipients": [], "content": None, "bdat": None}
+
+        def reply(code, *lines):
+            lines = lines or (b"OK",)
+            data = b"".join(b"%d-%s\r\n" % (code, line) for line in lines[:-1])
+            replies.append((code, data + b"%d %s\r\n" % (code, lines[-1])))
+
+        def flush():
+            if replies:
+                self.log.extend(("S", code) for code, _ in replies)
+                socket.sendall(b"".join(data for _, data in replies))
+                replies[:] = []
+
+        reply(220, b"stand-in ESMTP")
+        flush()
+        while True:
+            data = socket.recv(65536)
+            if not data:
+                return
+            buffer += data
+            while buffer:
+                if session["bdat"] is not None:
+                    if len(buffer) < session["bdat"]:
+                        break
+                    content = bytes(buffer[:session["bdat"]])
+                    del buffer[:session["bdat"]]
+                    session["bdat"] = None
+                    self.deliver(session, content, reply)
+                elif session["content"] is not None:
+                    end = buffer.find(b"\r\n.\r\n")
+                    if end == -1:
+                        break
+                    content = bytes(buffer[:end + 2]).replace(b"\r\n..", b"\r\n.")
+                    if content.startswith(b".."):
+                        content = content[1:]
+                    del buffer[:end + 5]
+                    session["content"] = None
+                    self.deliver(session, content, reply)
+                else:
+                    end = buffer.find(b"\r\n")
+                    if end == -1:
+                        break
+                    line = bytes(buffer[:end])
+                    del buffer[:end + 2]
+                    self.log.append(("C", line))
+                    if self.handle(session, line, reply):
+                        flush()
+                        return
+            flush()
+
+    def handle(self, session, line, reply):
+        verb, _, argument = line.partition(b" ")
+        verb = verb.upper()
+        if verb == b"EHLO":
+            reply(250, *((b"stand-in",) + tuple(self.extensions)))
+        elif verb == b"HELO":
+            reply(250, b"stand-in")
+        elif verb == b"MAIL":
+            if session["sender"] is not None:
+                reply(503, b"Nested MAIL command")
+            elif b"reject" in argument:
+                reply(550, b"Sender refused")
+            else:
+                session["sender"] = argument[5:].partition(b">")[0].lstrip(b"<")
+                reply(250)
+        elif verb == b"RCPT":
+            recipient = argument[3:].strip(b"<>")
+            if session["sender"] is None:
+                reply(503, b"Need MAIL first")
+            elif b"reject" in recipient:
+                reply(550, b"No such user")
+            else:
+                session["recipients"].append(recipient)
+                reply(250)
+        elif verb == b"DATA":
+            if session["recipients"]:
+                session["content"] = True
+                reply(354, b"Go ahead")
+            else:
+                reply(554, b"No valid recipients")
+        elif verb == b"BDAT":
+            session["bdat"] = int(argument.split()[0])
+        elif verb == b"RSET":
+            session.update(sender=None, recipients=[])
+            reply(250)
+        elif verb == b"QUIT":
+            reply(221, b"Bye")
+            return True
+        else:
+            reply(500, b"Unrecognised command")
+        return False
+
+    def deliver(self, session, content, reply):
+        if session["recipients"]:
+            self.messages.append((session["sender"], session["recipients"], content))
+            reply(250, b"Queued")
+        else:
+            reply(554, b"No valid recipients")
+        session.update(sender=None, recipients=[])
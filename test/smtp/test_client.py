@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.messaging import Message, MessageHeaderDict, parse_internet_time
+from shortwave.smtp import SMTP, SMTPDelivery, message_pieces, parse_extensions
+
+from test.smtp import StandInSMTPServer
+
+
+MESSAGE = b"Subject: Hello\r\n\r\nHello, world\r\n.hidden dot\r\n"
+
+
+class SMTPTestCase(TestCase):
+
+    extensions = None
+
+    def setUp(self):
+        self.server = StandInSMTPServer(self.extensions)
+        self.smtp = SMTP(self.server.authority, hostname=b"client.test")
+
+    def tearDown(self):
+        self.smtp.quit()
+        self.server.stop()
+
+    def commands(self):
+        return [entry[1] for entry in self.server.log if entry[0] == "C"]
+
+
+class PipelinedChunkingTestCase(SMTPTestCase):
+
+    def test_greeting_and_extensions(self):
+        assert self.smtp.greeting.code == 220
+        assert self.smtp.extensions[b"SIZE"] == b"10240000"
+        assert b"PIPELINING" in self.smtp.extensions
+        assert b"CHUNKING" in self.smtp.extensions
+
+    def test_send_raw_message(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert delivery.succeeded()
+        assert delivery.accepted() == [b"bob@example.com"]
+        assert self.server.messages == [
+            (b"alice@example.com", [b"bob@example.com"], MESSAGE)]
+        assert self.commands()[-1] == b"BDAT %d LAST" % len(MESSAGE)
+
+    def test_transaction_is_pipelined(self):
+        recipients = [b"bob@example.com", b"carol@example.com"]
+        delivery = self.smtp.send(b"alice@example.com", recipients, MESSAGE)
+        assert delivery.wait(5)
+        log = self.server.log
+        # Everything after EHLO arrives before any reply is sent
+        start = log.index(("C", b"EHLO client.test")) + 2
+        assert [entry[0] for entry in log[start:]] == ["C"] * 4 + ["S"] * 4
+
+    def test_send_header_dict_and_body(self):
+        headers = MessageHeaderDict()
+        headers[b"From"] = b"alice@example.com"
+        headers[b"Date"] = b"Sun, 06 Nov 1994 08:49:37 +0000"
+        headers[b"Subject"] = b"Hi"
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"],
+                                  (headers, b"Body\r\n"))
+        assert delivery.wait(5)
+        assert self.server.messages[0][2] == (b"From: alice@example.com\r\n"
+                                              b"Date: Sun, 06 Nov 1994 08:49:37 +0000\r\n"
+                                              b"Subject: Hi\r\n\r\nBody\r\n")
+
+    def test_send_mailbox_message(self):
+        data = b"From alice Mon Jan  1 00:00:00 2024\n" + MESSAGE
+        message = Message(data, start=data.index(b"\n") + 1)
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], message)
+        assert delivery.wait(5)
+        assert self.server.messages[0][2] == MESSAGE
+
+    def test_per_recipient_results(self):
+        seen = []
+
+        class RecordingDelivery(SMTPDelivery):
+
+            def on_recipient(self, recipient, reply):
+                seen.append((recipient, reply.code))
+
+        recipients = [b"bob@example.com", b"reject@example.com"]
+        delivery = self.smtp.send(b"alice@example.com", recipients, MESSAGE,
+                                  RecordingDelivery())
+        assert delivery.wait(5)
+        assert seen == [(b"bob@example.com", 250), (b"reject@example.com", 550)]
+        assert delivery.accepted() == [b"bob@example.com"]
+        assert list(delivery.rejected()) == [b"reject@example.com"]
+        assert delivery.succeeded()
+
+    def test_mailbox_line_endings_are_converted(self):
+        data = b"From alice Mon Jan  1 00:00:00 2024\nSubject: Hello\n\nHello, world\n"
+        message = Message(data, start=data.index(b"\n") + 1)
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], message)
+        assert delivery.wait(5)
+        assert self.server.messages[0][2] == b"Subject: Hello\r\n\r\nHello, world\r\n"
+
+    def test_large_message(self):
+        message = b"Subject: Large\r\n\r\n" + (b"x" * 998 + b"\r\n") * 4096
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], message)
+        assert delivery.wait(5)
+        assert delivery.succeeded()
+        assert self.server.messages[0][2] == message
+
+    def test_sender_rejected(self):
+        delivery = self.smtp.send(b"reject@example.com", [b"bob@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert not delivery.succeeded()
+        assert delivery.mail_reply.code == 550
+
+    def test_all_recipients_rejected(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"reject@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert not delivery.succeeded()
+        assert delivery.reply.code == 554
+        assert self.server.messages == []
+
+    def test_connection_is_reused(self):
+        deliveries = [self.smtp.send(b"alice@example.com", [b"bob@example.com"], MESSAGE)
+                      for _ in range(3)]
+        for delivery in deliveries:
+            assert delivery.wait(5)
+            assert delivery.succeeded()
+        assert self.server.connections == 1
+        assert len(self.server.messages) == 3
+
+    def test_reuse_after_failed_transaction(self):
+        failed = self.smtp.send(b"alice@example.com", [b"reject@example.com"], MESSAGE)
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], MESSAGE)
+        assert failed.wait(5) and delivery.wait(5)
+        assert not failed.succeeded()
+        assert delivery.succeeded()
+        assert b"RSET" in self.commands()
+
+
+class DataTestCase(SMTPTestCase):
+
+    extensions = (b"PIPELINING",)
+
+    def test_send_with_data(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert delivery.succeeded()
+        assert b"DATA" in self.commands()
+        assert self.server.messages[0][2] == MESSAGE
+
+    def test_leading_dot_is_stuffed(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"bob@example.com"],
+                                  b".\r\n..\r\n")
+        assert delivery.wait(5)
+        assert self.server.messages[0][2] == b".\r\n..\r\n"
+
+    def test_data_rejected_without_recipients(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"reject@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert delivery.reply.code == 554
+
+
+class UnpipelinedTestCase(SMTPTestCase):
+
+    extensions = ()
+
+    def test_send_in_lockstep(self):
+        recipients = [b"bob@example.com", b"carol@example.com"]
+        delivery = self.smtp.send(b"alice@example.com", recipients, MESSAGE)
+        assert delivery.wait(5)
+        assert delivery.succeeded()
+        log = self.server.log
+        start = log.index(("C", b"EHLO client.test")) + 2
+        # The message itself is not a command, so only its reply shows
+        assert [entry[0] for entry in log[start:]] == ["C", "S"] * 4 + ["S"]
+
+    def test_stops_after_sender_rejected(self):
+        recipients = [b"bob@example.com", b"carol@example.com"]
+        delivery = self.smtp.send(b"reject@example.com", recipients, MESSAGE)
+        assert delivery.wait(5)
+        assert not delivery.succeeded()
+        assert delivery.reply.code == 550
+        assert not [command for command in self.commands() if command.startswith(b"RCPT")]
+
+    def test_stops_after_rejections(self):
+        delivery = self.smtp.send(b"alice@example.com", [b"reject@example.com"], MESSAGE)
+        assert delivery.wait(5)
+        assert not delivery.succeeded()
+        assert b"DATA" not in self.commands()
+
+
+class ParseExtensionsTestCase(TestCase):
+
+    def test_keywords_are_upper_cased(self):
+        assert parse_extensions([b"pipelining", b"SIZE 1000", b"AUTH PLAIN LOGIN"]) == {
+            b"PIPELINING": b"", b"SIZE": b"1000", b"AUTH": b"PLAIN LOGIN"}
+
+
+class MessagePiecesTestCase(TestCase):
+
+    def test_date_is_added_when_missing(self):
+        headers = MessageHeaderDict()
+        headers[b"Subject"] = b"Hi"
+        message = b"".join(message_pieces((headers, b"Body\r\n")))
+        head, _, body = message.partition(b"\r\n\r\n")
+        subject, date = head.split(b"\r\n")
+        assert subject == b"Subject: Hi"
+        assert date.startswith(b"Date: ") and date.endswith(b" +0000")
+        assert parse_internet_time(date[6:-6] + b" GMT") is not None
+        assert b"date" not in headers
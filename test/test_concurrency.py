@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+
+from shortwave.concurrency import TimerWheel
+
+
+class TimerWheelTestCase(TestCase):
+
+    def setUp(self):
+        self.wheel = TimerWheel(tick=1.0, size=8)
+        self.start = self.wheel.time
+        self.fired = []
+
+    def schedule(self, delay, name):
+        return self.wheel.schedule(delay, self.fired.append, name)
+
+    def advance(self, seconds):
+        # Timers are scheduled slightly after the wheel's start time, so
+        # may fire one tick after their nominal expiry
+        return self.wheel.advance(self.start + seconds)
+
+    def test_timer_fires_after_delay(self):
+        self.schedule(2.5, "a")
+        self.advance(2.0)
+        assert self.fired == []
+        self.advance(4.0)
+        assert self.fired == ["a"]
+
+    def test_timers_fire_in_order(self):
+        self.schedule(3, "c")
+        self.schedule(1, "a")
+        self.schedule(2, "b")
+        for second in range(1, 6):
+            self.advance(second)
+        assert self.fired == ["a", "b", "c"]
+
+    def test_timer_beyond_one_rotation(self):
+        self.schedule(20, "a")
+        self.advance(19)
+        assert self.fired == []
+        self.advance(22)
+        assert self.fired == ["a"]
+
+    def test_cancelled_timer_does_not_fire(self):
+        timer = self.schedule(1, "a")
+        timer.cancel()
+        assert self.advance(3) == 0
+        assert self.fired == []
+
+    def test_failing_callback_does_not_stop_others(self):
+        def fail():
+            raise ValueError("bang")
+        self.wheel.schedule(1, fail)
+        self.schedule(1, "a")
+        self.advance(3)
+        assert self.fired == ["a"]
+
+    def test_many_timers(self):
+        for i in range(10000):
+            self.schedule(i % 50, i)
+        self.advance(52)
+        assert len(self.fired) == 10000
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from os import mkdir
+from os.path import join as path_join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from shortwave.mailbox import MboxReader, MaildirReader
+from shortwave.messaging import Message
+
+
+MBOX = (b"From alice@example.com Sun Nov  6 08:49:37 1994\n"
+        b"From: alice@example.com\n"
+        b"Subject: first\n"
+        b"\n"
+        b"Hello\n"
+        b">From the start\n"
+        b"\n"
+        b"From bob@example.com Mon Nov  7 08:49:37 1994\n"
+        b"From: bob@example.com\n"
+        b"Subject: second,\n"
+        b" continued\n"
+        b"\n"
+        b"Goodbye\n")
+
+
+class MessageTestCase(TestCase):
+
+    def test_headers_and_body(self):
+        message = Message(b"Subject: hi\r\nTo: bob\r\n\r\nbody\r\n")
+        assert message.headers["subject"] == b"hi"
+        assert message.headers["to"] == b"bob"
+        assert message.body.tobytes() == b"body\r\n"
+
+    def test_message_within_buffer(self):
+        data = b"xxxSubject: hi\n\nbodyyyy"
+        message = Message(data, 3, 20)
+        assert message.headers.items() == [(b"Subject", b"hi")]
+        assert message.body.tobytes() == b"body"
+        assert len(message) == 17
+
+    def test_message_without_body(self):
+        message = Message(b"Subject: hi\n")
+        assert message.headers["subject"] == b"hi"
+        assert message.body.tobytes() == b""
+
+    def test_message_without_headers(self):
+        message = Message(b"\nbody")
+        assert len(message.headers) == 0
+        assert message.body.tobytes() == b"body"
+
+
+class MboxReaderTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def write(self, data):
+        path = path_join(self.directory, "mbox")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_messages(self):
+        with MboxReader(self.write(MBOX)) as reader:
+            messages = list(reader)
+            assert [m.envelope for m in messages] == [
+                b"From alice@example.com Sun Nov  6 08:49:37 1994",
+                b"From bob@example.com Mon Nov  7 08:49:37 1994"]
+            assert messages[0].headers["subject"] == b"first"
+            assert messages[0].body.tobytes() == b"Hello\n>From the start\n"
+            assert messages[1].headers["subject"] == b"second, continued"
+            assert messages[1].body.tobytes() == b"Goodbye\n"
+            del messages
+
+    def test_offsets(self):
+        with MboxReader(self.write(MBOX)) as reader:
+            offsets = list(reader.offsets())
+        split = MBOX.index(b"\nFrom bob") + 1
+        assert offsets == [(0, split - 1), (split, len(MBOX))]
+
+    def test_crlf_archive(self):
+        with MboxReader(self.write(MBOX.replace(b"\n", b"\r\n"))) as reader:
+            messages = list(reader)
+            assert len(messages) == 2
+            assert messages[0].body.tobytes() == b"Hello\r\n>From the start\r\n"
+            del messages
+
+    def test_empty_archive(self):
+        with MboxReader(self.write(b"")) as reader:
+            assert list(reader) == []
+
+    def test_close_with_outstanding_view(self):
+        reader = MboxReader(self.write(MBOX))
+        body = next(iter(reader)).body
+        reader.close()
+        assert body.tobytes().startswith(b"Hello")
+
+
+class MaildirReaderTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        for subdirectory in ("new", "cur", "tmp"):
+            mkdir(path_join(self.directory, subdirectory))
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def write(self, subdirectory, name, data):
+        with open(path_join(self.directory, subdirectory, name), "wb") as f:
+            f.write(data)
+
+    def test_messages(self):
+        self.write("new", "2", b"Subject: new\n\nfresh\n")
+        self.write("cur", "1", b"Subject: seen\n\nold\n")
+        self.write("cur", "3", b"")
+        self.write("tmp", "4", b"Subject: partial\n\n")
+        messages = list(MaildirReader(self.directory))
+        assert [m.key for m in messages] == ["2", "1", "3"]
+        assert messages[0].headers["subject"] == b"new"
+        assert messages[1].body.tobytes() == b"old\n"
+        assert len(messages[2]) == 0
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from unittest import TestCase
+
+from shortwave import messaging
+from shortwave.messaging import MessageHeaderDict, MessageHeaderView, header_name, \
+    header_names, intern_bytes, internet_time, parse_internet_time, parse_header
+
+
+def fresh(value):
+    return bytes(bytearray(value))
+
+
+class HeaderNameTestCase(TestCase):
+
+    def test_known_name_in_any_form(self):
+        for name in ("message_id", "Message-ID", b"Message-ID", b"message-id",
+                     "MESSAGE-ID"):
+            assert header_name(name) == ("message_id", b"Message-ID")
+
+    def test_unknown_name(self):
+        assert header_name(b"x-custom_thing") == ("x_custom_thing", b"X-Custom-Thing")
+
+    def test_unhashable_name(self):
+        assert header_name(bytearray(b"subject")) == ("subject", b"Subject")
+
+    def test_cache_is_bounded(self):
+        size = messaging.max_header_name_cache_size
+        for i in range(size + 100):
+            header_name("x-hostile-%d" % i)
+        assert len(messaging._header_name_cache) <= size
+        assert header_name(b"Subject") == ("subject", b"Subject")
+
+    def test_new_known_name_invalidates_cache(self):
+        default = ("x_shortwave_test", b"X-Shortwave-Test")
+        known = ("x_shortwave_test", b"X-ShortWave-TEST")
+        assert header_name(b"x-shortwave-test") == default
+        header_names["x_shortwave_test"] = b"X-ShortWave-TEST"
+        try:
+            assert header_name(b"x-shortwave-test") == known
+        finally:
+            del header_names["x_shortwave_test"]
+        assert header_name(b"x-shortwave-test") == default
+
+    def test_all_changes_invalidate_cache(self):
+        default = ("x_shortwave_test", b"X-Shortwave-Test")
+        known = ("x_shortwave_test", b"X-ShortWave-TEST")
+        assert header_name(b"x-shortwave-test") == default
+        header_names.setdefault("x_shortwave_test", b"X-ShortWave-TEST")
+        assert header_name(b"x-shortwave-test") == known
+        header_names.pop("x_shortwave_test")
+        assert header_name(b"x-shortwave-test") == default
+        saved = header_names.copy()
+        try:
+            header_names.clear()
+            assert header_name(b"subject") == ("subject", b"Subject")
+            assert header_name(b"message-id") == ("message_id", b"Message-Id")
+        finally:
+            header_names.update(saved)
+        assert header_name(b"message-id") == ("message_id", b"Message-ID")
+
+
+class InternBytesTestCase(TestCase):
+
+    def setUp(self):
+        self.saved = (messaging.max_interned_size, messaging._interned,
+                      messaging._intern_candidates)
+        messaging.max_interned_size = 8
+        messaging._interned = OrderedDict()
+        messaging._intern_candidates = OrderedDict()
+
+    def tearDown(self):
+        (messaging.max_interned_size, messaging._interned,
+         messaging._intern_candidates) = self.saved
+
+    def test_known_value_is_shared(self):
+        assert intern_bytes(fresh(b"keep-alive")) is intern_bytes(fresh(b"keep-alive"))
+
+    def test_value_is_interned_when_seen_again(self):
+        first = fresh(b"x-shortwave-intern-test")
+        second = fresh(b"x-shortwave-intern-test")
+        assert intern_bytes(first) is first
+        assert intern_bytes(second) is first
+        assert intern_bytes(fresh(second)) is first
+
+    def test_long_value_is_not_interned(self):
+        value = b"x" * (messaging.max_interned_length + 1)
+        intern_bytes(fresh(value))
+        assert intern_bytes(fresh(value)) is not intern_bytes(fresh(value))
+
+    def test_table_is_bounded(self):
+        for i in range(100):
+            value = b"x-hostile-%d" % i
+            intern_bytes(fresh(value))
+            intern_bytes(fresh(value))
+        assert len(messaging._interned) <= 8
+        assert len(messaging._intern_candidates) <= 8
+        assert intern_bytes(fresh(b"chunked")) is intern_bytes(fresh(b"chunked"))
+
+    def test_values_in_use_survive_eviction(self):
+        kept = intern_bytes(fresh(b"x-kept"))
+        intern_bytes(fresh(b"x-kept"))
+        for i in range(100):
+            value = b"x-hostile-%d" % i
+            intern_bytes(fresh(value))
+            intern_bytes(fresh(value))
+            assert intern_bytes(fresh(b"x-kept")) is kept
+        assert b"x-hostile-0" not in messaging._interned
+
+    def test_parsed_values_are_shared(self):
+        data = b"Content-Type: application/json\r\nConnection: close\r\n\r\n"
+        first = MessageHeaderDict.from_bytes(fresh(data))
+        second = MessageHeaderDict.from_bytes(fresh(data))
+        assert first[b"Content-Type"] is second[b"Content-Type"]
+        assert first[b"Connection"] is MessageHeaderView(fresh(data))[b"Connection"]
+
+
+class ParseHeaderTestCase(TestCase):
+
+    def test_value_without_parameters(self):
+        assert parse_header(b"text/plain ") == (b"text/plain", {})
+
+    def test_parameters(self):
+        value, params = parse_header("text/html; Charset=UTF-8;level=1; flag")
+        assert value == b"text/html"
+        assert params == {b"charset": b"UTF-8", b"level": b"1", b"flag": None}
+
+    def test_quoted_string(self):
+        _, params = parse_header(b'attachment; filename="a;\\"b\\".txt"; size=3')
+        assert params == {b"filename": b'a;"b".txt', b"size": b"3"}
+
+    def test_none(self):
+        assert parse_header(None) == (None, None)
+
+    def test_result_is_cached_and_immutable(self):
+        first = parse_header(b"text/plain; charset=utf-8")
+        assert parse_header(b"text/plain; charset=utf-8") is first
+        with self.assertRaises(TypeError):
+            first[1][b"charset"] = b"latin-1"
+
+    def test_cache_is_bounded(self):
+        for i in range(messaging.max_parsed_header_cache_size + 10):
+            parse_header(b"text/plain; n=%d" % i)
+        assert len(messaging._parsed_header_cache) <= messaging.max_parsed_header_cache_size
+
+
+class InternetTimeTestCase(TestCase):
+
+    timestamp = 784111777
+
+    def test_format(self):
+        assert internet_time(self.timestamp) == b"Sun, 06 Nov 1994 08:49:37 GMT"
+        assert internet_time(self.timestamp + 0.5) == b"Sun, 06 Nov 1994 08:49:37 GMT"
+
+    def test_format_current_time(self):
+        assert parse_internet_time(internet_time()) is not None
+
+    def test_bytes_are_unchanged(self):
+        value = "Sun, 06 Nov 1994 08:49:37 GMT"
+        assert internet_time(value) == value.encode("ascii")
+
+    def test_parse_imf_fixdate(self):
+        assert parse_internet_time(b"Sun, 06 Nov 1994 08:49:37 GMT") == self.timestamp
+        assert parse_internet_time("Sun, 06 Nov 1994 08:49:37 GMT") == self.timestamp
+
+    def test_parse_rfc850_date(self):
+        assert parse_internet_time(b"Sunday, 06-Nov-94 08:49:37 GMT") == self.timestamp
+
+    def test_parse_asctime_date(self):
+        assert parse_internet_time(b"Sun Nov  6 08:49:37 1994") == self.timestamp
+
+    def test_round_trip(self):
+        for timestamp in (0, 951782400, 4102444799, -86400):
+            assert parse_internet_time(internet_time(timestamp)) == timestamp
+
+    def test_invalid_dates(self):
+        for value in (None, b"", b"0", b"Sun, 06 Xyz 1994 08:49:37 GMT",
+                      b"Sun, 32 Nov 1994 08:49:37 GMT"):
+            assert parse_internet_time(value) is None
+
+
+class MessageHeaderDictTestCase(TestCase):
+
+    def test_mapping_access(self):
+        headers = MessageHeaderDict(content_type=b"text/plain")
+        assert headers["Content-Type"] == b"text/plain"
+        assert headers.get(b"content-type") == b"text/plain"
+        assert "CONTENT-TYPE" in headers
+        assert headers.get("server") is None
+        with self.assertRaises(KeyError):
+            _ = headers["server"]
+
+    def test_repeated_fields_are_retained_in_order(self):
+        headers = MessageHeaderDict()
+        headers.add(b"Via", b"1.1 a")
+        headers.add(b"Server", b"test")
+        headers.add(b"via", b"1.1 b")
+        assert len(headers) == 3
+        assert headers.get_all("via") == [b"1.1 a", b"1.1 b"]
+        assert headers["via"] == b"1.1 b"
+        assert headers.keys() == [b"Via", b"Server", b"Via"]
+
+    def test_set_replaces_all_values(self):
+        headers = MessageHeaderDict([(b"Via", b"1.1 a"), (b"Via", b"1.1 b")])
+        headers["via"] = 2
+        assert headers.get_all("via") == [b"2"]
+
+    def test_delete_removes_all_values(self):
+        headers = MessageHeaderDict([(b"Via", b"1.1 a"), (b"Server", b"test"), (b"Via", b"1.1 b")])
+        del headers["via"]
+        assert headers.items() == [(b"Server", b"test")]
+        with self.assertRaises(KeyError):
+            del headers["via"]
+
+    def test_pop(self):
+        headers = MessageHeaderDict(server=b"test")
+        assert headers.pop("server") == b"test"
+        assert headers.pop("server", None) is None
+        assert not headers
+
+    def test_update_replaces_named_fields(self):
+        headers = MessageHeaderDict([(b"Accept", b"text/plain"), (b"Via", b"1.1 a")])
+        headers.update([(b"Via", b"1.1 b"), (b"Via", b"1.1 c")], server=b"test")
+        assert headers.items() == [(b"Accept", b"text/plain"), (b"Via", b"1.1 b"),
+                                   (b"Via", b"1.1 c"), (b"Server", b"test")]
+
+    def test_fold(self):
+        headers = MessageHeaderDict()
+        headers.add(b"Subject", b"hello,")
+        headers.fold(b"world")
+        assert headers["subject"] == b"hello, world"
+
+    def test_serialisation_keeps_order(self):
+        headers = MessageHeaderDict()
+        headers[b"Host"] = b"example.com"
+        headers[b"Accept"] = b"*/*"
+        headers.add(b"Via", b"1.1 a")
+        assert headers.to_bytes() == b"Host: example.com\r\nAccept: */*\r\nVia: 1.1 a\r\n"
+
+    def test_write_to_list_and_bytearray(self):
+        headers = MessageHeaderDict([(b"Host", b"example.com")])
+        assert headers.write_to([b"GET / HTTP/1.1\r\n"]) == [
+            b"GET / HTTP/1.1\r\n", b"Host", b": ", b"example.com", b"\r\n"]
+        out = bytearray(b"GET / HTTP/1.1\r\n")
+        assert headers.write_to(out) is out
+        assert out == b"GET / HTTP/1.1\r\nHost: example.com\r\n"
+
+    def test_copy_and_equality(self):
+        headers = MessageHeaderDict([(b"Via", b"1.1 a"), (b"Via", b"1.1 b")])
+        copy = headers.copy()
+        assert copy == headers
+        copy.add(b"Via", b"1.1 c")
+        assert copy != headers
+
+
+class MessageHeaderDictFromBytesTestCase(TestCase):
+
+    def test_parse_block(self):
+        headers = MessageHeaderDict.from_bytes(b"Received: from a\r\n"
+                                               b"Subject: hello,\r\n"
+                                               b"\t world\r\n"
+                                               b"Received: from b\r\n"
+                                               b"content-type:text/plain\r\n"
+                                               b"\r\n"
+                                               b"Body: not a header\r\n")
+        assert headers.items() == [(b"Received", b"from a"), (b"Subject", b"hello, world"),
+                                   (b"Received", b"from b"), (b"Content-Type", b"text/plain")]
+        assert headers.get_all("received") == [b"from a", b"from b"]
+
+    def test_tolerant_line_endings(self):
+        headers = MessageHeaderDict.from_bytes(b"A: 1\nB: 2\r\nC: 3\n\nD: 4")
+        assert headers.items() == [(b"A", b"1"), (b"B", b"2"), (b"C", b"3")]
+
+    def test_memoryview_and_malformed_lines(self):
+        headers = MessageHeaderDict.from_bytes(memoryview(b" orphan\r\nnonsense\r\nA: 1"))
+        assert headers.items() == [(b"A", b"1")]
+
+    def test_parsed_dict_is_mutable(self):
+        headers = MessageHeaderDict.from_bytes(b"A: 1\r\nB: 2\r\n")
+        headers.add(b"A", b"3")
+        del headers["b"]
+        assert headers.get_all("a") == [b"1", b"3"]
+        assert "b" not in headers
+
+
+class MessageHeaderViewTestCase(TestCase):
+
+    data = (b"Received: from a\r\n"
+            b"Subject: hello,\r\n"
+            b" world\r\n"
+            b"Received: from b\r\n"
+            b"Content-Type: text/plain\r\n"
+            b"\r\n"
+            b"Body: not a header\r\n")
+
+    def test_can_get_header(self):
+        headers = MessageHeaderView(self.data)
+        assert headers["content-type"] == b"text/plain"
+        assert headers.get("Content_Type") == b"text/plain"
+
+    def test_missing_header(self):
+        headers = MessageHeaderView(self.data)
+        assert headers.get("body") is None
+        assert "body" not in headers
+        with self.assertRaises(KeyError):
+            _ = headers["body"]
+
+    def test_folded_header_is_unfolded(self):
+        headers = MessageHeaderView(self.data)
+        assert headers["subject"] == b"hello, world"
+
+    def test_repeated_headers_are_retained(self):
+        headers = MessageHeaderView(self.data)
+        assert len(headers) == 4
+        assert headers.get_all("received") == [b"from a", b"from b"]
+        assert headers["received"] == b"from b"
+
+    def test_keys_and_iteration(self):
+        headers = MessageHeaderView(self.data)
+        names = [b"Received", b"Subject", b"Received", b"Content-Type"]
+        assert headers.keys() == names
+        assert list(headers) == names
+
+    def test_can_materialise_as_dict(self):
+        headers = MessageHeaderView(self.data).to_dict()
+        assert isinstance(headers, MessageHeaderDict)
+        assert headers["Subject"] == b"hello, world"
+        assert headers["Content-Type"] == b"text/plain"
+
+    def test_view_with_offset(self):
+        data = b"HTTP/1.1 200 OK\r\nServer: test\r\n"
+        headers = MessageHeaderView(data, data.index(b"\r\n") + 2)
+        assert headers.items() == [(b"Server", b"test")]
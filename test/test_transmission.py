@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2011-2016, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from gc import collect
+from socket import socketpair
+import sys
+from threading import Thread
+from unittest import TestCase
+
+from shortwave.transmission import base
+from shortwave.transmission.base import BaseTransmitter, BaseTransceiver
+
+
+class SendallSocket(object):
+    """ Socket stand-in without sendmsg, as on platforms that lack it.
+    """
+
+    def __init__(self, socket):
+        self.socket = socket
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def sendall(self, data):
+        self.socket.sendall(data)
+
+
+class BaseTransmitterTestCase(TestCase):
+
+    def setUp(self):
+        self.local, self.remote = socketpair()
+
+    def tearDown(self):
+        self.local.close()
+        self.remote.close()
+
+    def receive(self, size):
+        received = bytearray()
+        while len(received) < size:
+            received += self.remote.recv(65536)
+        return bytes(received)
+
+    def test_pieces_are_sent_in_order(self):
+        BaseTransmitter(self.local).transmit(b"bumble", bytearray(b"bee"),
+                                             memoryview(b"-hornet")[1:], b"")
+        assert self.receive(15) == b"bumblebeehornet"
+
+    def test_more_pieces_than_one_vector_holds(self):
+        count = base.max_vector_length * 2 + 10
+        pieces = ["{:04d}".format(i).encode("ascii") for i in range(count)]
+        BaseTransmitter(self.local).transmit(*pieces)
+        assert self.receive(4 * len(pieces)) == b"".join(pieces)
+
+    def test_send_waits_for_full_buffer_to_drain(self):
+        self.local.setblocking(0)
+        data = [b"x" * 65536] * 64
+        received = []
+        reader = Thread(target=lambda: received.append(self.receive(65536 * 64)))
+        reader.start()
+        BaseTransmitter(self.local).transmit(*data)
+        reader.join(10)
+        assert received == [b"".join(data)]
+
+    def test_sockets_without_sendmsg(self):
+        BaseTransmitter(SendallSocket(self.local)).transmit(b"bumble", b"bee")
+        assert self.receive(9) == b"bumblebee"
+
+
+class UnreachableTransceiver(BaseTransceiver):
+
+    @classmethod
+    def new_socket(cls, address):
+        raise IOError("Unreachable")
+
+
+class BaseTransceiverTestCase(TestCase):
+
+    def test_failed_connection_is_collected_quietly(self):
+        unraisable = []
+        hook = getattr(sys, "unraisablehook", None)
+        sys.unraisablehook = unraisable.append
+        try:
+            with self.assertRaises(IOError):
+                UnreachableTransceiver(("localhost", 1))
+            collect()
+        finally:
+            sys.unraisablehook = hook
+        assert unraisable == []